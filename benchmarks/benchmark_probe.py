@@ -0,0 +1,15 @@
+"""
+A module that the scripts generated by run_benchmarks.py import (from outside their own package, so that it is never
+reloaded), so that the benchmark can tell when, in the simulated main thread, a script's run() function was called.
+"""
+
+import threading
+import time
+
+runTimes : 'list[float]' = []
+runEvent = threading.Event()
+
+
+def recordRun() -> None:
+    runTimes.append(time.perf_counter())
+    runEvent.set()
@@ -0,0 +1,13 @@
+"""
+A stand-in for Fusion's adsk package, for running the add-in's machinery (FusionMainThreadRunner, the logging handlers,
+the http request handler, runScript()) outside of Fusion, e.g. in the benchmarks.  It is not a faithful model of
+Fusion: it models only the parts of the api that the add-in uses, and only as far as the benchmarks need.
+"""
+
+from . import core
+from . import fusion
+
+
+def doEvents() -> None:
+    """ like Fusion's adsk.doEvents(): when called in the (simulated) main thread, handles the pending events. """
+    core._eventLoop.processPendingEvents()
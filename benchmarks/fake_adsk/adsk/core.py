@@ -0,0 +1,168 @@
+"""
+The parts of adsk.core that the add-in uses.  A daemon thread (named FakeFusionMainThread) plays the part of Fusion's
+main thread: it runs an event loop that delivers the custom events fired by Application.fireCustomEvent(), one at a 
+time, to the handlers registered for them, just as Fusion delivers custom events in its main thread.
+"""
+
+import queue
+import sys
+import threading
+import traceback
+
+from typing import Optional
+
+
+class _EventLoop(object):
+    def __init__(self):
+        self._events : 'queue.Queue[tuple[str, str]]' = queue.Queue()
+        self._customEvents : 'dict[str, CustomEvent]' = {}
+        self._lock = threading.Lock()
+        self.numberOfEventsDelivered : int = 0
+        self.thread = threading.Thread(target=self._run, name="FakeFusionMainThread", daemon=True)
+        self.thread.start()
+
+    def register(self, eventId: str) -> 'CustomEvent':
+        with self._lock:
+            return self._customEvents.setdefault(eventId, CustomEvent(eventId))
+
+    def unregister(self, eventId: str) -> bool:
+        with self._lock:
+            return self._customEvents.pop(eventId, None) is not None
+
+    def fire(self, eventId: str, additionalInfo: str) -> bool:
+        with self._lock:
+            if eventId not in self._customEvents:
+                return False
+        self._events.put((eventId, additionalInfo))
+        return True
+
+    def _deliver(self, eventId: str, additionalInfo: str) -> None:
+        with self._lock:
+            customEvent = self._customEvents.get(eventId)
+        if customEvent is None:
+            return
+        self.numberOfEventsDelivered += 1
+        for handler in list(customEvent._handlers):
+            try:
+                handler.notify(CustomEventArgs(customEvent, additionalInfo))
+            except Exception:
+                # like Fusion, we report (rather than propagate) an exception raised by an event handler.
+                traceback.print_exc(file=sys.stderr)
+
+    def _run(self) -> None:
+        while True:
+            self._deliver(*self._events.get())
+
+    def processPendingEvents(self) -> None:
+        if threading.current_thread() is not self.thread:
+            return
+        while True:
+            try:
+                event = self._events.get_nowait()
+            except queue.Empty:
+                return
+            self._deliver(*event)
+
+_eventLoop = _EventLoop()
+
+def isMainThread() -> bool:
+    """ (not part of Fusion's api) whether the calling thread is the simulated main thread. """
+    return threading.current_thread() is _eventLoop.thread
+
+
+class EventArgs(object):
+    def __init__(self, firingEvent=None):
+        self.firingEvent = firingEvent
+
+class CustomEventArgs(EventArgs):
+    def __init__(self, firingEvent, additionalInfo: str = ''):
+        super().__init__(firingEvent)
+        self.additionalInfo = additionalInfo
+
+class CommandEventArgs(EventArgs):
+    pass
+
+class CommandCreatedEventArgs(EventArgs):
+    pass
+
+class EventHandler(object):
+    def __init__(self):
+        pass
+
+class CustomEventHandler(EventHandler):
+    pass
+
+class CommandEventHandler(EventHandler):
+    pass
+
+class CommandCreatedEventHandler(EventHandler):
+    pass
+
+class CustomEvent(object):
+    def __init__(self, eventId: str):
+        self.eventId = eventId
+        self.name = eventId
+        self._handlers : list = []
+
+    def add(self, handler) -> bool:
+        self._handlers.append(handler)
+        return True
+
+    def remove(self, handler) -> bool:
+        if handler in self._handlers:
+            self._handlers.remove(handler)
+            return True
+        return False
+
+
+class TextCommandPalette(object):
+    """ records what is written to it, rather than showing it. """
+    def __init__(self):
+        self.isValid = True
+        self.numberOfWrites : int = 0
+        self.numberOfLinesWritten : int = 0
+
+    def writeText(self, text: str) -> bool:
+        self.numberOfWrites += 1
+        self.numberOfLinesWritten += text.count('\n') + 1
+        return True
+
+class Palettes(object):
+    def __init__(self):
+        self._palettes = {'TextCommands': TextCommandPalette()}
+
+    def itemById(self, id: str) -> Optional[TextCommandPalette]:
+        return self._palettes.get(id)
+
+class CommandControl(object):
+    pass
+
+class UserInterface(object):
+    def __init__(self):
+        self.palettes = Palettes()
+
+    def messageBox(self, text: str, *args, **kwargs) -> int:
+        sys.stderr.write(text + "\n")
+        return 0
+
+class Application(object):
+    _instance : Optional['Application'] = None
+
+    def __init__(self):
+        self.userInterface = UserInterface()
+        self.activeProduct = None
+
+    @staticmethod
+    def get() -> 'Application':
+        if Application._instance is None:
+            Application._instance = Application()
+        return Application._instance
+
+    def registerCustomEvent(self, eventId: str) -> CustomEvent:
+        return _eventLoop.register(eventId)
+
+    def unregisterCustomEvent(self, eventId: str) -> bool:
+        return _eventLoop.unregister(eventId)
+
+    def fireCustomEvent(self, eventId: str, additionalInfo: str = '') -> bool:
+        return _eventLoop.fire(eventId, additionalInfo)
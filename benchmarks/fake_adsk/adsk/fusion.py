@@ -0,0 +1,18 @@
+""" placeholders for the parts of adsk.fusion that the add-in names. """
+
+
+class Design(object):
+    @staticmethod
+    def cast(obj):
+        return obj if isinstance(obj, Design) else None
+
+
+class BRepBody(object):
+    pass
+
+
+class TriangleMeshQualityOptions(object):
+    LowQualityTriangleMesh = 8
+    NormalQualityTriangleMesh = 11
+    HighQualityTriangleMesh = 13
+    VeryHighQualityTriangleMesh = 15
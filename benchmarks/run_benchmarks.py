@@ -0,0 +1,335 @@
+"""
+Measures the add-in's own overhead without Fusion, by running the add-in's machinery against the stand-in adsk package
+in fake_adsk (whose FakeFusionMainThread plays the part of Fusion's main thread).  Reports, as json:
+
+    main_thread_queue_throughput    how many (trivial) tasks per second FusionMainThreadRunner runs, with the tasks
+                                    submitted from one or several threads.
+    request_to_run_latency          percentiles of the time from sending an http run-script request to the script's
+                                    run() function being called (and to the response arriving), over one keep-alive connection.
+    log_handler_cost                the cost, to the logging thread, of each record logged through each of the add-in's
+                                    log handlers (and through a plain RotatingFileHandler, for comparison).
+    reload_cost                     how long runScript() takes, as a function of the number of modules in the script's
+                                    package: the first run, a rerun with nothing changed, a rerun with one module
+                                    changed (at the top of the package, or in a nested subpackage), and a rerun with
+                                    incremental reload turned off.  Every run checks the script's return value, so that a
+                                    reload that misses a change fails the benchmark rather than making it look fast.
+
+Usage:
+
+    python benchmarks/run_benchmarks.py [--output results.json] [--quick] [--benchmark NAME ...]
+
+Times are in seconds, except where a name says otherwise.  The stand-in's event loop is much cheaper than Fusion's, so
+the numbers measure the add-in's overhead, not what a user of Fusion would see end to end; compare them across
+revisions of the add-in (on the same machine) rather than against Fusion.
+"""
+
+import argparse
+import concurrent.futures
+import datetime
+import http.client
+import json
+import logging
+import logging.handlers
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+BENCHMARKS_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+REPOSITORY_DIRECTORY = os.path.dirname(BENCHMARKS_DIRECTORY)
+sys.path[:0] = [
+    os.path.join(BENCHMARKS_DIRECTORY, 'fake_adsk'),
+    BENCHMARKS_DIRECTORY,
+    REPOSITORY_DIRECTORY,
+    os.path.join(REPOSITORY_DIRECTORY, 'lib')
+]
+
+import adsk.core
+import benchmark_probe
+import code_cache
+import fusion_main_thread_runner
+import submodule_index
+import fusion_script_runner_addin
+
+addin = fusion_script_runner_addin.addin
+
+# a logger that discards everything, for the runners that we create for the benchmarks.
+quietLogger = logging.getLogger('benchmark.quiet')
+quietLogger.addHandler(logging.NullHandler())
+quietLogger.propagate = False
+quietLogger.setLevel(logging.CRITICAL)
+
+
+def summarize(values: 'list[float]') -> dict:
+    """ returns the count, mean, and (nearest-rank) percentiles of values. """
+    values = sorted(values)
+    percentile = lambda p: values[min(len(values) - 1, max(0, int(round(p / 100 * len(values))) - 1))]
+    return {
+        'count' : len(values),
+        'mean'  : statistics.fmean(values),
+        'p50'   : percentile(50),
+        'p90'   : percentile(90),
+        'p99'   : percentile(99),
+        'max'   : values[-1]
+    }
+
+def writeFile(path: str, text: str) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(text)
+
+
+class AddInHarness(object):
+    """ gives the add-in what AddIn.start() would (a main thread runner, a code cache, and the meta path finders),
+    but without the servers, the logging handlers, or any toolbar commands. """
+
+    def __init__(self, directory: str):
+        self._directory = directory
+
+    def __enter__(self) -> 'AddInHarness':
+        addin._fusionMainThreadRunner = fusion_main_thread_runner.FusionMainThreadRunner(logger=quietLogger, queueWaitObserver=fusion_script_runner_addin.mainThreadQueueWaitSeconds.observe)
+        addin._codeCache = code_cache.CodeCache(directory=os.path.join(self._directory, 'code_cache'), maximumSize=fusion_script_runner_addin.CODE_CACHE_MAXIMUM_SIZE, logger=quietLogger, compileObserver=fusion_script_runner_addin.moduleCompileSeconds.observe)
+        addin._codeCacheFinder = code_cache.CodeCacheFinder(addin._codeCache, sourceObserver=addin._submoduleReloadTracker.noteLoadedSource)
+        addin._submoduleIndexingFinder = submodule_index.SubmoduleIndexingFinder(addin._submoduleIndex)
+        sys.meta_path[:0] = [addin._submoduleIndexingFinder, addin._codeCacheFinder]
+        return self
+
+    def __exit__(self, *args) -> None:
+        sys.meta_path.remove(addin._submoduleIndexingFinder)
+        sys.meta_path.remove(addin._codeCacheFinder)
+
+    def runScriptInMainThread(self, **runScriptArguments) -> 'tuple[dict, float]':
+        """ runs the script (by way of runScript(), in the simulated main thread) and returns the result and the time
+        that runScript() took (excluding the time spent waiting in the queue). """
+        def task():
+            startTime = time.perf_counter()
+            result = addin.runScript(**runScriptArguments)
+            return (result, time.perf_counter() - startTime)
+        result, duration = addin._fusionMainThreadRunner.doTaskInMainFusionThread(task, wait=True)
+        if result['status'] != 'succeeded':
+            raise RuntimeError(f"The benchmark script failed: {result['error']}")
+        return (result, duration)
+
+    def timeScriptRun(self, expectedReturnValue, **runScriptArguments) -> float:
+        """ like runScriptInMainThread(), but raises RuntimeError unless the script returned expectedReturnValue (as it
+        would not if we had run stale code), and returns only the time. """
+        result, duration = self.runScriptInMainThread(**runScriptArguments)
+        if result['return_value'] != expectedReturnValue:
+            raise RuntimeError(f"The benchmark script returned {result['return_value']!r} rather than {expectedReturnValue!r}.")
+        return duration
+
+
+def benchmarkMainThreadQueueThroughput(numberOfTasks: int) -> 'list[dict]':
+    results = []
+    for numberOfSubmittingThreads in (1, 4):
+        runner = fusion_main_thread_runner.FusionMainThreadRunner(logger=quietLogger)
+        futures : 'list[concurrent.futures.Future]' = []
+        def submitTasks(n: int) -> None:
+            for _ in range(n):
+                futures.append(runner.submitTask(lambda : None))
+        threads = [threading.Thread(target=submitTasks, args=(numberOfTasks // numberOfSubmittingThreads,)) for _ in range(numberOfSubmittingThreads)]
+        startTime = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        concurrent.futures.wait(futures)
+        duration = time.perf_counter() - startTime
+        results.append({
+            'submitting_threads'    : numberOfSubmittingThreads,
+            'tasks'                 : len(futures),
+            'duration'              : duration,
+            'tasks_per_second'      : len(futures) / duration,
+            'runner_statistics'     : runner.statistics()
+        })
+        del runner
+    return results
+
+
+def benchmarkRequestToRunLatency(numberOfRequests: int, directory: str) -> dict:
+    script_path = os.path.join(directory, 'latency', 'latency_script.py')
+    writeFile(script_path, "import benchmark_probe\n\ndef run(context):\n    benchmark_probe.recordRun()\n")
+    server = fusion_script_runner_addin.RunScriptHTTPServer(("localhost", 0), fusion_script_runner_addin.RunScriptHTTPRequestHandler)
+    serverThread = threading.Thread(target=server.serve_forever, daemon=True)
+    serverThread.start()
+    connection = http.client.HTTPConnection("localhost", server.server_address[1])
+    body = json.dumps({'message': {'script': script_path}})
+    toRun = []
+    toResponse = []
+    try:
+        # the first request (which compiles the script) is reported separately.
+        for i in range(numberOfRequests + 1):
+            benchmark_probe.runEvent.clear()
+            startTime = time.perf_counter()
+            connection.request('POST', '/', body=body, headers={'Content-Type': 'application/json'})
+            response = connection.getresponse()
+            response.read()
+            responseTime = time.perf_counter()
+            if response.status >= 300 or not benchmark_probe.runEvent.wait(10):
+                raise RuntimeError(f"The run-script request failed (http status {response.status}).")
+            toRun.append(benchmark_probe.runTimes[-1] - startTime)
+            toResponse.append(responseTime - startTime)
+    finally:
+        connection.close()
+        server.shutdown()
+        server.server_close()
+    return {
+        'first_request_to_run'  : toRun[0],
+        'request_to_run'        : summarize(toRun[1:]),
+        'request_to_response'   : summarize(toResponse[1:])
+    }
+
+
+def benchmarkLogHandlerCost(numberOfRecords: int, directory: str) -> dict:
+    formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
+
+    def timeLogging(name: str, handler: logging.Handler) -> float:
+        handler.setFormatter(formatter)
+        benchmarkLogger = logging.getLogger('benchmark.' + name)
+        benchmarkLogger.propagate = False
+        benchmarkLogger.setLevel(logging.DEBUG)
+        benchmarkLogger.addHandler(handler)
+        startTime = time.perf_counter()
+        for i in range(numberOfRecords):
+            benchmarkLogger.debug("benchmark record %d", i)
+        duration = time.perf_counter() - startTime
+        benchmarkLogger.removeHandler(handler)
+        return duration
+
+    def rotatingFileHandler(name: str) -> logging.handlers.RotatingFileHandler:
+        return logging.handlers.RotatingFileHandler(filename=os.path.join(directory, name + '.log'), maxBytes=2**20, backupCount=1)
+
+    results = {}
+
+    handler = rotatingFileHandler('synchronous')
+    duration = timeLogging('synchronous_file', handler)
+    handler.close()
+    results['synchronous_rotating_file'] = {'records': numberOfRecords, 'microseconds_per_record': duration / numberOfRecords * 1e6}
+
+    handler = fusion_script_runner_addin.AsyncFileLoggingHandler(rotatingFileHandler('asynchronous'))
+    duration = timeLogging('asynchronous_file', handler)
+    closeStartTime = time.perf_counter()
+    handler.close()
+    results['async_file'] = {
+        'records': numberOfRecords,
+        'microseconds_per_record': duration / numberOfRecords * 1e6,
+        # how long close() took to write out the records still queued.
+        'drain_duration': time.perf_counter() - closeStartTime
+    }
+
+    palette = adsk.core.Application.get().userInterface.palettes.itemById('TextCommands')
+    numberOfLinesWrittenBefore, numberOfWritesBefore = palette.numberOfLinesWritten, palette.numberOfWrites
+    handler = fusion_script_runner_addin.FusionTextCommandsPalletteLoggingHandler()
+    duration = timeLogging('palette', handler)
+    # wait for the handler's pending flush (if any) to reach the palette.
+    handler._fusionMainThreadRunner.doTaskInMainFusionThread(lambda : None, wait=True, timeout=10)
+    results['text_commands_palette'] = {
+        'records': numberOfRecords,
+        'microseconds_per_record': duration / numberOfRecords * 1e6,
+        # the palette handler writes at most PALETTE_LOG_MAXIMUM_LINES_PER_SECOND lines per second (plus a summary of the dropped lines).
+        'lines_written_to_palette': palette.numberOfLinesWritten - numberOfLinesWrittenBefore,
+        'palette_writes': palette.numberOfWrites - numberOfWritesBefore
+    }
+    return results
+
+
+def benchmarkReloadCost(harness: AddInHarness, packageSizes: 'list[int]', numberOfRepetitions: int, directory: str) -> 'list[dict]':
+    results = []
+    for packageSize in packageSizes:
+        packageDirectory = os.path.join(directory, f"package_of_{packageSize}_modules")
+        moduleNames = [f"module_{i}" for i in range(packageSize)]
+        # the value of each module (the script returns the sum of the values of the first ten and of the nested module).
+        values = {}
+        def writeModule(path: str, value: int) -> None:
+            writeFile(path, f"VALUE = {value}\n\ndef value():\n    return VALUE\n")
+            values[path] = value
+        for i, moduleName in enumerate(moduleNames):
+            writeModule(os.path.join(packageDirectory, moduleName + '.py'), i)
+        # a module two subpackages down, imported by the script, so that a change to it must be seen through kept parents.
+        writeFile(os.path.join(packageDirectory, 'nested', '__init__.py'), "")
+        writeFile(os.path.join(packageDirectory, 'nested', 'inner', '__init__.py'), "")
+        nestedModulePath = os.path.join(packageDirectory, 'nested', 'inner', 'nested_module.py')
+        writeModule(nestedModulePath, 1000)
+        script_path = os.path.join(packageDirectory, 'script.py')
+        writeFile(script_path,
+            "".join(f"from . import {x}\n" for x in moduleNames)
+            + "from .nested.inner import nested_module\n"
+            + "\ndef run(context):\n    return " + " + ".join([f"{x}.value()" for x in moduleNames[:10]] + ["nested_module.value()"]) + "\n"
+        )
+        summedPaths = [os.path.join(packageDirectory, x + '.py') for x in moduleNames[:10]] + [nestedModulePath]
+        def expectedReturnValue() -> int:
+            return sum(values[x] for x in summedPaths)
+
+        firstRunDuration = harness.timeScriptRun(expectedReturnValue(), script_path=script_path)
+        unchangedDurations = [harness.timeScriptRun(expectedReturnValue(), script_path=script_path) for _ in range(numberOfRepetitions)]
+        oneChangedDurations = []
+        for i in range(numberOfRepetitions):
+            writeModule(os.path.join(packageDirectory, moduleNames[0] + '.py'), -i - 1)
+            oneChangedDurations.append(harness.timeScriptRun(expectedReturnValue(), script_path=script_path))
+        nestedChangedDurations = []
+        for i in range(numberOfRepetitions):
+            writeModule(nestedModulePath, 1000 + i + 1)
+            nestedChangedDurations.append(harness.timeScriptRun(expectedReturnValue(), script_path=script_path))
+        fullReloadDurations = [harness.timeScriptRun(expectedReturnValue(), script_path=script_path, incremental_reload=False) for _ in range(numberOfRepetitions)]
+        results.append({
+            'modules'                       : packageSize,
+            'first_run'                     : firstRunDuration,
+            'unchanged'                     : summarize(unchangedDurations),
+            'one_module_changed'            : summarize(oneChangedDurations),
+            'one_nested_module_changed'     : summarize(nestedChangedDurations),
+            'full_reload'                   : summarize(fullReloadDurations)
+        })
+    return results
+
+
+def gitRevision() -> 'str | None':
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=REPOSITORY_DIRECTORY, capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+BENCHMARK_NAMES = ('main_thread_queue_throughput', 'request_to_run_latency', 'log_handler_cost', 'reload_cost')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--output', dest='output', default=None, help="the path of the json file to write (by default, we write to stdout).")
+    parser.add_argument('--quick', dest='quick', action='store_true', help="run smaller versions of the benchmarks.")
+    parser.add_argument('--benchmark', dest='benchmarks', action='append', choices=BENCHMARK_NAMES, default=[], help="run only the named benchmark (may be given more than once).")
+    args = parser.parse_args()
+    benchmarkNames = args.benchmarks or BENCHMARK_NAMES
+
+    report = {
+        'metadata': {
+            'timestamp'         : datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            'git_revision'      : gitRevision(),
+            'python_version'    : sys.version,
+            'platform'          : platform.platform(),
+            'quick'             : args.quick
+        },
+        'results': {}
+    }
+    with tempfile.TemporaryDirectory() as directory, AddInHarness(directory) as harness:
+        if 'main_thread_queue_throughput' in benchmarkNames:
+            report['results']['main_thread_queue_throughput'] = benchmarkMainThreadQueueThroughput(numberOfTasks=(10000 if args.quick else 100000))
+        if 'request_to_run_latency' in benchmarkNames:
+            report['results']['request_to_run_latency'] = benchmarkRequestToRunLatency(numberOfRequests=(50 if args.quick else 500), directory=directory)
+        if 'log_handler_cost' in benchmarkNames:
+            report['results']['log_handler_cost'] = benchmarkLogHandlerCost(numberOfRecords=(10000 if args.quick else 100000), directory=directory)
+        if 'reload_cost' in benchmarkNames:
+            report['results']['reload_cost'] = benchmarkReloadCost(harness,
+                packageSizes=([10, 100] if args.quick else [10, 100, 500, 1000]),
+                numberOfRepetitions=(3 if args.quick else 10),
+                directory=directory
+            )
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + "\n")
+    else:
+        print(text)
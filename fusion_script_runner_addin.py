@@ -8,53 +8,149 @@ exactly identical to the action of manual commands issued in Fusion360's user in
 
 # The structure and much of the function of this code is inspired by Ben Gruver's fusion_idea_addin
 
-import adsk
-import adsk.core
-import adsk.fusion
-import hashlib
-import http.client
-# from http.server import HTTPServer, BaseHTTPRequestHandler
-import http.server
-import importlib
-import importlib.util
-import io
-import json
-import logging
-import logging.handlers
-import os
-import re
-import socket
-import socketserver
-import struct
-import sys
-import threading
-import traceback
-from typing import Optional, Callable
-import urllib.parse
-import tempfile
-
-import shutil
-
-import datetime
 import pathlib
+import sys
 # sys.path.append(str(pathlib.Path(__file__).parent.parent.joinpath('lib').resolve()))
 sys.path.append(str(pathlib.Path(__file__).joinpath('lib').resolve()))
-from simple_fusion_custom_command import SimpleFusionCustomCommand
-import fusion_main_thread_runner
-
- 
-import rpyc
-import rpyc.core
-import rpyc.utils.server
-
+import startup_report
+# records how long each of our imports, and each phase of AddIn.start(), takes (see the /startup_report endpoint).
+startupReport = startup_report.StartupReport()
+startupReport.startTimingImportsOf(__name__)
+# (in a finally block, so that a failed import does not leave builtins.__import__ patched.)
+try:
+    import adsk
+    import adsk.core
+    import adsk.fusion
+    import concurrent.futures
+    import copy
+    import hashlib
+    import http.client
+    # from http.server import HTTPServer, BaseHTTPRequestHandler
+    import http.server
+    import importlib
+    import importlib.util
+    import io
+    import json
+    import logging
+    import logging.handlers
+    import os
+    import queue
+    import re
+    import socket
+    import socketserver
+    import struct
+    import sys
+    import threading
+    import time
+    import traceback
+    from typing import Optional, Callable, Any, Iterator
+    import urllib.parse
+    import tempfile
+
+    import shutil
+
+    import datetime
+    from simple_fusion_custom_command import SimpleFusionCustomCommand
+    import fusion_main_thread_runner
+    import script_run_jobs
+    import submodule_reload_tracker
+    import import_graph
+    import code_cache
+    import submodule_index
+    import interpreter_state_snapshot
+    import binary_export
+    import metrics
+    import script_profiler
+    # (rpyc is imported only if and when we start the rpyc slave server; see AddIn.startRpycSlaveServer().)
+finally:
+    startupReport.stopTimingImports()
 
 
 NAME_OF_THIS_ADDIN = 'fusion_script_runner_addin'
 PORT_NUMBER_FOR_RPYC_SLAVE_SERVER = 18812
 PORT_NUMBER_FOR_HTTP_SERVER = 19812
-
+# how long (in seconds) an idle keep-alive connection to the http server is held open before we close it.
+HTTP_KEEP_ALIVE_TIMEOUT = 60
+# how many completed run-script jobs we remember (so that clients can collect their results) before we start forgetting the oldest.
+MAXIMUM_NUMBER_OF_COMPLETED_JOBS_TO_KEEP = 256
+# the most lines per second (averaged over a second or so) that we write to the TextCommands palette.  
+# Lines beyond this are dropped, and the palette shows a count of the dropped lines instead.
+PALETTE_LOG_MAXIMUM_LINES_PER_SECOND = 200
+# the most log lines that we will hold while waiting for the main thread to write them to the TextCommands palette.
+PALETTE_LOG_MAXIMUM_BUFFERED_LINES = 2000
+# the least time (in seconds) between writes to the TextCommands palette.  Lines logged in between are written together.
+PALETTE_LOG_FLUSH_INTERVAL = 0.1
+# the most log records that may wait to be written to the log file.  Records logged while the queue is full are dropped 
+# (and counted), so that a slow disk can never stall the thread that is logging.
+FILE_LOG_MAXIMUM_QUEUED_RECORDS = 10000
+# the most log records that the log-file-writing thread writes before flushing the file.
+FILE_LOG_MAXIMUM_BATCH_SIZE = 500
+# where we keep the compiled code of the scripts that we run (and of their submodules), and how big we let that cache get (in bytes).
+CODE_CACHE_DIRECTORY = os.path.join(tempfile.gettempdir(), f"{NAME_OF_THIS_ADDIN}_code_cache")
+CODE_CACHE_MAXIMUM_SIZE = 64 * 2**20
+# packages that stay loaded when, in isolation mode, we remove the modules that a script run has imported, because they are
+# expensive to import again (and some of them do not tolerate being imported twice).  A request can add to this list.
+PACKAGES_KEPT_WARM_IN_ISOLATION_MODE = ('adsk', 'numpy', 'scipy', 'pandas', 'PIL', 'matplotlib', 'debugpy', 'rpyc')
+# if DEFERRED_STARTUP is true (the default), AddIn.start() does, in Fusion's main thread, only what must be done there, 
+# and brings up the servers (and everything else) in a background thread, so as to add as little as possible to Fusion's 
+# launch time.  GET /ready answers 200 once startup has finished.  Set the environment variable 
+# fusion_script_runner_addin_DEFERRED_STARTUP to 0 to do everything in the main thread.
+DEFERRED_STARTUP = os.environ.get(f"{NAME_OF_THIS_ADDIN}_DEFERRED_STARTUP", "1") != "0"
+# the rpyc slave server is opt-in: it is started at startup only if the environment variable 
+# fusion_script_runner_addin_START_RPYC_SLAVE_SERVER is 1; otherwise, a POST of /rpyc_slave_server starts it on demand.
+START_RPYC_SLAVE_SERVER = os.environ.get(f"{NAME_OF_THIS_ADDIN}_START_RPYC_SLAVE_SERVER", "0") == "1"
+# the size (in bytes) of the chunks in which we stream the response to a POST of /export.
+BINARY_EXPORT_CHUNK_SIZE = 2**20
+# the length of time (in seconds) between samples, when a run is profiled with the sampling profiler (see script_profiler).
+PROFILE_SAMPLING_INTERVAL = 0.005
+# how long (in seconds), by default, a debug-mode run waits for a debugger client (e.g. VS Code) to attach before giving up.
+DEFAULT_DEBUG_ATTACH_TIMEOUT = 300
+# how long (in seconds) AddIn.stop() waits for each of our background startup threads (deferred startup, and the debugger 
+# warm start) to finish, before giving up on it (and logging as much), so that a hung import cannot freeze Fusion while 
+# the add-in is being unloaded.
+STOP_THREAD_JOIN_TIMEOUT = 5
+
+# debugger warm start: if DEBUGGER_WARM_START_DEBUGPY_PATH is set (by way of the environment variable of the same name, 
+# prefixed with the name of this add-in, e.g. fusion_script_runner_addin_DEBUGGER_WARM_START_DEBUGPY_PATH), then, when the add-in 
+# starts, a background thread imports debugpy from that path and starts listening on DEBUGGER_WARM_START_DEBUG_PORT, so that 
+# the first debug-mode run does not have to wait for that.
+DEBUGGER_WARM_START_DEBUGPY_PATH = os.environ.get(f"{NAME_OF_THIS_ADDIN}_DEBUGGER_WARM_START_DEBUGPY_PATH", "")
+DEBUGGER_WARM_START_DEBUG_PORT = int(os.environ.get(f"{NAME_OF_THIS_ADDIN}_DEBUGGER_WARM_START_DEBUG_PORT", 9000))
+
+# the add-in's metrics, which GET /metrics serves in Prometheus's text format (see also AddIn.__init__(), which adds 
+# metrics read from the main thread runner and the code cache).
+metricsRegistry = metrics.MetricsRegistry(namespace=NAME_OF_THIS_ADDIN)
+httpRequestParseSeconds = metricsRegistry.histogram('http_request_parse_seconds', 
+    "Time from the start of parsing an http request's headers until its body has been read and decoded.")
+mainThreadQueueWaitSeconds = metricsRegistry.histogram('main_thread_queue_wait_seconds', 
+    "Time that a task waited in the main thread runner's queue before Fusion's main thread ran it.")
+submoduleUnloadSeconds = {
+    mode: metricsRegistry.histogram('submodule_unload_seconds', "Time spent unloading a script's submodules before running it.", labels={'mode': mode})
+    for mode in ('incremental', 'full')
+}
+moduleCompileSeconds = metricsRegistry.histogram('module_compile_seconds', 
+    "Time spent compiling one source file (when precompiling a script, or on a code cache miss while loading it).")
+scriptLoadSeconds = metricsRegistry.histogram('script_load_seconds', 
+    "Time spent loading a script: executing its top-level code, including loading (and, if need be, compiling) its submodules.")
+scriptRunSeconds = metricsRegistry.histogram('script_run_seconds', "Time spent in a script's run() function.")
+scriptRuns = {
+    status: metricsRegistry.counter('script_runs', "Script runs, by outcome.", labels={'status': status})
+    for status in ('succeeded', 'failed', 'skipped')
+}
+logRecordsEmitted = metricsRegistry.counter('log_records_emitted', "Log records emitted by the add-in's logger.")
+logRecordsDropped = {
+    handler: metricsRegistry.counter('log_records_dropped', "Log records dropped by a log handler that could not keep up.", labels={'handler': handler})
+    for handler in ('file', 'palette')
+}
+
+# the debugpy module, and the parts of (debugpy's vendored copy of) pydevd that we use, once we have imported them.
 debugpy = None
+pydevd = None
+get_global_debugger = None
 debugging_started = False
+debugging_indicator_shown = False
+# serializes importing debugpy and starting to listen, which may happen in any thread.
+debugging_lock = threading.Lock()
 
 pathOfDebuggingLog = os.path.join(tempfile.gettempdir(), f"{NAME_OF_THIS_ADDIN}_log.log")
 
@@ -70,10 +166,48 @@ class AddIn(object):
     def __init__(self):
         self._logging_file_handler                  : Optional[logging.Handler]                 = None
         self._logging_dialog_handler                : Optional[logging.Handler]                 = None
-        self._http_server                           : Optional[http.server.HTTPServer]          = None
-        self._rpyc_slave_server                     : Optional[rpyc.utils.server.Server]        = None
+        self._http_server                           : Optional[RunScriptHTTPServer]             = None
+        self._rpyc_slave_server                     : Optional['rpyc.utils.server.Server']      = None
         self._fusionMainThreadRunner                : Optional[fusion_main_thread_runner.FusionMainThreadRunner]          = None
         self._simpleFusionCustomCommands            : list[SimpleFusionCustomCommand]           = []
+        # the http server handles each connection in its own thread, so several request-handling threads might
+        # want to hand work to the fusionMainThreadRunner at the same time.  We serialize that hand-off (and only that hand-off) 
+        # with this lock.
+        self._mainThreadHandoffLock                 : threading.Lock                            = threading.Lock()
+        self._scriptRunJobStore                     : script_run_jobs.ScriptRunJobStore         = script_run_jobs.ScriptRunJobStore(maximumNumberOfCompletedJobs=MAXIMUM_NUMBER_OF_COMPLETED_JOBS_TO_KEEP)
+        # an index of the loaded submodules of each script, kept up to date by _submoduleIndexingFinder, so that we 
+        # need not scan all of sys.modules to find a script's submodules.
+        self._submoduleIndex                        : submodule_index.SubmoduleIndex            = submodule_index.SubmoduleIndex()
+        self._submoduleIndexingFinder               : Optional[submodule_index.SubmoduleIndexingFinder] = None
+        self._submoduleReloadTracker                : submodule_reload_tracker.SubmoduleReloadTracker = submodule_reload_tracker.SubmoduleReloadTracker(logger=logger, submoduleIndex=self._submoduleIndex)
+        # maps the module name of each script that we have run to the script's import graph.
+        self._importGraphs                          : 'dict[str, import_graph.ImportGraph]'     = {}
+        self._codeCache                             : Optional[code_cache.CodeCache]            = None
+        self._codeCacheFinder                       : Optional[code_cache.CodeCacheFinder]      = None
+        # serializes starting the rpyc slave server, which may be requested from any thread.
+        self._rpycSlaveServerLock                   : threading.Lock                            = threading.Lock()
+        # counts the records that our logger emits (see logRecordsEmitted).
+        self._logRecordCountingFilter               : CountingLoggingFilter                     = CountingLoggingFilter(logRecordsEmitted)
+        # the thread that runs finishStarting() (if DEFERRED_STARTUP is true), which stop() waits for (for up to 
+        # STOP_THREAD_JOIN_TIMEOUT seconds), having set _stopRequested (so that the thread gives up at its next step) and 
+        # cancelled _startupFuture (the thread's main-thread task, which cannot run while stop() occupies Fusion's main thread).
+        self._startupThread                         : Optional[threading.Thread]                = None
+        # the thread that runs warmStartDebugger() (if DEBUGGER_WARM_START_DEBUGPY_PATH is set), which stop() also waits for.
+        self._debuggerWarmStartThread               : Optional[threading.Thread]                = None
+        self._stopRequested                         : threading.Event                           = threading.Event()
+        self._startupFuture                         : Optional[concurrent.futures.Future]       = None
+
+        # (each of these raises, and so is left out of the metrics, until the thing that it reads exists.)
+        metricsRegistry.gaugeFunction('main_thread_queue_depth', "Tasks waiting in the main thread runner's queue.", 
+            lambda : self._fusionMainThreadRunner.statistics()['queueDepth'])
+        # the rate of increase of this is the fraction of the time that the main thread runner keeps Fusion's main thread busy.
+        metricsRegistry.counterFunction('main_thread_busy_seconds', "Time that Fusion's main thread has spent running the main thread runner's tasks.", 
+            lambda : self._fusionMainThreadRunner.statistics()['totalDrainDuration'])
+        metricsRegistry.counterFunction('main_thread_drains_cut_short', "Drains of the main thread runner's queue that ran out of time before the queue was empty.", 
+            lambda : self._fusionMainThreadRunner.statistics()['drainsCutShortByTimeBudget'])
+        for statistic in ('hits', 'misses'):
+            metricsRegistry.counterFunction('code_cache_lookups', "Code cache lookups, by outcome.", 
+                (lambda statistic=statistic: self._codeCache.statistics()[statistic]), labels={'outcome': statistic})
 
     def start(self):
         
@@ -83,11 +217,13 @@ class AddIn(object):
         # error messages in a more primitive way.
         try:
             
-            self._logging_file_handler = logging.handlers.RotatingFileHandler(
+            rotatingFileHandler = logging.handlers.RotatingFileHandler(
                 filename=pathOfDebuggingLog,
                 maxBytes=2**20,
                 backupCount=1)
-            self._logging_file_handler.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(message)s"))
+            rotatingFileHandler.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(message)s"))
+            # the logging thread (often Fusion's main thread) only enqueues the record; a background thread does the disk i/o.
+            self._logging_file_handler = AsyncFileLoggingHandler(rotatingFileHandler)
             logger.addHandler(self._logging_file_handler)
             # logger.setLevel(logging.WARNING)
             logger.setLevel(logging.DEBUG)
@@ -103,6 +239,8 @@ class AddIn(object):
             self._logging_textcommands_palette_handler.setLevel(logging.DEBUG)
             logger.addHandler(self._logging_textcommands_palette_handler)
 
+            logger.addFilter(self._logRecordCountingFilter)
+
         except Exception:
             # The logging infrastructure may not be set up yet, so we directly show an error dialog instead
             ui().messageBox(f"Error while starting {NAME_OF_THIS_ADDIN}.\n\n%s" % traceback.format_exc())
@@ -117,43 +255,130 @@ class AddIn(object):
             logger.debug(f"Hello from {__file__}")
             logger.debug("os.getcwd(): " + os.getcwd())
 
-            
-            self._fusionMainThreadRunner = fusion_main_thread_runner.FusionMainThreadRunner(logger=logger)
+            # the main thread runner registers a custom event with Fusion, which we do here, in Fusion's main thread.
+            with startupReport.phase('create main thread runner'):
+                self._fusionMainThreadRunner = fusion_main_thread_runner.FusionMainThreadRunner(logger=logger, queueWaitObserver=mainThreadQueueWaitSeconds.observe)
+
+            if DEBUGGER_WARM_START_DEBUGPY_PATH:
+                self._debuggerWarmStartThread = threading.Thread(target=self.warmStartDebugger, name=f"{NAME_OF_THIS_ADDIN}_debugger_warm_start", daemon=True)
+                self._debuggerWarmStartThread.start()
+
+            if DEFERRED_STARTUP:
+                self._startupThread = threading.Thread(target=self.finishStarting, name=f"{NAME_OF_THIS_ADDIN}_startup", daemon=True)
+                self._startupThread.start()
+            else:
+                self.finishStarting()
+
+        except Exception:
+            logger.fatal(f"Error while starting {NAME_OF_THIS_ADDIN}", exc_info=sys.exc_info())
+
+    def finishStarting(self) -> None:
+        """ does the part of startup that need not be done in Fusion's main thread (in a background thread, unless 
+        DEFERRED_STARTUP is false): sets up the code cache, brings up the servers, and (by way of the main thread runner) 
+        creates our toolbar command.  Marks startupReport ready (or failed) when done.  Gives up, between steps, if 
+        stop() has been called. """
+        try:
+            if self._stopRequested.is_set():
+                return
+            with startupReport.phase('set up code cache'):
+                # we compile the scripts that we run (and their submodules) by way of our own code cache, rather than relying on __pycache__.
+                self._codeCache = code_cache.CodeCache(directory=CODE_CACHE_DIRECTORY, maximumSize=CODE_CACHE_MAXIMUM_SIZE, logger=logger, compileObserver=moduleCompileSeconds.observe)
+                # (the finder tells _submoduleReloadTracker of the source from which each submodule is loaded, so that 
+                # the tracker fingerprints the source that was actually loaded.)
+                self._codeCacheFinder = code_cache.CodeCacheFinder(self._codeCache, sourceObserver=self._submoduleReloadTracker.noteLoadedSource)
+                sys.meta_path.insert(0, self._codeCacheFinder)
+                self._submoduleIndexingFinder = submodule_index.SubmoduleIndexingFinder(self._submoduleIndex)
+                sys.meta_path.insert(0, self._submoduleIndexingFinder)
             # self._run_script_requested_event = app().registerCustomEvent(RUN_SCRIPT_REQUESTED_EVENT_ID)
             # self._run_script_requested_event_handler = RunScriptRequestedEventHandler()
             # self._run_script_requested_event.add(self._run_script_requested_event_handler)
 
-            # Ben Gruver would run the http server on a random port, to avoid conflicts when multiple instances of Fusion 360 are
-            # running, and would have the client use SSDP to discover the correct desired port to connect to.
-            # I am, at present, simplifying things and simply using a hard-coded port number.
-            self._http_server = http.server.HTTPServer(("localhost", PORT_NUMBER_FOR_HTTP_SERVER), RunScriptHTTPRequestHandler)
-
-            http_server_thread = threading.Thread(target=self.run_http_server, daemon=True)
-            http_server_thread.start()
-
-            self._rpyc_slave_server = rpyc.ThreadedServer(
-                rpyc.SlaveService,
-                hostname='localhost',
-                port=PORT_NUMBER_FOR_RPYC_SLAVE_SERVER,
-                reuse_addr=True,
-                ipv6=False, 
-                authenticator=None,
-                registrar=None, 
-                auto_register=False
-            )
+            if self._stopRequested.is_set():
+                return
+            with startupReport.phase('start http server'):
+                # Ben Gruver would run the http server on a random port, to avoid conflicts when multiple instances of Fusion 360 are
+                # running, and would have the client use SSDP to discover the correct desired port to connect to.
+                # I am, at present, simplifying things and simply using a hard-coded port number.
+                self._http_server = RunScriptHTTPServer(("localhost", PORT_NUMBER_FOR_HTTP_SERVER), RunScriptHTTPRequestHandler)
 
-            rpyc_slave_server_thread = threading.Thread(target=self.run_rpyc_slave_server, daemon=True)
-            rpyc_slave_server_thread.start()
+                http_server_thread = threading.Thread(target=self.run_http_server, daemon=True)
+                http_server_thread.start()
+
+            if START_RPYC_SLAVE_SERVER and not self._stopRequested.is_set():
+                self.startRpycSlaveServer()
 
             def myTestFunction(eventArgs: adsk.core.CommandEventArgs)  -> None:
                 logger.debug("myTestFunction was called.")
                 return None
 
-            self._simpleFusionCustomCommands.append(SimpleFusionCustomCommand(name="neil_cool_command1", action=myTestFunction, app=app(), logger=logger))
+            def createTestCommand() -> None:
+                with startupReport.phase('create toolbar command'):
+                    self._simpleFusionCustomCommands.append(SimpleFusionCustomCommand(name="neil_cool_command1", action=myTestFunction, app=app(), logger=logger))
 
+            # creating the toolbar command must be done in Fusion's main thread.
+            if DEFERRED_STARTUP:
+                self._startupFuture = self._fusionMainThreadRunner.doTaskInMainFusionThread(createTestCommand, priority=fusion_main_thread_runner.BACKGROUND_PRIORITY)
+                # (if stop() was called before we stored the future, it did not see the future, so we cancel it ourselves.)
+                if self._stopRequested.is_set():
+                    self._startupFuture.cancel()
+                try:
+                    self._startupFuture.result()
+                except concurrent.futures.CancelledError:
+                    return
+            else:
+                createTestCommand()
+
+            startupReport.markReady()
+            logger.debug(f"{NAME_OF_THIS_ADDIN} is ready: " + json.dumps(startupReport.toDict()))
         except Exception:
+            startupReport.markFailed(traceback.format_exc())
             logger.fatal(f"Error while starting {NAME_OF_THIS_ADDIN}", exc_info=sys.exc_info())
 
+    def startRpycSlaveServer(self) -> int:
+        """ This may be called from any thread.  Imports rpyc and starts the rpyc slave server, unless it is already 
+        running.  Returns the server's port number.  The server exposes a FusionRpycService, which, besides the 
+        services of rpyc's SlaveService, offers coarse-grained operations that each take one hop through Fusion's main thread. """
+        with self._rpycSlaveServerLock:
+            if self._rpyc_slave_server is None:
+                with startupReport.phase('start rpyc slave server'):
+                    rpyc = startupReport.importModule('rpyc')
+                    startupReport.importModule('rpyc.utils.server')
+                    rpyc_helpers = startupReport.importModule('rpyc.utils.helpers')
+                    fusion_rpyc_service = startupReport.importModule('fusion_rpyc_service')
+                    self._rpyc_slave_server = rpyc.ThreadedServer(
+                        # each connection gets its own service object.
+                        rpyc_helpers.classpartial(fusion_rpyc_service.FusionRpycService,
+                            doTaskInMainFusionThread=self.doTaskInMainFusionThreadAndWait,
+                            runScript=self.runMessageAndWait,
+                            makeNamespace=lambda: {'adsk': adsk, 'app': app(), 'ui': ui()},
+                            serialize=jsonSerializable
+                        ),
+                        hostname='localhost',
+                        port=PORT_NUMBER_FOR_RPYC_SLAVE_SERVER,
+                        reuse_addr=True,
+                        ipv6=False, 
+                        authenticator=None,
+                        registrar=None, 
+                        auto_register=False
+                    )
+
+                    rpyc_slave_server_thread = threading.Thread(target=self.run_rpyc_slave_server, daemon=True)
+                    rpyc_slave_server_thread.start()
+        return PORT_NUMBER_FOR_RPYC_SLAVE_SERVER
+
+    def warmStartDebugger(self) -> None:
+        """ This is intended to be run in a background thread when the add-in starts.  Imports debugpy and starts listening, 
+        so that a later debug-mode run finds debugging already started. """
+        try:
+            startTime = time.perf_counter()
+            if startDebugging(debugpy_path=DEBUGGER_WARM_START_DEBUGPY_PATH, debug_port=DEBUGGER_WARM_START_DEBUG_PORT):
+                logger.debug(f"Debugger warm start took {time.perf_counter() - startTime:.3f} seconds.")
+                if self._stopRequested.is_set():
+                    return
+                self._fusionMainThreadRunner.doTaskInMainFusionThread(showDebuggingIndicator, priority=fusion_main_thread_runner.BACKGROUND_PRIORITY)
+        except Exception:
+            logger.error("Error during debugger warm start.", exc_info=sys.exc_info())
+
     def run_http_server(self):
         logger.debug("starting http server: port=%d" % self._http_server.server_port)
         try:
@@ -166,39 +391,268 @@ class AddIn(object):
         #TO DO: add exception handling
         self._rpyc_slave_server.start()
 
+    def submitRunScriptRequest(self, message: dict) -> script_run_jobs.ScriptRunJob:
+        """ This is intended to be called from any thread (typically one of the http server's request-handling threads).
+        It queues a runScript task to be run in Fusion's main thread, and returns (without waiting for the task to run) 
+        the job by which the caller can track the task. """
+        job = self._scriptRunJobStore.add(
+            script_run_jobs.ScriptRunJob(
+                runScriptArgumentsFromMessage(message), 
+                debugAttachTimeout=debugAttachTimeoutFromMessage(message)
+            )
+        )
+        self.prepareScript(job.runScriptArguments, preimport=message.get('preimport') or [])
+        self.queueJob(job)
+        return job
+
+    def queueJob(self, job: script_run_jobs.ScriptRunJob) -> None:
+        with self._mainThreadHandoffLock:
+            # (a job can be cancelled while it waits for the debugger client, up to the moment that we queue it again.)
+            if job.cancelRequested.is_set():
+                self._scriptRunJobStore.markFinished(job, {'status': script_run_jobs.ScriptRunJob.CANCELLED, 'error': None})
+                return
+            job.markQueued()
+            job.future = self._fusionMainThreadRunner.doTaskInMainFusionThread(
+                lambda : self.runJob(job),
+                priority=fusion_main_thread_runner.INTERACTIVE_PRIORITY
+            )
+
+    def cancelJob(self, jobId: str) -> Optional[script_run_jobs.ScriptRunJob]:
+        """ This is intended to be called from any thread.  Cancels the job, if it is still queued or waiting for a debugger 
+        client to attach (a running job cannot be cancelled).  Returns the job, or None if there is no such job. """
+        job = self._scriptRunJobStore.get(jobId)
+        if job is None:
+            return None
+        job.cancelRequested.set()
+        if job.status == script_run_jobs.ScriptRunJob.QUEUED and job.future is not None and job.future.cancel():
+            self._scriptRunJobStore.markFinished(job, {'status': script_run_jobs.ScriptRunJob.CANCELLED, 'error': None})
+        elif job.status == script_run_jobs.ScriptRunJob.WAITING_FOR_DEBUGGER or (job.status == script_run_jobs.ScriptRunJob.QUEUED and job.future is None):
+            # waitForDebuggerAndRequeueJob(), queueJob(), or runJob() notices the request within a fraction of a second 
+            # (or as soon as the job reaches the front of the queue), and marks the job cancelled.
+            job.finished.wait(1)
+        return job
+
+    def doTaskInMainFusionThreadAndWait(self, task: Callable[[], Any]) -> Any:
+        """ This is intended to be called from any thread other than Fusion's main thread.  Runs task in Fusion's main thread
+        (at interactive priority), waits for it, and returns its result (or raises its exception). """
+        with self._mainThreadHandoffLock:
+            future = self._fusionMainThreadRunner.doTaskInMainFusionThread(task, priority=fusion_main_thread_runner.INTERACTIVE_PRIORITY)
+        return future.result()
+
+    def exportData(self, extractorName: str, arguments: dict) -> 'Iterator[memoryview]':
+        """ This is intended to be called from any thread other than Fusion's main thread.  Runs the extractor named 
+        extractorName (see binary_export) in Fusion's main thread, and returns the chunks of the binary encoding of 
+        the extracted arrays (the encoding being done here, outside the main thread).  Raises KeyError if there is no 
+        such extractor. """
+        extractor = binary_export.getExtractor(extractorName)
+        arrays = self.doTaskInMainFusionThreadAndWait(lambda : extractor(app(), arguments))
+        return binary_export.encode(arrays, chunkSize=BINARY_EXPORT_CHUNK_SIZE)
+
+    def submitRunScriptRequestAndWait(self, message: dict, timeout: Optional[float] = None) -> script_run_jobs.ScriptRunJob:
+        """ This is intended to be called from any thread (typically one of the http server's request-handling threads).
+        Like submitRunScriptRequest() (or, if message has 'scripts', submitRunScriptsRequest()), but blocks until the job 
+        has completed or until timeout (seconds) has expired, whichever happens first.  The caller can tell which by 
+        looking at job.isCompleted.  We do not hold _mainThreadHandoffLock while we wait, so other requests can be 
+        handed off in the meantime. """
+        job = (self.submitRunScriptsRequest(message) if 'scripts' in message else self.submitRunScriptRequest(message))
+        job.finished.wait(timeout)
+        return job
+
+    def runMessageAndWait(self, message: dict) -> dict:
+        """ This is intended to be called from any thread (typically one of the rpyc slave server's threads).  Runs the 
+        script or, if message has 'scripts', the batch of scripts that message describes, as RunScriptHTTPRequestHandler 
+        would for a request that waits, and returns the job's description (which, for a batch, includes the scripts' 
+        'results').  Raises ValueError if message is malformed (see validateMessage()). """
+        validateMessage(message)
+        timeout = message.get('timeout')
+        return self.submitRunScriptRequestAndWait(message, timeout=(float(timeout) if timeout is not None else None)).toDict()
+
+    def prepareScript(self, runScriptArguments: dict, preimport: 'list[str]' = []) -> None:
+        """ This is intended to be called from the thread that received the request (not from Fusion's main thread), 
+        before the runScript task is queued.  It does the part of the work of running a script that is safe to do outside 
+        the main thread: locating and reading the script and the submodules that it imports, and compiling them into our 
+        code cache (so that, in the main thread, loading them is a cache hit), and importing the modules named in 
+        preimport (which ought to be pure-Python modules that do not touch the Fusion API).  Failures are logged 
+        and otherwise ignored; any real problem will surface when the script is run. """
+        script_path = runScriptArguments.get('script_path')
+        if script_path and self._codeCache:
+            try:
+                startTime = time.perf_counter()
+                paths = code_cache.precompileScript(script_path, moduleNameForScript(script_path), self._codeCache, logger=logger)
+                logger.debug(f"precompiled {len(paths)} file(s) for {script_path} in {time.perf_counter() - startTime:.3f} seconds.")
+            except Exception:
+                logger.warning(f"Error while precompiling {script_path}.", exc_info=sys.exc_info())
+        for moduleName in preimport:
+            try:
+                importlib.import_module(moduleName)
+            except Exception:
+                logger.warning(f"Error while pre-importing {moduleName}.", exc_info=sys.exc_info())
+
+    def getJob(self, jobId: str) -> Optional[script_run_jobs.ScriptRunJob]:
+        return self._scriptRunJobStore.get(jobId)
+
+    def getJobs(self) -> 'list[script_run_jobs.ScriptRunJob]':
+        return self._scriptRunJobStore.values()
+
+    def getImportGraph(self, script_path: str) -> Optional[import_graph.ImportGraph]:
+        return self._importGraphs.get(moduleNameForScript(script_path))
+
+    def getImportGraphs(self) -> 'list[import_graph.ImportGraph]':
+        return list(self._importGraphs.values())
+
+    #this is intended to be run in Fusion's main thread.
+    def runJob(self, job: script_run_jobs.ScriptRunJob) -> None:
+        job.future = None
+        if job.cancelRequested.is_set():
+            self._scriptRunJobStore.markFinished(job, {'status': script_run_jobs.ScriptRunJob.CANCELLED, 'error': None})
+            return
+        runScriptArgumentsToBeDebugged = job.runScriptArgumentsToBeDebugged
+        if runScriptArgumentsToBeDebugged is not None:
+            if not (debugging_started and debugpy.is_client_connected()):
+                # rather than blocking Fusion's main thread while debugging starts and until the client attaches, we do that 
+                # in a background thread, which queues the job again once the client has attached.
+                job.markWaitingForDebugger()
+                ui().palettes.itemById('TextCommands').writeText(str(datetime.datetime.now()) + "\t" + 'Waiting for connection from client, and will then run ' + runScriptArgumentsToBeDebugged['script_path'])
+                threading.Thread(target=self.waitForDebuggerAndRequeueJob, args=(job,), daemon=True).start()
+                return
+        job.markStarted()
+        result = {'status': script_run_jobs.ScriptRunJob.FAILED, 'error': None}
+        try:
+            if isinstance(job, script_run_jobs.ScriptBatchRunJob):
+                results = self.runScripts(job.listOfRunScriptArguments)
+                result = {
+                    'status': (script_run_jobs.ScriptRunJob.FAILED if any(x['status'] == 'failed' for x in results) else script_run_jobs.ScriptRunJob.SUCCEEDED),
+                    'error': None,
+                    'results': results
+                }
+            else:
+                result = self.runScript(**job.runScriptArguments)
+        except Exception:
+            result['error'] = traceback.format_exc()
+        finally:
+            self._scriptRunJobStore.markFinished(job, result)
+
+    def waitForDebuggerAndRequeueJob(self, job: script_run_jobs.ScriptRunJob) -> None:
+        """ This is intended to be run in a background thread.  Waits until a debugger client has attached (and then queues 
+        the job to be run again), or until the job's debugAttachTimeout expires or the job is cancelled (and then marks 
+        the job accordingly).  Starts debugging first, if necessary. """
+        try:
+            runScriptArgumentsToBeDebugged = job.runScriptArgumentsToBeDebugged
+            if not startDebugging(debugpy_path=runScriptArgumentsToBeDebugged['debugpy_path'], debug_port=runScriptArgumentsToBeDebugged['debug_port']):
+                self._scriptRunJobStore.markFinished(job, {'status': script_run_jobs.ScriptRunJob.FAILED, 'error': "Unable to start debugging, for lack of a debugpy_path."})
+                return
+            outcome = waitForDebuggerClient(timeout=job.debugAttachTimeout, cancelEvent=job.cancelRequested)
+        except Exception:
+            self._scriptRunJobStore.markFinished(job, {'status': script_run_jobs.ScriptRunJob.FAILED, 'error': traceback.format_exc()})
+            return
+        if outcome == 'connected':
+            self.queueJob(job)
+        elif outcome == 'cancelled':
+            self._scriptRunJobStore.markFinished(job, {'status': script_run_jobs.ScriptRunJob.CANCELLED, 'error': None})
+        else:
+            self._scriptRunJobStore.markFinished(job, {
+                'status': script_run_jobs.ScriptRunJob.FAILED, 
+                'error': f"No debugger client attached within {job.debugAttachTimeout} seconds."
+            })
+
+    def submitRunScriptsRequest(self, message: dict) -> script_run_jobs.ScriptBatchRunJob:
+        """ This is intended to be called from any thread (typically one of the http server's request-handling threads).
+        message['scripts'] is a list of items, each of which is either a script path or a dict having the same keys as a 
+        single-script message (any key that an item omits is taken from message itself).
+        The whole batch is run in a single task in Fusion's main thread.  Like submitRunScriptRequest(), we queue the 
+        task (having the debugger client attach first, if any item is to be debugged; see runJob()) and return, 
+        without waiting for it, the job by which the caller can track (or cancel) the batch. """
+        listOfRunScriptArguments = [
+            runScriptArgumentsFromMessage(
+                {
+                    **{k: v for k, v in message.items() if k != 'scripts'},
+                    **(item if isinstance(item, dict) else {'script': item})
+                }
+            )
+            for item in message['scripts']
+        ]
+        job = self._scriptRunJobStore.add(
+            script_run_jobs.ScriptBatchRunJob(
+                listOfRunScriptArguments, 
+                debugAttachTimeout=debugAttachTimeoutFromMessage(message)
+            )
+        )
+        for runScriptArguments in listOfRunScriptArguments:
+            self.prepareScript(runScriptArguments, preimport=message.get('preimport') or [])
+        self.queueJob(job)
+        return job
+
+    #this is intended to be run in Fusion's main thread.
+    def runScripts(self, listOfRunScriptArguments: 'list[dict]') -> 'list[dict]':
+        """ runs each of the scripts in turn (each item of listOfRunScriptArguments is a dict of keyword 
+        arguments for runScript()) and returns the list of results.  A failure of one script does not prevent 
+        the remaining scripts from running. """
+        logger.debug(f"Running a batch of {len(listOfRunScriptArguments)} scripts.")
+        return [self.runScript(**runScriptArguments) for runScriptArguments in listOfRunScriptArguments]
+
     #this is intended to be run in Fusion's main thread.
     def runScript(self, 
         script_path  : str, 
         debug        : bool = False, 
         debugpy_path : str  = "", 
         debug_port   : int  = 0,
-        prefixes_of_submodules_not_to_be_reloaded : 'list[str]' = []
-    ):
+        prefixes_of_submodules_not_to_be_reloaded : 'list[str]' = [],
+        incremental_reload : bool = True,
+        isolate : bool = False,
+        warm_packages : 'list[str]' = [],
+        profile : Optional[str] = None,
+        profile_output : Optional[str] = None
+    ) -> dict:
+        """ If incremental_reload is true, we unload (before running the script) only those submodules of the script 
+        whose source file has changed since the previous run, and the submodules that depend on them (see SubmoduleReloadTracker).  
+        Otherwise, we unload all the submodules of the script.  Either way, submodules matching 
+        prefixes_of_submodules_not_to_be_reloaded are left alone.
+        If isolate is true, then, after the run, we unload all the script's submodules (even those matching 
+        prefixes_of_submodules_not_to_be_reloaded, and regardless of incremental_reload), remove from sys.modules every 
+        module that the run added to the packages that the script's modules imported (other than the packages named in 
+        PACKAGES_KEPT_WARM_IN_ISOLATION_MODE or warm_packages), and restore sys.path to its contents before the run.  
+        Only the packages named by the script's own import statements (as recorded in its import graph) count as imported 
+        by the script: a package that is loaded only by way of another package (e.g. urllib3, by way of requests), or by 
+        a call to importlib.import_module(), is left loaded.
+        If profile names one of script_profiler.PROFILERS, we profile the loading of the script and its run() function, 
+        and save the profile to the file at profile_output (if given) or include it in the result (see ScriptProfiler.report()).
+        returns a json-serializable dict describing the outcome, having keys 'script', 'status' 
+        (one of 'succeeded', 'failed', or 'skipped'), 'error' (the traceback, in case of failure), 
+        'return_value' (whatever the script's run() function returned, made json-serializable by jsonSerializable()), and, 
+        if profile was given, 'profile'. """
+        result = {'script': script_path, 'status': 'succeeded', 'error': None, 'return_value': None}
         try:
             if not script_path and not debug:
                 logger.warning("No script provided and debugging not requested. There's nothing to do.")
-                return
+                result['status'] = 'skipped'
+                return result
 
             if debug: ensureThatDebuggingIsStarted(debugpy_path=debugpy_path, debug_port=debug_port)
                 
             if script_path:
-                if debug:
-                    if not debugpy.is_client_connected():
-                        ui().palettes.itemById('TextCommands').writeText(str(datetime.datetime.now()) + "\t" + 'Waiting for connection from client, and will then run ' + script_path)
-                        adsk.doEvents() #this seems to be necessary to make the message appear in the textCommands palette right away.
-                    debugpy.wait_for_client()
-                    ui().palettes.itemById('TextCommands').writeText(str(datetime.datetime.now()) + "\t" + 'Client connected.  Now running ' + script_path + ' ...')
-                    adsk.doEvents() 
-                    # we might consider doing this waiting in a separate thread so as to not block the UI.
+                if debug and debugpy is not None:
+                    # we never wait for the debugger client here, in Fusion's main thread; runJob() arranges (in a 
+                    # background thread) for the client to have attached before we get here.
+                    if debugpy.is_client_connected():
+                        ui().palettes.itemById('TextCommands').writeText(str(datetime.datetime.now()) + "\t" + 'Client connected.  Now running ' + script_path + ' ...')
+                    else:
+                        logger.warning(f"Running {script_path} in debug mode, but no debugger client is attached.")
                     
                 script_path = os.path.abspath(script_path)
                 script_dir = os.path.dirname(script_path)
 
+                interpreterStateSnapshot = (interpreter_state_snapshot.InterpreterStateSnapshot(logger=logger) if isolate else None)
+                profiler = (script_profiler.ScriptProfiler(profile, samplingInterval=PROFILE_SAMPLING_INTERVAL) if profile else None)
                 try:
-                    # This mostly mimics the package name that Fusion uses when running the script
-                    module_name = "__main__" + urllib.parse.quote(script_path.replace('.', '_'))
+                    module_name = moduleNameForScript(script_path)
+                    importGraph = self._importGraphs.setdefault(module_name, import_graph.ImportGraph(module_name))
                     spec = importlib.util.spec_from_file_location(
-                        module_name, script_path, submodule_search_locations=[script_dir])
+                        module_name, script_path, 
+                        loader=(code_cache.CachingSourceFileLoader(module_name, script_path, self._codeCache) if self._codeCache else None),
+                        submodule_search_locations=[script_dir])
+                    if self._codeCacheFinder: 
+                        self._codeCacheFinder.register(module_name)
+                    self._submoduleIndex.register(module_name)
                     module = importlib.util.module_from_spec(spec)
 
                     existing_module = sys.modules.get(module_name)
@@ -219,17 +673,62 @@ class AddIn(object):
                             else:
                                 raise
 
-                    unload_submodules(module_name, prefixes_of_submodules_not_to_be_reloaded)
+                    if incremental_reload:
+                        with submoduleUnloadSeconds['incremental'].time():
+                            self._submoduleReloadTracker.unloadChangedSubmodules(module_name, prefixes_of_submodules_not_to_be_reloaded, observedImports=importGraph.imports())
+                    else:
+                        with submoduleUnloadSeconds['full'].time():
+                            unload_submodules(module_name, prefixes_of_submodules_not_to_be_reloaded, submoduleIndex=self._submoduleIndex)
+                        self._submoduleReloadTracker.forget(module_name)
 
                     sys.modules[module_name] = module
-                    spec.loader.exec_module(module)
-                    logger.debug("Running script")
-                    module.run({"isApplicationStartup": False})
+                    # the submodules that we kept are still bound as attributes of the previous incarnation of the module, 
+                    # so we bind the immediate ones to the new incarnation, too (an 'import' statement that finds a 
+                    # submodule already in sys.modules does not do this binding).
+                    for loaded_module_name in self._submoduleIndex.immediateSubmodulesOf(module_name):
+                        setattr(module, loaded_module_name[len(module_name) + 1:], sys.modules[loaded_module_name])
+                    # we record which of the script's modules import which, and how long each module's top-level code takes.
+                    with import_graph.ImportGraphRecorder(importGraph) as importGraphRecorder:
+                        if profiler is not None:
+                            profiler.start()
+                        try:
+                            with scriptLoadSeconds.time():
+                                importGraphRecorder.timeExecution(module_name, lambda : spec.loader.exec_module(module))
+                            logger.debug("Running script")
+                            with scriptRunSeconds.time():
+                                returnValue = module.run({"isApplicationStartup": False})
+                        finally:
+                            if profiler is not None:
+                                profiler.stop()
+                        result['return_value'] = jsonSerializable(returnValue)
                 except Exception:
                     logger.fatal(
                         "Unhandled exception while importing and running script.",
                         exc_info=sys.exc_info()
                     )
+                    result['status'] = 'failed'
+                    result['error'] = traceback.format_exc()
+                finally:
+                    self._submoduleReloadTracker.recordLoadedSubmodules(module_name)
+                    if interpreterStateSnapshot is not None:
+                        # we remove only the packages that the script's modules imported (as recorded in the import graph).
+                        namesOfPackagesToRemove = {x.partition('.')[0] for imported in importGraph.imports().values() for x in imported}
+                        # the script's submodules refer to the packages that we are about to remove, so we unload all of them 
+                        # (rather than letting incremental reload keep the unchanged ones), lest the next run see two copies 
+                        # of a package: the removed one, by way of a kept submodule, and the one that the run imports afresh.
+                        unload_submodules(module_name, [], submoduleIndex=self._submoduleIndex)
+                        self._submoduleReloadTracker.forget(module_name)
+                        interpreterStateSnapshot.restore(
+                            namesOfPackagesToRemove=namesOfPackagesToRemove,
+                            namesOfPackagesToKeep=(module_name, *PACKAGES_KEPT_WARM_IN_ISOLATION_MODE, *warm_packages)
+                        )
+                # (a failed run still has a profile, unless it failed before the profiler started.)
+                if profiler is not None and profiler.isStopped:
+                    try:
+                        result['profile'] = profiler.report(outputPath=profile_output)
+                    except Exception:
+                        logger.error(f"Error while saving the profile of {script_path}.", exc_info=sys.exc_info())
+                        result['profile'] = {'error': traceback.format_exc()}
             # i = 0
             # # wait_for_client experiment
             # while i<5:
@@ -277,10 +776,35 @@ class AddIn(object):
             # hitting F5 in vs code.
         except Exception:
             logger.fatal("An error occurred while attempting to start script.", exc_info=sys.exc_info())
+            result['status'] = 'failed'
+            result['error'] = traceback.format_exc()
         finally:
-            pass
+            scriptRuns[result['status']].inc()
+        return result
 
     def stop(self):
+        # we wait for deferred startup to give up (or finish) before we tear down what it sets up.
+        self._stopRequested.set()
+        if self._startupFuture is not None:
+            self._startupFuture.cancel()
+        for thread in (self._startupThread, self._debuggerWarmStartThread):
+            if thread is not None:
+                thread.join(timeout=STOP_THREAD_JOIN_TIMEOUT)
+                if thread.is_alive():
+                    logger.warning(f"Stopping {NAME_OF_THIS_ADDIN} without waiting any longer for the thread {thread.name}, "
+                        + f"which is still running after {STOP_THREAD_JOIN_TIMEOUT} seconds (perhaps hung on an import).")
+        self._startupThread = None
+        self._debuggerWarmStartThread = None
+
+        logger.removeFilter(self._logRecordCountingFilter)
+
+        if self._codeCacheFinder in sys.meta_path:
+            sys.meta_path.remove(self._codeCacheFinder)
+        self._codeCacheFinder = None
+        if self._submoduleIndexingFinder in sys.meta_path:
+            sys.meta_path.remove(self._submoduleIndexingFinder)
+        self._submoduleIndexingFinder = None
+
         if self._http_server:
             try:
                 self._http_server.shutdown()
@@ -303,11 +827,11 @@ class AddIn(object):
         del self._simpleFusionCustomCommands
         del self._fusionMainThreadRunner
 
-        # clean up _logging_file_handler:
+        # clean up _logging_file_handler (closing it writes out any records still waiting in its queue):
         try:
             if self._logging_file_handler:
-                self._logging_file_handler.close()
                 logger.removeHandler(self._logging_file_handler)
+                self._logging_file_handler.close()
         except Exception:
             ui().messageBox(f"Error while closing {NAME_OF_THIS_ADDIN}'s file logger.\n\n%s" % traceback.format_exc())
         self._logging_file_handler = None
@@ -332,7 +856,113 @@ class AddIn(object):
         self._logging_textcommands_palette_handler = None
 
 
-def unload_submodules(module_name, prefixes_of_submodules_not_to_be_reloaded: 'list[str]'):
+def runScriptArgumentsFromMessage(message: dict) -> dict:
+    """ translates a run-script request message (as received by RunScriptHTTPRequestHandler) into keyword arguments for AddIn.runScript(). """
+    return dict(
+        script_path     = message.get("script"),
+        debug           = bool(message.get("debug")),
+        debugpy_path    = message.get("debugpy_path"),
+        debug_port      = int(message.get("debug_port",0)),
+        prefixes_of_submodules_not_to_be_reloaded = message.get("prefixes_of_submodules_not_to_be_reloaded") or [],
+        incremental_reload = bool(message.get("incremental_reload", True)),
+        isolate         = bool(message.get("isolate")),
+        warm_packages   = message.get("warm_packages") or [],
+        profile         = profilerNameFromMessage(message),
+        profile_output  = message.get("profile_output") or None
+    )
+
+def validateMessage(message) -> None:
+    """ raises ValueError, saying what is wrong, unless message is a well-formed run-script request message, i.e. a dict 
+    having a 'script', a (non-empty) list of 'scripts', or a true 'debug' (a request merely to start debugging), whose 
+    values (e.g. 'timeout', 'debug_port', 'prefixes_of_submodules_not_to_be_reloaded') are of the expected types, and 
+    whose 'profile' (if any) names one of script_profiler.PROFILERS.  This lets us reject a bad request up front, rather 
+    than failing part way through it. """
+    if not isinstance(message, dict):
+        raise ValueError(f"The message must be a json object, not {type(message).__name__}.")
+    if 'scripts' in message:
+        if not isinstance(message['scripts'], list) or not message['scripts']:
+            raise ValueError("The message's 'scripts' must be a non-empty list.")
+        items = []
+        for item in message['scripts']:
+            if not isinstance(item, (dict, str)):
+                raise ValueError(f"Each of the message's 'scripts' must be a script path or an object, not {type(item).__name__}.")
+            items.append({**{k: v for k, v in message.items() if k != 'scripts'}, **(item if isinstance(item, dict) else {'script': item})})
+    else:
+        items = [message]
+    for item in items:
+        if item.get('script') is not None and not isinstance(item['script'], str):
+            raise ValueError(f"The message's 'script' must be a script path, not {item['script']!r}.")
+        if not item.get('script') and not item.get('debug'):
+            raise ValueError("The message must have a 'script' (a script path), a list of 'scripts', or a true 'debug'.")
+        for key in ('prefixes_of_submodules_not_to_be_reloaded', 'warm_packages', 'preimport'):
+            if item.get(key) is not None and not (isinstance(item[key], list) and all(isinstance(x, str) for x in item[key])):
+                raise ValueError(f"The message's {key!r} must be a list of strings, not {item[key]!r}.")
+        try:
+            int(item.get('debug_port', 0))
+        except (TypeError, ValueError):
+            raise ValueError(f"The message's 'debug_port' must be an integer, not {item['debug_port']!r}.") from None
+        profilerNameFromMessage(item)
+    for key in ('timeout', 'debug_attach_timeout'):
+        if message.get(key) is not None:
+            try:
+                float(message[key])
+            except (TypeError, ValueError):
+                raise ValueError(f"The message's {key!r} must be a number of seconds, not {message[key]!r}.") from None
+
+def jsonObjectFromBody(body: str) -> dict:
+    """ parses the body of an http request, which must be a json object.  Raises ValueError if it is not. """
+    request_json = json.loads(body)
+    if not isinstance(request_json, dict):
+        raise ValueError(f"The request body must be a json object, not {type(request_json).__name__}.")
+    return request_json
+
+def profilerNameFromMessage(message: dict) -> Optional[str]:
+    """ message['profile'] may be true (meaning 'cprofile'), false, or the name of one of script_profiler.PROFILERS.  
+    Raises ValueError if it names no such profiler. """
+    profile = message.get("profile")
+    if not profile:
+        return None
+    profile = ('cprofile' if profile is True else profile)
+    if profile not in script_profiler.PROFILERS:
+        raise ValueError(f"There is no profiler named {profile!r}.  The profilers are {script_profiler.PROFILERS}.")
+    return profile
+
+def debugAttachTimeoutFromMessage(message: dict) -> Optional[float]:
+    """ returns the number of seconds that a debug-mode run requested by message should wait for a debugger client to attach (None means forever). """
+    debugAttachTimeout = message.get("debug_attach_timeout", DEFAULT_DEBUG_ATTACH_TIMEOUT)
+    return (float(debugAttachTimeout) if debugAttachTimeout is not None else None)
+
+def waitForDebuggerClient(timeout: Optional[float] = None, cancelEvent: Optional[threading.Event] = None) -> str:
+    """ This is intended to be called in some thread other than Fusion's main thread, after debugging has been started.
+    Waits until a debugger client has attached and finished configuring (returning 'connected'), or until timeout seconds 
+    have passed (returning 'timed_out'), or until cancelEvent is set (returning 'cancelled'). """
+    deadline = (time.monotonic() + timeout if timeout is not None else None)
+    while not debugpy.is_client_connected():
+        if cancelEvent is not None and cancelEvent.is_set():
+            return 'cancelled'
+        if deadline is not None and time.monotonic() >= deadline:
+            return 'timed_out'
+        (cancelEvent or threading.Event()).wait(0.1)
+    # the client has connected; wait_for_client() returns once the client has finished configuring (e.g. setting breakpoints).
+    debugpy.wait_for_client()
+    return 'connected'
+
+def moduleNameForScript(script_path: str) -> str:
+    """ returns the (synthetic) name of the module under which we load the script. """
+    # This mostly mimics the package name that Fusion uses when running the script
+    return "__main__" + urllib.parse.quote(os.path.abspath(script_path).replace('.', '_'))
+
+def jsonSerializable(value):
+    """ returns value itself if value can be serialized to json, else returns repr(value). """
+    try:
+        json.dumps(value)
+        return value
+    except (TypeError, ValueError):
+        return repr(value)
+
+def unload_submodules(module_name, prefixes_of_submodules_not_to_be_reloaded: 'list[str]', submoduleIndex: Optional[submodule_index.SubmoduleIndex] = None):
+    """ if submoduleIndex is given (and module_name is registered with it), we use it to find module_name's submodules, 
+    rather than scanning all of sys.modules. """
     search_prefix = module_name + '.'
     logger.debug(
         f"unloading modules whose name starts with {search_prefix}"
@@ -342,42 +972,89 @@ def unload_submodules(module_name, prefixes_of_submodules_not_to_be_reloaded: 'l
             else ""
         )  
     )
-    loaded_submodules_to_be_unloaded = []
-    for loaded_module_name in sys.modules:
-        # logger.debug(f"considering whether to unload {loaded_module_name}")
-        if loaded_module_name.startswith(search_prefix) and not any( loaded_module_name.startswith(search_prefix + x) for x in  prefixes_of_submodules_not_to_be_reloaded ):
-            loaded_submodules_to_be_unloaded.append(loaded_module_name)
+    if submoduleIndex is not None and submoduleIndex.isRegistered(module_name):
+        loaded_submodules_to_be_unloaded = submoduleIndex.submodulesOf(module_name, prefixes_of_submodules_not_to_be_reloaded)
+    else:
+        loaded_submodules_to_be_unloaded = []
+        for loaded_module_name in sys.modules:
+            # logger.debug(f"considering whether to unload {loaded_module_name}")
+            if loaded_module_name.startswith(search_prefix) and not any( loaded_module_name.startswith(search_prefix + x) for x in  prefixes_of_submodules_not_to_be_reloaded ):
+                loaded_submodules_to_be_unloaded.append(loaded_module_name)
     for loaded_submodule_to_be_unloaded in loaded_submodules_to_be_unloaded:
         logger.debug(f"unloading module {loaded_submodule_to_be_unloaded}")
         del sys.modules[loaded_submodule_to_be_unloaded]
+        if submoduleIndex is not None:
+            submoduleIndex.discard(loaded_submodule_to_be_unloaded)
 
 def ensureThatDebuggingIsStarted(debugpy_path: str, debug_port: int) -> None:
+    """ This is intended to be run in Fusion's main thread.  Starts debugging (if it is not already started) and shows the 
+    debugging indicator. """
+    if startDebugging(debugpy_path=debugpy_path, debug_port=debug_port):
+        showDebuggingIndicator()
+
+def importDebugpy(debugpy_path: str) -> bool:
+    """ imports debugpy (from debugpy_path) and the parts of pydevd that we use, the first time that it is called; later 
+    calls merely return True, without touching sys.path.  Returns False if debugpy has not been imported and 
+    debugpy_path is empty.  The caller must hold debugging_lock. """
     global debugpy
-    global debugging_started
+    global pydevd
+    global get_global_debugger
 
-    # make sure that debugging is running.
+    if debugpy is not None:
+        return True
     if not debugpy_path:
         logger.warning("We have been instructed to do debugging, but you have not provided the necessary debugpy_path.  Therefore, we can do nothing.")
-        return
-    initialSystemPath=sys.path.copy()
-    sys.path.append(debugpy_path)
-    import debugpy
-    import debugpy._vendored
-    with debugpy._vendored.vendored(project='pydevd'):
-        from _pydevd_bundle.pydevd_constants import get_global_debugger
-        from pydevd import PyDB
-        import pydevd
-    sys.path=initialSystemPath
-    # I hope that it won't screw anything up to replace the sys.path value with a newly-created list (rather than modifying the existing list).
-        
-    
-    if not debugging_started and get_global_debugger() is not None :  
-        logger.debug("Our debugging_started flag is cleared, and yet the global debugger object exists (possibly left over from a previous run/stop cycle of this add in), so we will go ahead and set the debugging_started flag.")
-        debugging_started = True  
-        addin._simpleFusionCustomCommands.append(SimpleFusionCustomCommand(name="D_indicator", app=app(), logger=logger)) 
-    # We are assuming that if the global debugger object exists, then debugging is active and configured as desired.
-    # I am not sure that this is always a safe assumption, but oh well.
+        return False
+    # we may be running in a background thread (see warmStartDebugger()), while Fusion's main thread imports things, so we 
+    # modify sys.path in place, adding and then removing only our own entry, rather than replacing the list with a saved 
+    # copy (which would discard any change that another thread made to sys.path in the meantime).
+    addedDebugpyPath = debugpy_path not in sys.path
+    if addedDebugpyPath:
+        sys.path.append(debugpy_path)
+    try:
+        import debugpy
+        import debugpy._vendored
+        with debugpy._vendored.vendored(project='pydevd'):
+            from _pydevd_bundle.pydevd_constants import get_global_debugger
+            import pydevd
+    finally:
+        if addedDebugpyPath and debugpy_path in sys.path:
+            sys.path.remove(debugpy_path)
+    return True
+
+def showDebuggingIndicator() -> None:
+    """ This is intended to be run in Fusion's main thread.  Displays a "D" button in the quick-access toolbar 
+    (once) as a visual indicator to the user that debugging is active. """
+    global debugging_indicator_shown
+    if not debugging_indicator_shown:
+        debugging_indicator_shown = True
+        addin._simpleFusionCustomCommands.append(SimpleFusionCustomCommand(name="D_indicator", app=app(), logger=logger))
+
+def startDebugging(debugpy_path: str, debug_port: int) -> bool:
+    """ This may be called in any thread.  Imports debugpy (see importDebugpy()) and, if debugging is not already started, 
+    starts listening on debug_port.  Returns whether debugging is started.  Once debugging is started, this returns 
+    right away (the debug_port of later calls is ignored). """
+    global debugging_started
 
+    if debugging_started:
+        return True
+    with debugging_lock:
+        # make sure that debugging is running.
+        if not importDebugpy(debugpy_path):
+            return False
+
+        if not debugging_started and get_global_debugger() is not None :  
+            logger.debug("Our debugging_started flag is cleared, and yet the global debugger object exists (possibly left over from a previous run/stop cycle of this add in), so we will go ahead and set the debugging_started flag.")
+            debugging_started = True  
+        # We are assuming that if the global debugger object exists, then debugging is active and configured as desired.
+        # I am not sure that this is always a safe assumption, but oh well.
+
+        if not debugging_started:
+            _startListening(debug_port)
+            debugging_started = True
+        return True
+
+def _startListening(debug_port: int) -> None:
     # ensure that debugging is started:
     #  ideally, we would look for an existing global debugger with the correct configuration
     # in order to determine whether debugging was started, rather than maintaining our own blind debugging_started flag.
@@ -417,9 +1094,103 @@ def ensureThatDebuggingIsStarted(debugpy_path: str, debug_port: int) -> None:
         if False:
             pydevd.add_dap_messages_listener(LoggingDapMessagesListener())
         
-        #display a "D" button in the quick-access toolbar as a visual indicator to the user that debugging is now active.
-        debugging_started = True
-        addin._simpleFusionCustomCommands.append(SimpleFusionCustomCommand(name="D_indicator", app=app(), logger=logger))
+
+class AsyncFileLoggingHandler(logging.Handler):
+    """A logging handler whose emit() merely puts the record in a bounded queue.  A background thread takes the records
+    from the queue in batches, writes each batch to targetHandler's file (rotating the file as needed), and flushes the 
+    file once per batch.  close() writes out whatever is still queued, and then closes targetHandler."""
+
+    def __init__(self, 
+        targetHandler: logging.handlers.RotatingFileHandler,
+        maximumQueuedRecords: int = FILE_LOG_MAXIMUM_QUEUED_RECORDS,
+        maximumBatchSize: int = FILE_LOG_MAXIMUM_BATCH_SIZE
+    ):
+        super().__init__()
+        self._targetHandler = targetHandler
+        self._maximumBatchSize = maximumBatchSize
+        # a None in the queue tells the writer thread to stop.
+        self._recordQueue : 'queue.Queue[Optional[logging.LogRecord]]' = queue.Queue(maxsize=maximumQueuedRecords)
+        self._numberOfDroppedRecords : int = 0
+        self._writerThread = threading.Thread(target=self._writeRecords, daemon=True, name=f"{NAME_OF_THIS_ADDIN}_log_file_writer")
+        self._writerThread.start()
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            # like logging.handlers.QueueHandler.prepare(), we queue a copy of the record (the other handlers see the 
+            # original), in which we merge the arguments into the message, and format the traceback, now, because the 
+            # arguments (and whatever the traceback refers to) might be mutated before the writer thread gets to them.
+            record = copy.copy(record)
+            record.msg = record.getMessage()
+            record.args = None
+            if record.exc_info:
+                if not record.exc_text:
+                    record.exc_text = (self._targetHandler.formatter or logging.Formatter()).formatException(record.exc_info)
+                record.exc_info = None
+        except Exception:
+            # (e.g. the arguments do not suit the message's format.)
+            self.handleError(record)
+            return
+        try:
+            self._recordQueue.put_nowait(record)
+        except queue.Full:
+            # an unsynchronized increment might occasionally lose a count, which is acceptable for a diagnostic counter.
+            self._numberOfDroppedRecords += 1
+            logRecordsDropped['file'].inc()
+
+    def _writeRecords(self) -> None:
+        stopRequested = False
+        while not stopRequested:
+            batch = [self._recordQueue.get()]
+            while len(batch) < self._maximumBatchSize:
+                try:
+                    batch.append(self._recordQueue.get_nowait())
+                except queue.Empty:
+                    break
+            if None in batch:
+                stopRequested = True
+                batch = [record for record in batch if record is not None]
+            try:
+                self._writeBatch(batch)
+            except Exception:
+                # we have nowhere better to report a failure to write the log than stderr.
+                traceback.print_exc()
+
+    def _writeBatch(self, batch: 'list[logging.LogRecord]') -> None:
+        numberOfDroppedRecords, self._numberOfDroppedRecords = self._numberOfDroppedRecords, 0
+        if numberOfDroppedRecords:
+            batch.append(logging.makeLogRecord({
+                'name'      : logger.name,
+                'levelno'   : logging.WARNING,
+                'levelname' : logging.getLevelName(logging.WARNING),
+                'msg'       : f"{numberOfDroppedRecords} log record(s) were dropped because the log file could not keep up."
+            }))
+        if not batch:
+            return
+        target = self._targetHandler
+        with target.lock:
+            for record in batch:
+                if target.shouldRollover(record):
+                    target.doRollover()
+                target.stream.write(target.format(record) + target.terminator)
+            target.stream.flush()
+
+    def close(self) -> None:
+        if self._writerThread.is_alive():
+            self._recordQueue.put(None)
+            self._writerThread.join()
+        self._targetHandler.close()
+        super().close()
+
+class CountingLoggingFilter(logging.Filter):
+    """A logging filter that lets every record through, counting each in counter."""
+
+    def __init__(self, counter: metrics.Counter):
+        super().__init__()
+        self._counter = counter
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        self._counter.inc()
+        return True
 
 class FusionErrorDialogLoggingHandler(logging.Handler):
     """A logging handler that shows a error dialog to the user in Fusion 360."""
@@ -437,14 +1208,43 @@ class FusionErrorDialogLoggingHandler(logging.Handler):
         )
 
 class FusionTextCommandsPalletteLoggingHandler(logging.Handler):
-    """A logging handler that writes log messages to the Fusion TextCommands palette."""
-
-    def __init__(self):
+    """A logging handler that writes log messages to the Fusion TextCommands palette.
+    emit() (which runs in whatever thread is logging) only formats the record and appends it to a buffer.  
+    The buffered lines are written to the palette, in the main thread, with a single writeText() call per flush, 
+    at most one flush per flushInterval seconds, and at most maximumLinesPerSecond lines per second; excess lines are 
+    dropped and replaced by a one-line summary (which counts against the limit)."""
+
+    def __init__(self, 
+        maximumLinesPerSecond: int = PALETTE_LOG_MAXIMUM_LINES_PER_SECOND,
+        maximumBufferedLines: int = PALETTE_LOG_MAXIMUM_BUFFERED_LINES,
+        flushInterval: float = PALETTE_LOG_FLUSH_INTERVAL
+    ):
         super().__init__()
         # we use our own private instance of FusionMainThreadRunner rather than some externally-created instance
         # because we want our instance's logger NOT to be the same logger for which we are a handler,
         # else we might have infinite loops while logging.
-        self._fusionMainThreadRunner = fusion_main_thread_runner.FusionMainThreadRunner()
+        # Writing log messages to the palette is cosmetic, so it gives way to more urgent main-thread work (e.g. running scripts).
+        self._fusionMainThreadRunner = fusion_main_thread_runner.FusionMainThreadRunner(defaultPriority=fusion_main_thread_runner.BACKGROUND_PRIORITY)
+        self._maximumLinesPerSecond = maximumLinesPerSecond
+        self._maximumBufferedLines = maximumBufferedLines
+        self._flushInterval = flushInterval
+
+        # _bufferedLines, _flushScheduled, _numberOfDroppedLines, and _timeOfLastFlush are guarded by _bufferLock.
+        self._bufferLock = threading.Lock()
+        self._bufferedLines : 'list[str]' = []
+        # true from the time we queue a flush until that flush takes the buffered lines.
+        self._flushScheduled : bool = False
+        self._numberOfDroppedLines : int = 0
+        self._timeOfLastFlush : float = time.monotonic() - flushInterval
+
+        # the following are only touched in the main thread (by _flush()).
+        # _lineAllowance is a token bucket: it grows by maximumLinesPerSecond each second (up to maximumLinesPerSecond),
+        # and shrinks by one for each line written (including the summary of dropped lines).
+        self._lineAllowance : float = float(maximumLinesPerSecond)
+        self._timeOfLastRefill : float = time.monotonic()
+        # the number of dropped lines that we have not yet been able to report (for lack of allowance).
+        self._numberOfUnreportedDroppedLines : int = 0
+        self._palette : Optional[adsk.core.TextCommandPalette] = None
 
     def emit(self, record: logging.LogRecord) -> None:
 
@@ -458,29 +1258,189 @@ class FusionTextCommandsPalletteLoggingHandler(logging.Handler):
         #         ui().palettes.itemById('TextCommands').writeText(self.format(record)),
         #     suppressLogging=True
         # )
-        self._fusionMainThreadRunner.doTaskInMainFusionThread(
-            lambda : 
-                ui().palettes.itemById('TextCommands').writeText(self.format(record))
-        )
+        try:
+            line = self.format(record)
+        except Exception:
+            self.handleError(record)
+            return
+        with self._bufferLock:
+            if len(self._bufferedLines) >= self._maximumBufferedLines:
+                self._numberOfDroppedLines += 1
+                logRecordsDropped['palette'].inc()
+            else:
+                self._bufferedLines.append(line)
+        self._scheduleFlush()
         # We do not want the logging system to rely on fusionMainThreadRunner, because fusionMainThreadRunner might itself use
         # the logging system.  Therefore, we will manually set up the fusion custom event and associated handler here, rather than relying on 
         # the equivalent functionality in fusionMainThreadRunner.
 
+    def _scheduleFlush(self) -> None:
+        """ arranges for _flush() to run in the main thread, no sooner than flushInterval seconds after the previous 
+        flush, unless a flush is already scheduled.  This may be called from any thread. """
+        with self._bufferLock:
+            if self._flushScheduled:
+                return
+            self._flushScheduled = True
+            delay = self._timeOfLastFlush + self._flushInterval - time.monotonic()
+        if delay > 0:
+            timer = threading.Timer(delay, self._fusionMainThreadRunner.doTaskInMainFusionThread, args=(self._flush,))
+            timer.daemon = True
+            timer.start()
+        else:
+            self._fusionMainThreadRunner.doTaskInMainFusionThread(self._flush)
+
+    #this is intended to be run in Fusion's main thread.
+    def _flush(self) -> None:
+        now = time.monotonic()
+        with self._bufferLock:
+            lines = self._bufferedLines
+            self._numberOfUnreportedDroppedLines += self._numberOfDroppedLines
+            self._bufferedLines = []
+            self._numberOfDroppedLines = 0
+            self._flushScheduled = False
+            self._timeOfLastFlush = now
+
+        self._lineAllowance = min(
+            float(self._maximumLinesPerSecond), 
+            self._lineAllowance + (now - self._timeOfLastRefill) * self._maximumLinesPerSecond
+        )
+        self._timeOfLastRefill = now
+        numberOfLinesAllowed = max(0, int(self._lineAllowance))
+        # if anything has been (or is about to be) dropped, we keep one line of the allowance for the summary.
+        willReportDroppedLines = (self._numberOfUnreportedDroppedLines > 0 or len(lines) > numberOfLinesAllowed) and numberOfLinesAllowed > 0
+        numberOfLinesAllowed -= (1 if willReportDroppedLines else 0)
+        if len(lines) > numberOfLinesAllowed:
+            self._numberOfUnreportedDroppedLines += len(lines) - numberOfLinesAllowed
+            logRecordsDropped['palette'].inc(len(lines) - numberOfLinesAllowed)
+            lines = lines[:numberOfLinesAllowed]
+        if willReportDroppedLines:
+            lines.append(f"[{NAME_OF_THIS_ADDIN}: {self._numberOfUnreportedDroppedLines} log line(s) dropped; we write at most {self._maximumLinesPerSecond} lines per second to this palette]")
+            self._numberOfUnreportedDroppedLines = 0
+        elif self._numberOfUnreportedDroppedLines:
+            # we have no allowance left for the summary now; try again once the allowance has grown.
+            self._scheduleFlush()
+        self._lineAllowance -= len(lines)
+        if not lines:
+            return
+        try:
+            self._getPalette().writeText("\n".join(lines))
+        except Exception:
+            # perhaps our cached palette object has gone stale.  Look it up afresh next time.
+            self._palette = None
+            raise
+
+    def _getPalette(self) -> adsk.core.TextCommandPalette:
+        if self._palette is None or not self._palette.isValid:
+            self._palette = ui().palettes.itemById('TextCommands')
+        return self._palette
+
 
     
 
+class RunScriptHTTPServer(http.server.ThreadingHTTPServer):
+    """An HTTP server that handles each connection in its own (daemon) thread, so that several clients 
+    (or several requests arriving at once from the same build tool) do not queue behind one another at the socket."""
+    daemon_threads = True
 
 class RunScriptHTTPRequestHandler(http.server.BaseHTTPRequestHandler):
-    """An HTTP request handler that queues an event in the main thread of fusion 360 to run a script."""
+    """An HTTP request handler that queues an event in the main thread of fusion 360 to run a script.
+    A POST to any path submits a run-script request and answers with the job id (or, for a batch request, 
+    with the results).  A POST of /jobs/<job id>/cancel cancels the job if it is still queued or waiting for a 
+    debugger client to attach.  Before queuing the run, we precompile the script (see AddIn.prepareScript()) in the request-handling thread,
+    and import any modules listed in the message's 'preimport' property.  If the message has a true 'wait' property, we hold the response until the job has 
+    completed (answering 200) or until the message's 'timeout' (seconds, default: no limit) expires (answering 202).  A GET of /jobs/<job id> reports the status (and, once the job has completed, the outcome) 
+    of the job.  A GET of /jobs lists all the jobs that we still remember.  A GET of /import_graph?script=<script path>
+    describes the import graph of the script (see ImportGraph.toDict()), and a GET of /import_graphs describes the 
+    import graphs of all the scripts that we have run.  A GET of /ready answers 200 once the add-in has finished starting 
+    (503 before then), and a GET of /startup_report describes how long each phase of startup, and each of our imports, took.
+    A POST of /export, with a body like {"extractor": "body_meshes", "arguments": {}}, runs the named extractor in 
+    Fusion's main thread and answers with the extracted arrays in binary_export's format, streamed in chunks.
+    A POST of /rpyc_slave_server starts the rpyc slave server (if it is not already running) and answers with its port.
+    A GET of /metrics answers with the add-in's metrics (timings of each stage of the request pipeline, and counts of 
+    script runs and log records) in Prometheus's text format."""
+
+    # we speak HTTP/1.1 so that a client can keep its connection open and send many requests over it,
+    # rather than paying for a new tcp handshake on each request.  This obliges us to send a Content-Length
+    # header with every response (see sendResponse()).
+    protocol_version = "HTTP/1.1"
+
+    # idle keep-alive connections are closed after this many seconds, so that a forgotten client 
+    # does not pin one of the server's threads forever.
+    timeout = HTTP_KEEP_ALIVE_TIMEOUT
+
+    # we write the headers and the body of a response separately, so, with Nagle's algorithm in effect, the body of a
+    # response sent on a keep-alive connection would wait for the client's (delayed) acknowledgement of the headers.
+    disable_nagle_algorithm = True
+
+    def parse_request(self) -> bool:
+        # (by the time that this is called, the request line has been read, but we start the clock here, because 
+        # the wait for the request line includes the time that a keep-alive connection sat idle.)
+        self._parseStartTime = time.perf_counter()
+        return super().parse_request()
+
+    def observeParseTime(self) -> None:
+        httpRequestParseSeconds.observe(time.perf_counter() - self._parseStartTime)
+
+    def sendResponse(self, status: int, body: bytes, content_type: str = "text/plain; charset=utf-8") -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def sendChunkedResponse(self, status: int, chunks: 'Iterator[bytes]', content_type: str = "application/octet-stream") -> None:
+        """ sends a response whose body is the concatenation of chunks, using chunked transfer encoding, so that 
+        we need not know the length of the body up front (nor hold the whole body in one buffer). """
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for chunk in chunks:
+            if len(chunk):
+                self.wfile.write(b"%X\r\n" % len(chunk))
+                self.wfile.write(chunk)
+                self.wfile.write(b"\r\n")
+        self.wfile.write(b"0\r\n\r\n")
 
     def do_POST(self):
         logger.debug("Got an http request.")
-        content_length = int(self.headers["Content-Length"])
+        content_length = int(self.headers.get("Content-Length", 0))
         body = self.rfile.read(content_length).decode()
 
         try:
+            pathParts = [part for part in urllib.parse.urlparse(self.path).path.split('/') if part]
+            if pathParts == ['export']:
+                try:
+                    request_json = jsonObjectFromBody(body or '{}')
+                except ValueError as e:
+                    self.sendResponse(400, f"Bad request: {e}".encode())
+                    return
+                self.observeParseTime()
+                extractorName = request_json.get('extractor', '')
+                if extractorName not in binary_export.extractorNames():
+                    self.sendResponse(404, f"There is no extractor named {extractorName!r}.  The extractors are {binary_export.extractorNames()}.".encode())
+                else:
+                    self.sendChunkedResponse(200, addin.exportData(extractorName, request_json.get('arguments') or {}))
+                return
+            if pathParts == ['rpyc_slave_server']:
+                self.sendResponse(200, json.dumps({'port': addin.startRpycSlaveServer()}).encode(), content_type="application/json")
+                return
+            if len(pathParts) == 3 and pathParts[0] == 'jobs' and pathParts[2] == 'cancel':
+                job = addin.cancelJob(pathParts[1])
+                if job is None:
+                    self.sendResponse(404, f"There is no job having id {pathParts[1]} (perhaps it has been evicted).".encode())
+                else:
+                    self.sendResponse((200 if job.status == script_run_jobs.ScriptRunJob.CANCELLED else 409), json.dumps(job.toDict()).encode(), content_type="application/json")
+                return
+
             # logger.debug("RunScriptHTTPRequestHandler::do_POST is running with body " + body)
-            request_json = json.loads(body)
+            try:
+                request_json = jsonObjectFromBody(body)
+                if 'message' not in request_json:
+                    raise ValueError("The request has no 'message'.")
+            except ValueError as e:
+                self.sendResponse(400, f"Bad request: {e}".encode())
+                return
             logger.debug("RunScriptHTTPRequestHandler::do_POST is running with request_json " + json.dumps(request_json))
             # logger.debug("type(request_json['message']): " + str(type(request_json['message'])))
  
@@ -501,27 +1461,59 @@ class RunScriptHTTPRequestHandler(http.server.BaseHTTPRequestHandler):
             # customEventHandler
             # as args.additionalInfo 
 
-            message = ( json.loads(request_json['message']) if isinstance(request_json['message'], str) else request_json['message'])
-            # we ought to do some validation of the contents of message here and produce a meaningful error message
-            # to the caller if arguments are not as expected.
-
-            addin._fusionMainThreadRunner.doTaskInMainFusionThread(
-                lambda : addin.runScript(
-                    script_path     = message.get("script"),
-                    debug           = bool(message.get("debug")),
-                    debugpy_path    = message.get("debugpy_path"),
-                    debug_port      = int(message.get("debug_port",0)),
-                    prefixes_of_submodules_not_to_be_reloaded = message.get("prefixes_of_submodules_not_to_be_reloaded")
-                )
-            )
+            try:
+                message = ( json.loads(request_json['message']) if isinstance(request_json['message'], str) else request_json['message'])
+                validateMessage(message)
+            except ValueError as e:
+                self.sendResponse(400, f"Bad request: {e}".encode())
+                return
+            self.observeParseTime()
+
+            # a batch request (whose scripts we run in one main-thread task, reporting the outcome of each under 
+            # 'results') is always waited for (until its timeout, if any, expires).
+            if 'scripts' in message or message.get('wait'):
+                timeout = message.get('timeout')
+                job = addin.submitRunScriptRequestAndWait(message, timeout=(float(timeout) if timeout is not None else None))
+                self.sendResponse((200 if job.isCompleted else 202), json.dumps(job.toDict()).encode(), content_type="application/json")
+            else:
+                job = addin.submitRunScriptRequest(message)
+                self.sendResponse(202, json.dumps(job.toDict()).encode(), content_type="application/json")
+        except Exception:
+            self.sendResponse(500, traceback.format_exc().encode())
+            logger.error("An error occurred while handling http request.", exc_info=sys.exc_info())
 
-            self.send_response(200)
-            self.end_headers()
-            self.wfile.write(b"done")
+    def do_GET(self):
+        try:
+            parsedUrl = urllib.parse.urlparse(self.path)
+            pathParts = [part for part in parsedUrl.path.split('/') if part]
+            query = urllib.parse.parse_qs(parsedUrl.query)
+            if pathParts == ['ready']:
+                self.sendResponse((200 if startupReport.isReady else 503), json.dumps({'ready': startupReport.isReady}).encode(), content_type="application/json")
+            elif pathParts == ['metrics']:
+                self.sendResponse(200, metricsRegistry.render().encode(), content_type=metrics.CONTENT_TYPE)
+            elif pathParts == ['startup_report']:
+                self.sendResponse(200, json.dumps(startupReport.toDict()).encode(), content_type="application/json")
+            elif pathParts == ['import_graphs']:
+                self.sendResponse(200, json.dumps({'import_graphs': [graph.toDict() for graph in addin.getImportGraphs()]}).encode(), content_type="application/json")
+            elif pathParts == ['import_graph']:
+                script_path = query.get('script', [''])[0]
+                graph = addin.getImportGraph(script_path)
+                if graph is None:
+                    self.sendResponse(404, f"We have not run the script {script_path}.".encode())
+                else:
+                    self.sendResponse(200, json.dumps(graph.toDict()).encode(), content_type="application/json")
+            elif pathParts == ['jobs']:
+                self.sendResponse(200, json.dumps({'jobs': [job.toDict() for job in addin.getJobs()]}).encode(), content_type="application/json")
+            elif len(pathParts) == 2 and pathParts[0] == 'jobs':
+                job = addin.getJob(pathParts[1])
+                if job is None:
+                    self.sendResponse(404, f"There is no job having id {pathParts[1]} (perhaps it has been evicted).".encode())
+                else:
+                    self.sendResponse(200, json.dumps(job.toDict()).encode(), content_type="application/json")
+            else:
+                self.sendResponse(404, f"Unknown path: {self.path}".encode())
         except Exception:
-            self.send_response(500)
-            self.end_headers()
-            self.wfile.write(traceback.format_exc().encode())
+            self.sendResponse(500, traceback.format_exc().encode())
             logger.error("An error occurred while handling http request.", exc_info=sys.exc_info())
 
 addin = AddIn()
@@ -0,0 +1,221 @@
+"""
+This module defines the compact binary format in which the add-in exports bulk model data (see the /export endpoint),
+a registry of extractors (functions, run in Fusion's main thread, that gather such data from the active design), and
+a few built-in extractors.
+
+An extractor is called as extractor(app, arguments) (arguments being a dict of the request's extractor-specific
+arguments) and returns a dict mapping array names to arrays.  An array may be anything supporting the buffer protocol
+(e.g. an array.array or a numpy array), a ShapedArray (a flat array with a multi-dimensional shape), a list of numbers, a list of equal-length lists of numbers (which becomes a
+two-dimensional array), or a list of strings.  A script run by the add-in can add its own extractors by calling
+binary_export.registerExtractor().
+
+The format (all integers little-endian):
+
+    4 bytes     MAGIC
+    uint32      FORMAT_VERSION
+    uint32      the length, in bytes, of the header
+    header      utf-8 json: {"arrays": [{"name", "dtype", "shape", "offset", "nbytes"}, ...]}
+    padding     zeros, up to a multiple of 8 bytes
+    data        the arrays, each starting at its offset (relative to the start of the data, and a multiple of 8)
+
+Each dtype is a numpy-style type string (e.g. '<f8', '<i4', '|u1'), so that a reader can map each array directly onto
+the buffer (e.g. with numpy.frombuffer(), or memoryview.cast()), with no per-element decoding.  The exception is the
+dtype 'utf-8', which denotes a list of strings, encoded in utf-8 and separated by NUL characters.
+"""
+
+import array
+import json
+import struct
+import sys
+
+import adsk.core
+import adsk.fusion
+
+from typing import Any, Callable, Iterator
+
+MAGIC = b'FSRX'
+FORMAT_VERSION = 1
+ALIGNMENT = 8
+STRINGS_DTYPE = 'utf-8'
+
+_PREFIX = struct.Struct('<4sII')
+
+# maps the kind of each struct format character to the numpy dtype kind.
+_DTYPE_KINDS = {
+    **{x: 'i' for x in 'bhilq'},
+    **{x: 'u' for x in 'BHILQ'},
+    **{x: 'f' for x in 'efd'},
+    '?': 'b'
+}
+
+Extractor = Callable[[adsk.core.Application, dict], 'dict[str, Any]']
+_extractors : 'dict[str, Extractor]' = {}
+
+
+def registerExtractor(name: str, extractor: Extractor) -> None:
+    _extractors[name] = extractor
+
+def getExtractor(name: str) -> Extractor:
+    """ raises KeyError if there is no extractor named name. """
+    return _extractors[name]
+
+def extractorNames() -> 'list[str]':
+    return sorted(_extractors)
+
+
+class ShapedArray(object):
+    """ gives the flat array data (anything that _encodeArray() accepts) the multi-dimensional shape. """
+    def __init__(self, data: Any, shape: 'list[int]'):
+        self.data = data
+        self.shape = list(shape)
+
+
+def _padding(length: int) -> int:
+    return -length % ALIGNMENT
+
+def _encodeArray(value: Any) -> 'tuple[str, list[int], memoryview]':
+    """ returns the dtype, the shape, and the (little-endian) data of value. """
+    if isinstance(value, ShapedArray):
+        dtype, shape, data = _encodeArray(value.data)
+        numberOfElements = 1
+        for x in value.shape:
+            numberOfElements *= x
+        if dtype == STRINGS_DTYPE or len(shape) != 1 or shape[0] != numberOfElements:
+            raise ValueError(f"Unable to give an array of shape {shape} the shape {value.shape}.")
+        return (dtype, value.shape, data)
+    if isinstance(value, (list, tuple)):
+        if value and all(isinstance(x, str) for x in value):
+            return (STRINGS_DTYPE, [len(value)], memoryview('\0'.join(value).encode('utf-8')))
+        shape = [len(value)]
+        if value and all(isinstance(x, (list, tuple)) for x in value):
+            shape.append(len(value[0]))
+            if any(len(x) != shape[1] for x in value):
+                raise ValueError("The rows of a two-dimensional array must all have the same length.")
+            value = [y for x in value for y in x]
+        dtype, _, data = _encodeArray(array.array('q' if all(isinstance(x, int) for x in value) else 'd', value))
+        return (dtype, shape, data)
+
+    view = memoryview(value)
+    byteOrder, typeCode = (view.format[0], view.format[1:]) if view.format[0] in '@=<>!' else ('@', view.format)
+    if typeCode not in _DTYPE_KINDS:
+        raise ValueError(f"Unsupported array format {view.format!r}.")
+    shape = list(view.shape)
+    # (we take the itemsize before copying a non-contiguous view, because the copy is a flat buffer of bytes.)
+    itemsize = view.itemsize
+    if not view.c_contiguous:
+        view = memoryview(view.tobytes())
+    isBigEndian = byteOrder in '>!' or (byteOrder in '@=' and sys.byteorder == 'big')
+    if isBigEndian and itemsize > 1:
+        swapped = array.array(typeCode, view.cast('B').tobytes())
+        swapped.byteswap()
+        view = memoryview(swapped)
+    dtype = ('|' if itemsize == 1 else '<') + _DTYPE_KINDS[typeCode] + str(itemsize)
+    return (dtype, shape, view.cast('B'))
+
+def encode(arrays: 'dict[str, Any]', chunkSize: int = 2**20) -> 'Iterator[memoryview]':
+    """ returns an iterator of chunks (none longer than chunkSize, except possibly the first, which holds the header)
+    that together make up the encoding of arrays.  The arrays are encoded up front (which is when any errors are
+    raised); the iterator merely slices the encoded data. """
+    entries = []
+    datas = []
+    offset = 0
+    for name, value in arrays.items():
+        dtype, shape, data = _encodeArray(value)
+        entries.append({'name': name, 'dtype': dtype, 'shape': shape, 'offset': offset, 'nbytes': data.nbytes})
+        datas.append(data)
+        offset += data.nbytes + _padding(data.nbytes)
+    header = json.dumps({'arrays': entries}).encode('utf-8')
+    prefix = _PREFIX.pack(MAGIC, FORMAT_VERSION, len(header)) + header
+    prefix += bytes(_padding(len(prefix)))
+
+    def chunks() -> 'Iterator[memoryview]':
+        yield memoryview(prefix)
+        for data in datas:
+            for start in range(0, data.nbytes, chunkSize):
+                yield data[start:start + chunkSize]
+            if _padding(data.nbytes):
+                yield memoryview(bytes(_padding(data.nbytes)))
+    return chunks()
+
+
+def _design(app: adsk.core.Application) -> adsk.fusion.Design:
+    design = adsk.fusion.Design.cast(app.activeProduct)
+    if not design:
+        raise ValueError("The active product is not a design.")
+    return design
+
+def _allBodies(design: adsk.fusion.Design) -> 'list[adsk.fusion.BRepBody]':
+    """ returns the bodies of all the components of design (in each component's own coordinates). """
+    return [body for component in design.allComponents for body in component.bRepBodies]
+
+def extractUserParameters(app: adsk.core.Application, arguments: dict) -> 'dict[str, Any]':
+    userParameters = _design(app).userParameters
+    parameters = [userParameters.item(i) for i in range(userParameters.count)]
+    return {
+        'names'         : [x.name for x in parameters],
+        'expressions'   : [x.expression for x in parameters],
+        'units'         : [x.unit for x in parameters],
+        # in Fusion's internal units (e.g. centimeters).
+        'values'        : array.array('d', (x.value for x in parameters))
+    }
+
+def extractFaceAreas(app: adsk.core.Application, arguments: dict) -> 'dict[str, Any]':
+    bodies = _allBodies(_design(app))
+    bodyIndices = array.array('i')
+    areas = array.array('d')
+    for bodyIndex, body in enumerate(bodies):
+        faces = body.faces
+        for i in range(faces.count):
+            bodyIndices.append(bodyIndex)
+            areas.append(faces.item(i).area)
+    return {'body_names': [x.name for x in bodies], 'body_indices': bodyIndices, 'areas': areas}
+
+def extractBodyMeshes(app: adsk.core.Application, arguments: dict) -> 'dict[str, Any]':
+    """ triangulates every body.  arguments may name the 'quality' (one of the adsk.fusion.TriangleMeshQualityOptions,
+    by default 'NormalQualityTriangleMesh').  The vertices of the i'th body are vertices[vertex_offsets[i]:vertex_offsets[i+1]],
+    and its triangles are triangles[triangle_offsets[i]:triangle_offsets[i+1]] (whose entries index into vertices). """
+    quality = getattr(adsk.fusion.TriangleMeshQualityOptions, arguments.get('quality', 'NormalQualityTriangleMesh'))
+    bodies = _allBodies(_design(app))
+    vertices = array.array('d')
+    triangles = array.array('i')
+    vertexOffsets = array.array('q', [0])
+    triangleOffsets = array.array('q', [0])
+    for body in bodies:
+        meshCalculator = body.meshManager.createMeshCalculator()
+        meshCalculator.setQuality(quality)
+        mesh = meshCalculator.calculate()
+        firstVertex = len(vertices) // 3
+        # (nodeCoordinatesAsDouble and nodeIndices each come back from Fusion in one call, as flat lists.)
+        vertices.extend(mesh.nodeCoordinatesAsDouble)
+        triangles.extend(firstVertex + x for x in mesh.nodeIndices)
+        vertexOffsets.append(len(vertices) // 3)
+        triangleOffsets.append(len(triangles) // 3)
+    return {
+        'body_names'        : [x.name for x in bodies],
+        'vertices'          : ShapedArray(vertices, [len(vertices) // 3, 3]),
+        'triangles'         : ShapedArray(triangles, [len(triangles) // 3, 3]),
+        'vertex_offsets'    : vertexOffsets,
+        'triangle_offsets'  : triangleOffsets
+    }
+
+def extractBodyVertices(app: adsk.core.Application, arguments: dict) -> 'dict[str, Any]':
+    """ the B-rep vertices of every body.  The vertices of the i'th body are vertices[vertex_offsets[i]:vertex_offsets[i+1]]. """
+    bodies = _allBodies(_design(app))
+    vertices = array.array('d')
+    vertexOffsets = array.array('q', [0])
+    for body in bodies:
+        bodyVertices = body.vertices
+        for i in range(bodyVertices.count):
+            point = bodyVertices.item(i).geometry
+            vertices.extend((point.x, point.y, point.z))
+        vertexOffsets.append(len(vertices) // 3)
+    return {
+        'body_names'        : [x.name for x in bodies],
+        'vertices'          : ShapedArray(vertices, [len(vertices) // 3, 3]),
+        'vertex_offsets'    : vertexOffsets
+    }
+
+registerExtractor('user_parameters', extractUserParameters)
+registerExtractor('face_areas', extractFaceAreas)
+registerExtractor('body_meshes', extractBodyMeshes)
+registerExtractor('body_vertices', extractBodyVertices)
@@ -0,0 +1,247 @@
+"""
+This module defines a class named CodeCache, which is a persistent, size-bounded, content-addressed cache of compiled
+code objects, along with a source file loader (CachingSourceFileLoader) that uses a CodeCache instead of __pycache__,
+and a meta path finder (CodeCacheFinder) that arranges for the submodules of our scripts to be loaded by such a loader.
+The function precompileScript() fills a CodeCache ahead of time (in any thread) with the compiled code of a script and
+of the submodules that it (statically) imports, so that loading the script costs little more than executing it.
+"""
+
+import hashlib
+import importlib.abc
+import importlib.machinery
+import importlib.util
+import logging
+import marshal
+import os
+import sys
+import threading
+import time
+import types
+import uuid
+
+from typing import Callable, Optional
+
+# called as sourceObserver(fullname, path, stat, source) when a CachingSourceFileLoader reads the source of a module,
+# stat having been taken before the source was read.
+SourceObserver = Callable[[str, str, os.stat_result, bytes], None]
+
+# when the cache outgrows its maximum size, we delete entries until its size is down to this fraction of the maximum, 
+# so that we scan the cache directory only once in a while, rather than on every put.
+EVICTION_TARGET_FRACTION = 0.8
+
+from submodule_reload_tracker import namesImportedBySource
+
+_logger = logging.getLogger(__name__)
+_logger.propagate = False
+
+
+class CodeCache(object):
+    """ Stores compiled code objects in files in directory, keyed by a hash of the source text, the source path (which
+    is baked into the code object), and the interpreter's bytecode version.  When the total size of the files exceeds
+    maximumSize bytes, the least-recently-used files are deleted.  (A cache hit refreshes the file's mtime, which
+    is how we keep track of recency.)  We keep a running total of the files' size, and scan the directory only when we
+    are created and when the total exceeds maximumSize, at which point we delete files until the total is down to 
+    EVICTION_TARGET_FRACTION of maximumSize.  This may be used from any thread.  compileObserver, if given, is called with
+    the length of time (in seconds) taken by each compilation that we do. """
+
+    FILE_EXTENSION = '.code'
+
+    def __init__(self, directory: str, maximumSize: int, logger: Optional[logging.Logger] = _logger, compileObserver: Optional[Callable[[float], None]] = None):
+        self._directory = directory
+        self._compileObserver = compileObserver
+        self._maximumSize = maximumSize
+        self._logger = logger
+        self._lock = threading.Lock()
+        self._numberOfHits : int = 0
+        self._numberOfMisses : int = 0
+        self._numberOfPrecompilations : int = 0
+        os.makedirs(self._directory, exist_ok=True)
+        # the total size of the files, as of the last scan, plus the size of the files that we have written since.  (An 
+        # entry that we overwrite, that another process writes, or that we find damaged and delete, is accounted for at the next scan.)
+        self._totalSize : int = sum(size for _, size, _ in self._scan())
+
+    def _pathOfEntry(self, source: bytes, sourcePath: str) -> str:
+        key = hashlib.sha256(
+            importlib.util.MAGIC_NUMBER
+            + (sys.implementation.cache_tag or '').encode() + b'\0'
+            + os.fsencode(sourcePath) + b'\0'
+            + source
+        ).hexdigest()
+        return os.path.join(self._directory, key + self.FILE_EXTENSION)
+
+    def get(self, source: bytes, sourcePath: str) -> Optional[types.CodeType]:
+        pathOfEntry = self._pathOfEntry(source, sourcePath)
+        try:
+            with open(pathOfEntry, 'rb') as f:
+                code = marshal.loads(f.read())
+            os.utime(pathOfEntry)
+        except FileNotFoundError:
+            code = None
+        except (OSError, EOFError, ValueError, TypeError):
+            # a damaged entry; get rid of it.
+            self._logger and self._logger.warning(f"Discarding unreadable code cache entry {pathOfEntry}", exc_info=sys.exc_info())
+            self._remove(pathOfEntry)
+            code = None
+        with self._lock:
+            if code is None:
+                self._numberOfMisses += 1
+            else:
+                self._numberOfHits += 1
+        return code
+
+    def contains(self, source: bytes, sourcePath: str) -> bool:
+        return os.path.exists(self._pathOfEntry(source, sourcePath))
+
+    def precompile(self, sourcePath: str) -> bytes:
+        """ makes sure that the cache holds the compiled code of the file at sourcePath, compiling it if necessary,
+        and returns the source.  Raises OSError if the file cannot be read and SyntaxError if it cannot be compiled. """
+        with open(sourcePath, 'rb') as f:
+            source = f.read()
+        if not self.contains(source, sourcePath):
+            self.put(source, sourcePath, self.compile(source, sourcePath))
+            with self._lock:
+                self._numberOfPrecompilations += 1
+        return source
+
+    def compile(self, source: bytes, sourcePath: str) -> types.CodeType:
+        """ compiles source (without consulting or filling the cache).  Raises SyntaxError if it cannot be compiled. """
+        startTime = time.perf_counter()
+        # (we compile the same way that SourceFileLoader.source_to_code() does.)
+        code = compile(source, sourcePath, 'exec', dont_inherit=True)
+        if self._compileObserver is not None:
+            self._compileObserver(time.perf_counter() - startTime)
+        return code
+
+    def put(self, source: bytes, sourcePath: str, code: types.CodeType) -> None:
+        pathOfEntry = self._pathOfEntry(source, sourcePath)
+        data = marshal.dumps(code)
+        # we write to a temporary file and then rename it, so that a reader never sees a partially-written entry.
+        temporaryPath = pathOfEntry + '.' + uuid.uuid4().hex + '.tmp'
+        try:
+            with open(temporaryPath, 'wb') as f:
+                f.write(data)
+            os.replace(temporaryPath, pathOfEntry)
+        except OSError:
+            self._logger and self._logger.warning(f"Unable to write code cache entry {pathOfEntry}", exc_info=sys.exc_info())
+            self._remove(temporaryPath)
+            return
+        with self._lock:
+            self._totalSize += len(data)
+            if self._totalSize > self._maximumSize:
+                self._evict()
+
+    def _scan(self) -> 'list[tuple[float, int, str]]':
+        """ returns the (mtime, size, path) of each of the files in the cache. """
+        entries = []
+        for entry in os.scandir(self._directory):
+            if entry.name.endswith(self.FILE_EXTENSION):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def _evict(self) -> None:
+        """ deletes the least-recently-used files until their total size is down to EVICTION_TARGET_FRACTION of the 
+        maximum size.  The caller must hold _lock. """
+        entries = self._scan()
+        totalSize = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if totalSize <= self._maximumSize * EVICTION_TARGET_FRACTION:
+                break
+            self._remove(path)
+            totalSize -= size
+        self._totalSize = totalSize
+
+    def _remove(self, path: str) -> None:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def statistics(self) -> 'dict[str, int]':
+        with self._lock:
+            return {'hits': self._numberOfHits, 'misses': self._numberOfMisses, 'precompilations': self._numberOfPrecompilations}
+
+
+class CachingSourceFileLoader(importlib.machinery.SourceFileLoader):
+    """ A SourceFileLoader that gets its code objects from (and puts newly-compiled code objects into) a CodeCache,
+    rather than from (and into) __pycache__.  sourceObserver, if given, is told of the source that we load. """
+
+    def __init__(self, fullname: str, path: str, codeCache: CodeCache, sourceObserver: Optional[SourceObserver] = None):
+        super().__init__(fullname, path)
+        self._codeCache = codeCache
+        self._sourceObserver = sourceObserver
+
+    def get_code(self, fullname: str) -> types.CodeType:
+        sourcePath = self.get_filename(fullname)
+        stat = (os.stat(sourcePath) if self._sourceObserver is not None else None)
+        source = self.get_data(sourcePath)
+        if self._sourceObserver is not None:
+            self._sourceObserver(fullname, sourcePath, stat, source)
+        code = self._codeCache.get(source, sourcePath)
+        if code is None:
+            code = self._codeCache.compile(source, sourcePath)
+            self._codeCache.put(source, sourcePath, code)
+        return code
+
+
+class CodeCacheFinder(importlib.abc.MetaPathFinder):
+    """ A meta path finder that finds the submodules of the registered top-level modules (our scripts, which are loaded
+    under synthetic names) in the usual way (by means of importlib.machinery.PathFinder), but arranges for any that
+    are ordinary source files to be loaded by a CachingSourceFileLoader (to which we pass sourceObserver). """
+
+    def __init__(self, codeCache: CodeCache, sourceObserver: Optional[SourceObserver] = None):
+        self._codeCache = codeCache
+        self._sourceObserver = sourceObserver
+        self._topLevelModuleNames : 'set[str]' = set()
+
+    def register(self, module_name: str) -> None:
+        self._topLevelModuleNames.add(module_name)
+
+    def find_spec(self, fullname: str, path=None, target=None) -> Optional[importlib.machinery.ModuleSpec]:
+        if '.' not in fullname or fullname.split('.')[0] not in self._topLevelModuleNames:
+            return None
+        spec = importlib.machinery.PathFinder.find_spec(fullname, path, target)
+        if spec is not None and type(spec.loader) is importlib.machinery.SourceFileLoader:
+            spec.loader = CachingSourceFileLoader(fullname, spec.origin, self._codeCache, sourceObserver=self._sourceObserver)
+        return spec
+
+
+def precompileScript(
+    script_path: str, 
+    module_name: str, 
+    codeCache: CodeCache, 
+    maximumNumberOfFiles: int = 1000,
+    logger: Optional[logging.Logger] = _logger
+) -> 'list[str]':
+    """ compiles (into codeCache) the script at script_path, which is to be loaded as the package module_name, and, 
+    transitively, each submodule that it imports by means of an import statement that names the submodule (other than
+    those that are already compiled).  This is intended to be called in some thread other than Fusion's main thread, before
+    the script is run.  Files that cannot be read or compiled are skipped (the error will surface when the script is run).
+    Returns the paths of the files considered. """
+    script_dir = os.path.dirname(os.path.abspath(script_path))
+    pending : 'list[tuple[str, str, bool]]' = [(module_name, os.path.abspath(script_path), True)]
+    visited : 'set[str]' = set()
+    while pending and len(visited) < maximumNumberOfFiles:
+        name, path, isPackage = pending.pop()
+        if path in visited:
+            continue
+        visited.add(path)
+        try:
+            source = codeCache.precompile(path)
+        except (OSError, SyntaxError, ValueError):
+            logger and logger.debug(f"unable to precompile {path}", exc_info=sys.exc_info())
+            continue
+        for importedName in namesImportedBySource(source, name, isPackage):
+            if not importedName.startswith(module_name + '.'):
+                continue
+            relativeParts = importedName[len(module_name) + 1:].split('.')
+            candidatePath = os.path.join(script_dir, *relativeParts)
+            if os.path.isfile(candidatePath + '.py'):
+                pending.append((importedName, candidatePath + '.py', False))
+            elif os.path.isfile(os.path.join(candidatePath, '__init__.py')):
+                pending.append((importedName, os.path.join(candidatePath, '__init__.py'), True))
+    return sorted(visited)
+
@@ -1,34 +1,157 @@
 """
 This module defines a class named FusionMainThreadRunner, which can be used to run an arbitrary closure in the main 
-Fusion thread.
+Fusion thread.  Each submitted closure is represented by a concurrent.futures.Future, so that any thread can 
+fire off many main-thread tasks and collect their results later (or await them, from asyncio code).
+
+Each task has a priority (INTERACTIVE_PRIORITY, NORMAL_PRIORITY, or BACKGROUND_PRIORITY).  Within a runner, higher-priority
+tasks are run first.  Across runners, a drain of one runner steps aside (re-firing its own event) while some other runner 
+has higher-priority tasks waiting, so that, for instance, script runs are not stuck behind a flood of log-message writes.  
+To guarantee that low-priority tasks are not starved, a task that has waited for longer than the runner's starvation threshold is 
+run next regardless of priority.
 """
 
 import adsk.core
 import adsk
 import adsk.fusion
+import collections
+import concurrent.futures
 import logging
 import queue
 import uuid
 import sys
 import threading
+import time
 import json
+import weakref
 
 from typing import Optional, Callable, Any
 
 _logger = logging.getLogger(__name__)
 _logger.propagate = False
 
+# the default length of time (in seconds) that one drain of the task queue may spend running tasks before
+# yielding control back to Fusion's event loop (so that the UI stays responsive during a burst of tasks).
+DEFAULT_DRAIN_TIME_BUDGET = 0.015
+
+# task priorities.  A smaller number means a more urgent task.
+INTERACTIVE_PRIORITY    = 0
+NORMAL_PRIORITY         = 1
+BACKGROUND_PRIORITY     = 2
+PRIORITIES = (INTERACTIVE_PRIORITY, NORMAL_PRIORITY, BACKGROUND_PRIORITY)
+
+# the default length of time (in seconds) after which a waiting task is run ahead of any higher-priority tasks.
+DEFAULT_STARVATION_THRESHOLD = 0.5
+
+# all the runners that currently exist, so that a runner can defer to other runners' more urgent tasks.
+_runners : 'weakref.WeakSet[FusionMainThreadRunner]' = weakref.WeakSet()
+
+class PriorityTaskQueue(object):
+    """ A thread-safe queue of tasks having one FIFO lane per priority.  get_nowait() returns the oldest task of the most 
+    urgent non-empty lane, unless the oldest task of some lane has been waiting for at least starvationThreshold seconds, 
+    in which case the longest-waiting such task is returned. """
+
+    def __init__(self, starvationThreshold: Optional[float] = DEFAULT_STARVATION_THRESHOLD):
+        self._starvationThreshold = starvationThreshold
+        self._lock = threading.Lock()
+        # each item of a lane is a (time of enqueueing, task) pair.
+        self._lanes : 'dict[int, collections.deque[tuple[float, Callable[[], Any]]]]' = {priority: collections.deque() for priority in PRIORITIES}
+
+    def put(self, task: Callable[[], Any], priority: int = NORMAL_PRIORITY) -> None:
+        with self._lock:
+            self._lanes[priority].append((time.monotonic(), task))
+
+    def _priorityOfNextTask(self) -> Optional[int]:
+        # the caller must hold self._lock.
+        nonEmptyPriorities = [priority for priority in PRIORITIES if self._lanes[priority]]
+        if not nonEmptyPriorities:
+            return None
+        if self._starvationThreshold is not None:
+            now = time.monotonic()
+            starvingPriorities = [priority for priority in nonEmptyPriorities if now - self._lanes[priority][0][0] >= self._starvationThreshold]
+            if starvingPriorities:
+                return min(starvingPriorities, key=lambda priority: self._lanes[priority][0][0])
+        return nonEmptyPriorities[0]
+
+    def peekPriority(self) -> Optional[int]:
+        """ returns the priority of the task that get_nowait() would return, or None if the queue is empty. """
+        with self._lock:
+            return self._priorityOfNextTask()
+
+    def isNextTaskStarving(self) -> bool:
+        with self._lock:
+            priority = self._priorityOfNextTask()
+            return (
+                priority is not None 
+                and self._starvationThreshold is not None 
+                and time.monotonic() - self._lanes[priority][0][0] >= self._starvationThreshold
+            )
+
+    def mostUrgentPriority(self) -> Optional[int]:
+        """ returns the most urgent priority of any waiting task (ignoring starvation), or None if the queue is empty. """
+        with self._lock:
+            return next((priority for priority in PRIORITIES if self._lanes[priority]), None)
+
+    def get_nowait(self) -> Callable[[], Any]:
+        with self._lock:
+            priority = self._priorityOfNextTask()
+            if priority is None:
+                raise queue.Empty
+            return self._lanes[priority].popleft()[1]
+
+    def qsize(self) -> int:
+        with self._lock:
+            return sum(len(lane) for lane in self._lanes.values())
+
+    def qsizeByPriority(self) -> 'dict[int, int]':
+        with self._lock:
+            return {priority: len(lane) for priority, lane in self._lanes.items()}
+
+    def empty(self) -> bool:
+        return self.qsize() == 0
+
 class FusionMainThreadRunner(object):
     def __init__(self,
-        logger: Optional[logging.Logger] = _logger
+        logger: Optional[logging.Logger] = _logger,
+        drainTimeBudget: Optional[float] = DEFAULT_DRAIN_TIME_BUDGET,
+        defaultPriority: int = NORMAL_PRIORITY,
+        starvationThreshold: Optional[float] = DEFAULT_STARVATION_THRESHOLD,
+        queueWaitObserver: Optional[Callable[[float], None]] = None
     ):
+        """ drainTimeBudget is the length of time (in seconds) that we may spend running tasks in response to one
+        processTasksRequested event.  Once the budget is spent, we fire the event again and return, so that Fusion
+        can process user input before we run the remaining tasks.  (A task that is already running is never 
+        interrupted, so a single long task can still exceed the budget.)  None means no limit. 
+        defaultPriority is the priority of tasks submitted without an explicit priority.
+        starvationThreshold is explained in PriorityTaskQueue.
+        queueWaitObserver, if given, is called (in the main thread) with the length of time (in seconds) that each task 
+        waited in the queue, just before the task is run. """
         self._app : adsk.core.Application = adsk.core.Application.get()
         self._logger = logger
-        self._taskQueue : queue.Queue[Callable[[], Any]] = queue.Queue()
+        self._drainTimeBudget = drainTimeBudget
+        self._defaultPriority = defaultPriority
+        self._taskQueue : PriorityTaskQueue = PriorityTaskQueue(starvationThreshold=starvationThreshold)
+        self._queueWaitObserver = queueWaitObserver
+        # true while our event handler is running tasks (possibly re-entrantly, if a task calls adsk.doEvents()).
+        self._isDraining : bool = False
         self._processTasksRequestedEventId : str = "fusion_main_thread_runner_" + str(uuid.uuid4())
         self._processTasksRequestedEvent = self._app.registerCustomEvent(self._processTasksRequestedEventId)
         self._processTasksRequestedEventHandler = self.ProcessTasksRequestedEventHandler(owner=self)
         self._processTasksRequestedEvent.add(self._processTasksRequestedEventHandler)
+        # _drainScheduled is true from the time we fire the processTasksRequested event until the event handler
+        # begins draining the queue.  While it is true, there is no need to fire the event again, because the pending 
+        # drain will pick up any task that we put in the queue.  _drainScheduled and the counters are guarded by _drainLock.
+        self._drainLock = threading.Lock()
+        self._drainScheduled : bool = False
+        self._numberOfTasksSubmitted : int = 0
+        self._numberOfCustomEventsFired : int = 0
+        self._numberOfCustomEventsSaved : int = 0
+        self._numberOfDrains : int = 0
+        self._numberOfDrainsCutShortByTimeBudget : int = 0
+        self._totalDrainDuration : float = 0.0
+        self._maximumDrainDuration : float = 0.0
+        self._maximumQueueDepth : int = 0
+        self._numberOfDrainsDeferredToOtherRunners : int = 0
+        _runners.add(self)
 
     def __del__(self):
         # clean up _processTasksRequestedEvent and the associated handler:
@@ -44,28 +167,109 @@ class FusionMainThreadRunner(object):
         self._processTasksRequestedEventHandler = None
         self._processTasksRequestedEvent = None
 
-    # def doTaskInMainFusionThread(self, task: Callable, wait: bool = False, suppressLogging: bool = False):
-    def doTaskInMainFusionThread(self, task: Callable, wait: bool = False):
-        # we ought to detect the case where this function is called and we are already in the main
-        # fusion thread, because we may want to respond to the wait parameter differently in that case.
-        
-        if wait:
-            _task = task
-            waitLock = threading.Lock()
-            waitLock.acquire()
-            def task():
-                result = _task()
-                waitLock.release()
-                # return result
+    def submitTask(self, task: Callable[[], Any], priority: Optional[int] = None) -> concurrent.futures.Future:
+        """ queues task to be run in the main Fusion thread, and returns (immediately) a future that will 
+        receive whatever task returns (or raises).  This may be called from any thread. 
+        priority defaults to the runner's defaultPriority. """
+        future : concurrent.futures.Future = concurrent.futures.Future()
+        submissionTime = time.perf_counter()
+        def runTask():
+            if not future.set_running_or_notify_cancel():
+                # the future was cancelled while the task was waiting in the queue.
+                return
+            if self._queueWaitObserver is not None:
+                self._queueWaitObserver(time.perf_counter() - submissionTime)
+            try:
+                future.set_result(task())
+            except BaseException as e:
+                future.set_exception(e)
+                self._logger and self._logger.error("A task run in the main Fusion thread raised an exception.", exc_info=sys.exc_info())
 
-        self._taskQueue.put(task)
-        # result :bool = self._app.fireCustomEvent(self._processTasksRequestedEventId,additionalInfo=json.dumps({'suppressLogging':suppressLogging}))
-        result :bool = self._app.fireCustomEvent(self._processTasksRequestedEventId)
+        self._taskQueue.put(runTask, (self._defaultPriority if priority is None else priority))
+        self._requestDrain()
+        return future
 
-        if wait:
-            # wait for waitLock to be released, which will happen when task() is run in the main thread.
-            waitLock.acquire()
+    def _requestDrain(self, isContinuation: bool = False) -> None:
+        """ fires the processTasksRequested event, unless a drain is already scheduled.  isContinuation is true when
+        the event handler itself is asking for another drain, having run out of time. """
+        with self._drainLock:
+            if not isContinuation:
+                self._numberOfTasksSubmitted += 1
+                self._maximumQueueDepth = max(self._maximumQueueDepth, self._taskQueue.qsize())
+            if self._drainScheduled:
+                self._numberOfCustomEventsSaved += 1
+                return
+            self._drainScheduled = True
+            self._numberOfCustomEventsFired += 1
+            # result :bool = self._app.fireCustomEvent(self._processTasksRequestedEventId,additionalInfo=json.dumps({'suppressLogging':suppressLogging}))
+            result :bool = self._app.fireCustomEvent(self._processTasksRequestedEventId)
+            if not result:
+                # the event was not queued, so no drain is pending; let the next submission try again.
+                self._drainScheduled = False
 
+    def statistics(self) -> dict:
+        """ returns counters describing how much work we have done, including how many 
+        custom-event firings we have avoided by coalescing. """
+        with self._drainLock:
+            return {
+                'tasksSubmitted'        : self._numberOfTasksSubmitted,
+                'customEventsFired'     : self._numberOfCustomEventsFired,
+                'customEventsSaved'     : self._numberOfCustomEventsSaved,
+                'queueDepth'            : self._taskQueue.qsize(),
+                'queueDepthByPriority'  : self._taskQueue.qsizeByPriority(),
+                'maximumQueueDepth'     : self._maximumQueueDepth,
+                'drains'                : self._numberOfDrains,
+                'drainsCutShortByTimeBudget' : self._numberOfDrainsCutShortByTimeBudget,
+                'totalDrainDuration'    : self._totalDrainDuration,
+                'maximumDrainDuration'  : self._maximumDrainDuration,
+                'drainsDeferredToOtherRunners' : self._numberOfDrainsDeferredToOtherRunners
+            }
+
+    def _shouldDeferToOtherRunners(self) -> bool:
+        """ returns true if some other runner, not currently in the middle of a drain, has tasks more urgent than our next task.
+        (In that case, that runner's event is already pending, and will be handled before our re-fired event.) """
+        ourPriority = self._taskQueue.peekPriority()
+        if ourPriority is None or self._taskQueue.isNextTaskStarving():
+            return False
+        for runner in list(_runners):
+            if runner is self or runner._isDraining:
+                continue
+            theirPriority = runner._taskQueue.mostUrgentPriority()
+            if theirPriority is not None and theirPriority < ourPriority:
+                return True
+        return False
+
+    def _recordDrain(self, duration: float, cutShort: bool) -> None:
+        with self._drainLock:
+            self._numberOfDrains += 1
+            self._totalDrainDuration += duration
+            self._maximumDrainDuration = max(self._maximumDrainDuration, duration)
+            if cutShort:
+                self._numberOfDrainsCutShortByTimeBudget += 1
+
+    async def doTaskInMainFusionThreadAsync(self, task: Callable[[], Any], priority: Optional[int] = None) -> Any:
+        """ an awaitable version of doTaskInMainFusionThread(task, wait=True), for use from an asyncio event loop
+        (running in some thread other than the main Fusion thread).  Awaiting does not tie up an OS thread,
+        so many main-thread tasks can be gathered at once. """
+        # (we import asyncio here, rather than at module load, because it is expensive to import and only asyncio code needs it.)
+        import asyncio
+        return await asyncio.wrap_future(self.submitTask(task, priority))
+
+    # def doTaskInMainFusionThread(self, task: Callable, wait: bool = False, suppressLogging: bool = False):
+    def doTaskInMainFusionThread(self, task: Callable, wait: bool = False, timeout: Optional[float] = None, priority: Optional[int] = None) -> Any:
+        """ queues task to be run in the main Fusion thread.  If wait is false, we return the future (see submitTask()) 
+        without waiting.  If wait is true, we block until task has been run, and return whatever task returned 
+        (or raise whatever task raised).  If, in that case, timeout (seconds) is not None and 
+        task has not finished within timeout seconds, we raise TimeoutError (task remains queued and will still be run). """
+        # we ought to detect the case where this function is called and we are already in the main
+        # fusion thread, because we may want to respond to the wait parameter differently in that case.
+        future = self.submitTask(task, priority)
+        if not wait:
+            return future
+        try:
+            return future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            raise TimeoutError(f"The task did not finish within {timeout} seconds.")
 
     class ProcessTasksRequestedEventHandler(adsk.core.CustomEventHandler):
         def __init__(self, owner: 'FusionMainThreadRunner'):
@@ -76,8 +280,33 @@ class FusionMainThreadRunner(object):
             # we have to be rather cautious about writing to the log in here, because our log handlers
             # might themselves call doTaskInMainFusionThread().
             # desrializedAdditionalInfo = json.loads(args.additionalInfo)
+
+            # from here on, any newly-submitted task must fire the event again, because we might already be
+            # past the point of picking it up.  (A task submitted before this point will be picked up by the loop below.)
+            with self._owner._drainLock:
+                self._owner._drainScheduled = False
+            drainStartTime = time.perf_counter()
+            cutShort = False
+            wasAlreadyDraining = self._owner._isDraining
+            self._owner._isDraining = True
             try:
                 while True:
+                    if self._owner._shouldDeferToOtherRunners():
+                        # let the other runner's (already-pending) event be handled first; we carry on in response to a fresh event.
+                        with self._owner._drainLock:
+                            self._owner._numberOfDrainsDeferredToOtherRunners += 1
+                        self._owner._requestDrain(isContinuation=True)
+                        break
+                    if (
+                        self._owner._drainTimeBudget is not None 
+                        and time.perf_counter() - drainStartTime >= self._owner._drainTimeBudget
+                        and not self._owner._taskQueue.empty()
+                    ):
+                        # we have used up our time budget; let Fusion's event loop run, and carry on 
+                        # with the remaining tasks in response to a fresh event.
+                        cutShort = True
+                        self._owner._requestDrain(isContinuation=True)
+                        break
                     try:
                         self._owner._logger.debug("getting from queue...")
                         task = self._owner._taskQueue.get_nowait()
@@ -87,9 +316,9 @@ class FusionMainThreadRunner(object):
                         break
                     self._owner._logger.debug("running a task that we have retrieved from the queue.")
                     result = task()
-                    self._owner._taskQueue.task_done()
 
             except Exception:
                 self._owner._logger and self._owner._logger.fatal("An error occurred while attempting to handle the processTasksRequested event", exc_info=sys.exc_info())
             finally:
-                pass
+                self._owner._isDraining = wasAlreadyDraining
+                self._owner._recordDrain(time.perf_counter() - drainStartTime, cutShort)
@@ -0,0 +1,91 @@
+"""
+This module defines FusionRpycService, the rpyc service that the add-in exposes.  Besides everything that
+rpyc's SlaveService offers (in which every attribute access on a remote object is a network round trip, carried out in
+one of the rpyc server's threads), it offers a few coarse-grained operations, each of which is carried out in one hop
+through Fusion's main thread and answers with a json string (which rpyc passes by value) rather than with netrefs:
+
+    conn = rpyc.connect('localhost', 18812)
+    json.loads(conn.root.run_script(json.dumps({'script': 'C:/work/my_script.py'})))
+    json.loads(conn.root.evaluate("app.activeProduct.rootComponent.name"))
+    json.loads(conn.root.get_properties("app.activeProduct.allParameters", ("name", "expression", "value")))
+
+This module imports rpyc, so it should itself be imported only when the rpyc server is started.
+"""
+
+import json
+import rpyc
+
+from typing import Any, Callable, Iterable
+
+
+class FusionRpycService(rpyc.SlaveService):
+    """ doTaskInMainFusionThread(task) runs task in Fusion's main thread and returns its result (or raises its exception).
+    runScript(message) runs a script as described by message (as for the http server) and returns a json-serializable
+    description of the outcome.  makeNamespace() returns the globals in which evaluate() and get_properties() evaluate
+    their source (e.g. {'adsk': adsk, 'app': app()}); it is called in Fusion's main thread.  serialize(value) returns
+    a json-serializable version of value. """
+
+    def __init__(self,
+        doTaskInMainFusionThread: Callable[[Callable[[], Any]], Any],
+        runScript: Callable[[dict], dict],
+        makeNamespace: Callable[[], dict],
+        serialize: Callable[[Any], Any]
+    ):
+        super().__init__()
+        self._doTaskInMainFusionThread = doTaskInMainFusionThread
+        self._runScript = runScript
+        self._makeNamespace = makeNamespace
+        self._serialize = serialize
+
+    def exposed_run_script(self, message_json: str) -> str:
+        """ runs a script, as described by the json text message_json (which has the same form as the message of
+        an http run-script request), waits for it to finish, and returns a json description of the outcome. """
+        return json.dumps(self._runScript(json.loads(message_json)))
+
+    def exposed_evaluate(self, source: str) -> str:
+        """ evaluates (in Fusion's main thread) source, which is either an expression or a block of statements (which
+        should assign the value to be returned to the variable named result), and returns the value as json text. """
+        def evaluate() -> Any:
+            namespace = self._makeNamespace()
+            try:
+                code = compile(source, '<rpyc evaluate>', 'eval')
+            except SyntaxError:
+                exec(compile(source, '<rpyc evaluate>', 'exec'), namespace)
+                return self._serialize(namespace.get('result'))
+            return self._serialize(eval(code, namespace))
+        return json.dumps(self._doTaskInMainFusionThread(evaluate))
+
+    def exposed_get_properties(self, expression: str, property_names: Iterable[str]) -> str:
+        """ evaluates (in Fusion's main thread) expression, and returns, as json text, a map from each of property_names
+        to the value of that property of the resulting object, or, if the object is a collection (i.e. something having
+        count and item(), like most of Fusion's collections, or else something iterable), a list of such maps, one per
+        item.  A property name may be a dotted path (e.g. 'physicalProperties.mass').  If getting a property raises
+        an exception, the property's value is {'error': <the exception's description>}. """
+        property_names = tuple(property_names)
+
+        def propertiesOf(item: Any) -> dict:
+            properties = {}
+            for property_name in property_names:
+                try:
+                    value = item
+                    for part in property_name.split('.'):
+                        value = getattr(value, part)
+                    properties[property_name] = self._serialize(value)
+                except Exception as e:
+                    properties[property_name] = {'error': repr(e)}
+            return properties
+
+        def getProperties() -> Any:
+            obj = eval(compile(expression, '<rpyc get_properties>', 'eval'), self._makeNamespace())
+            if hasattr(obj, 'count') and hasattr(obj, 'item') and not isinstance(obj, (str, bytes, list, tuple)):
+                return [propertiesOf(obj.item(i)) for i in range(obj.count)]
+            if isinstance(obj, (list, tuple)) or (hasattr(obj, '__iter__') and not isinstance(obj, (str, bytes, dict))):
+                return [propertiesOf(item) for item in obj]
+            return propertiesOf(obj)
+        return json.dumps(self._doTaskInMainFusionThread(getProperties))
+
+    # a SlaveService connection does not map names onto their exposed_ counterparts (it allows access to all attributes
+    # instead), so we make the operations available under their plain names, too.
+    run_script = exposed_run_script
+    evaluate = exposed_evaluate
+    get_properties = exposed_get_properties
@@ -0,0 +1,183 @@
+"""
+This module defines the classes ImportGraph and ImportGraphRecorder.  While a script's top-level module is being
+executed (and its run() function called), an ImportGraphRecorder watches every import statement executed by the
+script's modules, and records, in the script's ImportGraph, which modules import which, and how long the top-level
+code of each newly-loaded module took to execute.
+"""
+
+import builtins
+import importlib.util
+import sys
+import threading
+import time
+
+from typing import Optional
+
+
+class ImportGraph(object):
+    """ The import graph of one script.  The nodes are module names; there is an edge from a to b if a module a executed
+    an import statement that imported b.  Only edges whose importer is the script's top-level module or one of its
+    submodules are recorded, but the imported module may be anything (e.g. numpy).  Because a module that is kept
+    loaded between runs does not re-execute its import statements, the graph accumulates over runs: a module's edges
+    and timings are replaced only when the module is executed again. """
+
+    def __init__(self, module_name: str):
+        self.module_name = module_name
+        self._lock = threading.Lock()
+        # maps each importer to the set of modules that it imports.
+        self._imports : 'dict[str, set[str]]' = {}
+        # maps each module to the time (in seconds) spent executing its top-level code, excluding the time spent
+        # loading other modules that it imported.  If one import statement caused several modules to be loaded (e.g. a
+        # package and its submodule, or 'from . import x, y'), the modules' times cannot be told apart, and their total 
+        # is attributed to the one having the longest name.
+        self._selfTimes : 'dict[str, float]' = {}
+        # like _selfTimes, but including the time spent loading the modules that it imported.
+        self._cumulativeTimes : 'dict[str, float]' = {}
+
+    def merge(self, imports: 'dict[str, set[str]]', selfTimes: 'dict[str, float]', cumulativeTimes: 'dict[str, float]') -> None:
+        """ incorporates the observations of one run.  The edges of each module whose top-level code was executed 
+        during the run are replaced; the edges observed for other modules (e.g. by import statements inside functions) 
+        are added to the ones we already know.  Modules that are no longer loaded are forgotten. """
+        with self._lock:
+            for executedModuleName in selfTimes:
+                self._imports[executedModuleName] = set()
+            for importer, imported in imports.items():
+                self._imports.setdefault(importer, set()).update(imported)
+            self._selfTimes.update(selfTimes)
+            self._cumulativeTimes.update(cumulativeTimes)
+            for forgottenModuleName in [x for x in set(self._imports) | set(self._selfTimes) if x not in sys.modules]:
+                self._imports.pop(forgottenModuleName, None)
+                self._selfTimes.pop(forgottenModuleName, None)
+                self._cumulativeTimes.pop(forgottenModuleName, None)
+
+    def imports(self) -> 'dict[str, set[str]]':
+        """ returns a copy of the edges, as a map from each importer to the set of modules that it imports. """
+        with self._lock:
+            return {importer: set(imported) for importer, imported in self._imports.items()}
+
+    def transitiveImporters(self) -> 'dict[str, set[str]]':
+        """ returns a map from each module to the set of all the modules that import it, directly or indirectly. """
+        importedBy : 'dict[str, set[str]]' = {}
+        for importer, imported in self.imports().items():
+            for x in imported:
+                importedBy.setdefault(x, set()).add(importer)
+        transitiveImporters = {}
+        for moduleName in importedBy:
+            seen = set()
+            frontier = [moduleName]
+            while frontier:
+                for importer in importedBy.get(frontier.pop(), ()):
+                    if importer not in seen and importer != moduleName:
+                        seen.add(importer)
+                        frontier.append(importer)
+            transitiveImporters[moduleName] = seen
+        return transitiveImporters
+
+    def toDict(self, numberOfModulesToList: int = 20) -> dict:
+        """ returns a json-serializable description of the graph, including the numberOfModulesToList modules
+        having the most expensive top-level code and the numberOfModulesToList modules having the largest transitive fan-in
+        (i.e. the most modules that depend on them). """
+        imports = self.imports()
+        transitiveImporters = self.transitiveImporters()
+        with self._lock:
+            selfTimes = dict(self._selfTimes)
+            cumulativeTimes = dict(self._cumulativeTimes)
+        return {
+            'module_name': self.module_name,
+            'imports': {importer: sorted(imported) for importer, imported in imports.items()},
+            'most_expensive_top_level_code': [
+                {'module': x, 'self_time': selfTimes[x], 'cumulative_time': cumulativeTimes.get(x)}
+                for x in sorted(selfTimes, key=selfTimes.get, reverse=True)[:numberOfModulesToList]
+            ],
+            'largest_transitive_fan_in': [
+                {'module': x, 'fan_in': len(transitiveImporters[x])}
+                for x in sorted(transitiveImporters, key=lambda x: len(transitiveImporters[x]), reverse=True)[:numberOfModulesToList]
+            ]
+        }
+
+
+class ImportGraphRecorder(object):
+    """ A context manager that, while active, replaces builtins.__import__ with a wrapper that records, into graph, the
+    import statements executed by graph's script's modules.  It observes only 'import' statements (not calls to
+    importlib.import_module()).  It is meant to be used in Fusion's main thread, around the execution of a script;
+    imports executed in other threads at the same time are passed straight through. """
+
+    def __init__(self, graph: ImportGraph):
+        self._graph = graph
+        self._search_prefix = graph.module_name + '.'
+        self._thread : Optional[threading.Thread] = None
+        self._originalImport = None
+        self._imports : 'dict[str, set[str]]' = {}
+        self._selfTimes : 'dict[str, float]' = {}
+        self._cumulativeTimes : 'dict[str, float]' = {}
+        # one entry per import (or timed execution) in progress: the total cumulative time of the modules loaded by
+        # the imports nested inside it.
+        self._nestedTimes : 'list[float]' = []
+
+    def _isScriptModule(self, name: Optional[str]) -> bool:
+        return isinstance(name, str) and (name == self._graph.module_name or name.startswith(self._search_prefix))
+
+    def __enter__(self) -> 'ImportGraphRecorder':
+        self._thread = threading.current_thread()
+        self._originalImport = builtins.__import__
+        builtins.__import__ = self._import
+        return self
+
+    def __exit__(self, *args) -> None:
+        builtins.__import__ = self._originalImport
+        self._graph.merge(self._imports, self._selfTimes, self._cumulativeTimes)
+
+    def timeExecution(self, name: str, execute) -> None:
+        """ calls execute(), recording the time taken as the top-level time of the module named name
+        (intended for the script's own top-level module, which is not loaded by an import statement). """
+        self._nestedTimes.append(0.0)
+        startTime = time.perf_counter()
+        try:
+            execute()
+        finally:
+            elapsed = time.perf_counter() - startTime
+            nestedTime = self._nestedTimes.pop()
+            self._selfTimes[name] = elapsed - nestedTime
+            self._cumulativeTimes[name] = elapsed
+            self._imports.setdefault(name, set())
+            if self._nestedTimes:
+                self._nestedTimes[-1] += elapsed
+
+    def _import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        importer = (globals or {}).get('__name__')
+        if threading.current_thread() is not self._thread or not self._isScriptModule(importer):
+            return self._originalImport(name, globals, locals, fromlist, level)
+        try:
+            if level:
+                package = globals.get('__package__') or (importer if '__path__' in globals else importer.rpartition('.')[0])
+                absoluteName = importlib.util.resolve_name('.' * level + name, package)
+            else:
+                absoluteName = name
+        except (ImportError, ValueError, AttributeError):
+            return self._originalImport(name, globals, locals, fromlist, level)
+
+        # the modules that this import statement might load: the named module, its parent packages, and (for a
+        # 'from x import y' statement) x.y, in case y is a submodule.
+        nameParts = absoluteName.split('.')
+        candidates = ['.'.join(nameParts[:i]) for i in range(1, len(nameParts) + 1)]
+        candidates += [absoluteName + '.' + x for x in (fromlist or ()) if x != '*']
+        notYetLoaded = [x for x in candidates if x not in sys.modules]
+
+        self._nestedTimes.append(0.0)
+        startTime = time.perf_counter()
+        try:
+            return self._originalImport(name, globals, locals, fromlist, level)
+        finally:
+            elapsed = time.perf_counter() - startTime
+            nestedTime = self._nestedTimes.pop()
+            newlyLoaded = [x for x in notYetLoaded if x in sys.modules]
+            if newlyLoaded:
+                # we attribute the time to the module having the longest name (see ImportGraph._selfTimes).
+                loadedModuleName = max(newlyLoaded, key=len)
+                self._selfTimes[loadedModuleName] = elapsed - nestedTime
+                self._cumulativeTimes[loadedModuleName] = elapsed
+                self._imports.setdefault(loadedModuleName, set())
+                if self._nestedTimes:
+                    self._nestedTimes[-1] += elapsed
+            importedNames = ([absoluteName] if name else []) + [absoluteName + '.' + x for x in (fromlist or ()) if x != '*']
+            self._imports.setdefault(importer, set()).update(x for x in importedNames if x in sys.modules)
@@ -0,0 +1,49 @@
+"""
+This module defines a class named InterpreterStateSnapshot, which records the names in sys.modules and the contents
+of sys.path, so that both can later be put back the way they were (e.g. after running a script that imports
+third-party packages or adds directories to sys.path).
+"""
+
+import logging
+import sys
+
+from typing import Iterable, Optional
+
+from submodule_reload_tracker import unbindFromParent
+
+_logger = logging.getLogger(__name__)
+_logger.propagate = False
+
+
+class InterpreterStateSnapshot(object):
+    def __init__(self, logger: Optional[logging.Logger] = _logger):
+        self._logger = logger
+        self._moduleNames : 'frozenset[str]' = frozenset(sys.modules)
+        self._path : 'list[str]' = list(sys.path)
+
+    def restore(self, namesOfPackagesToRemove: Iterable[str], namesOfPackagesToKeep: Iterable[str] = ()) -> 'list[str]':
+        """ removes from sys.modules every module that has been added since the snapshot was taken and that is, or is a 
+        submodule of, one of namesOfPackagesToRemove (typically the top-level packages that a script imported; modules 
+        that other threads or add-ins loaded in the meantime are left alone), except modules that are, or are submodules 
+        of, one of namesOfPackagesToKeep or of the standard library (which stay loaded, so that they need not be imported 
+        again).  A removed module is also unbound from its parent package, if the parent stays loaded.  Restores sys.path 
+        (in place) to its contents at the time of the snapshot.  Returns the names of the removed modules. """
+        namesOfPackagesToRemove = tuple(namesOfPackagesToRemove)
+        prefixesOfPackagesToRemove = tuple(x + '.' for x in namesOfPackagesToRemove)
+        # (sys.stdlib_module_names exists in Python 3.10 and later.)
+        namesOfPackagesToKeep = tuple(namesOfPackagesToKeep) + tuple(getattr(sys, 'stdlib_module_names', ()))
+        prefixesOfPackagesToKeep = tuple(x + '.' for x in namesOfPackagesToKeep)
+        namesOfModulesToRemove = [
+            x for x in sys.modules.keys() - self._moduleNames
+            if (x in namesOfPackagesToRemove or x.startswith(prefixesOfPackagesToRemove))
+            and not (x in namesOfPackagesToKeep or x.startswith(prefixesOfPackagesToKeep))
+        ]
+        # (we remove submodules before their parents, so that each parent is still loaded when we unbind its submodules.)
+        for x in sorted(namesOfModulesToRemove, key=len, reverse=True):
+            unbindFromParent(x)
+            sys.modules.pop(x, None)
+        if sys.path != self._path:
+            self._logger and self._logger.debug(f"restoring sys.path (removing {[x for x in sys.path if x not in self._path]})")
+            sys.path[:] = self._path
+        self._logger and self._logger.debug(f"removed {len(namesOfModulesToRemove)} module(s) added since the snapshot: {sorted(namesOfModulesToRemove)}")
+        return namesOfModulesToRemove
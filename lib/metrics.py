@@ -0,0 +1,172 @@
+"""
+This module defines a few cheap, thread-safe metric types (Counter, Histogram, and FunctionMetric, whose value is read
+from a function when the metrics are rendered) and a MetricsRegistry, which renders all of its metrics in Prometheus's
+text exposition format (see the add-in's /metrics endpoint).  Updating a metric costs a lock acquisition and an addition
+or two, so metrics can be updated freely in hot paths (including Fusion's main thread).
+
+Several metrics may share a name, provided that they have the same type and distinct labels; they are rendered as one
+metric family.
+"""
+
+import bisect
+import contextlib
+import threading
+import time
+
+from typing import Callable, Iterator, Optional
+
+# the content type of MetricsRegistry.render()'s output.
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# the default upper bounds (in seconds) of a Histogram's buckets, which suit durations from a fraction of a
+# millisecond (e.g. parsing a request) to a minute (e.g. a slow script).
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _formatLabels(labels: 'dict[str, str]') -> str:
+    if not labels:
+        return ''
+    def escape(value: str) -> str:
+        return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+    return '{' + ','.join(f'{name}="{escape(str(value))}"' for name, value in labels.items()) + '}'
+
+def _escapeHelp(help: str) -> str:
+    return help.replace('\\', '\\\\').replace('\n', '\\n')
+
+def _formatValue(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter(object):
+    TYPE = 'counter'
+
+    def __init__(self, name: str, help: str, labels: 'Optional[dict[str, str]]' = None):
+        self.name = name
+        self.help = help
+        self.labels = dict(labels or {})
+        self._lock = threading.Lock()
+        self._value : float = 0
+
+    def inc(self, amount: float = 1) -> None:
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self) -> float:
+        return self._value
+
+    def samples(self) -> 'Iterator[tuple[str, dict[str, str], float]]':
+        yield (self.name, self.labels, self._value)
+
+
+class FunctionMetric(object):
+    """ a counter or gauge (according to type) whose value is whatever function returns at the time of rendering.
+    This suits quantities that something else already keeps track of (e.g. the depth of a queue). """
+
+    def __init__(self, type: str, name: str, help: str, function: Callable[[], float], labels: 'Optional[dict[str, str]]' = None):
+        self.TYPE = type
+        self.name = name
+        self.help = help
+        self.labels = dict(labels or {})
+        self._function = function
+
+    def samples(self) -> 'Iterator[tuple[str, dict[str, str], float]]':
+        yield (self.name, self.labels, self._function())
+
+
+class Histogram(object):
+    """ counts observations (typically durations, in seconds) in buckets having the given upper bounds, and keeps
+    their count and sum. """
+    TYPE = 'histogram'
+
+    def __init__(self, name: str, help: str, labels: 'Optional[dict[str, str]]' = None, buckets: 'tuple[float, ...]' = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = dict(labels or {})
+        self._upperBounds = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        # the number of observations in each bucket (not cumulative), the last entry counting those above the largest bound.
+        self._bucketCounts : 'list[int]' = [0] * (len(self._upperBounds) + 1)
+        self._sum : float = 0.0
+        self._count : int = 0
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self._upperBounds, value)
+        with self._lock:
+            self._bucketCounts[index] += 1
+            self._sum += value
+            self._count += 1
+
+    @contextlib.contextmanager
+    def time(self):
+        """ a context manager that observes the time (in seconds) spent in its body, even if the body raises. """
+        startTime = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - startTime)
+
+    def samples(self) -> 'Iterator[tuple[str, dict[str, str], float]]':
+        with self._lock:
+            bucketCounts = list(self._bucketCounts)
+            sum_ = self._sum
+            count = self._count
+        cumulativeCount = 0
+        for upperBound, bucketCount in zip((*self._upperBounds, float('inf')), bucketCounts):
+            cumulativeCount += bucketCount
+            yield (self.name + '_bucket', {**self.labels, 'le': _formatValue(float(upperBound))}, cumulativeCount)
+        yield (self.name + '_sum', self.labels, sum_)
+        yield (self.name + '_count', self.labels, count)
+
+
+class MetricsRegistry(object):
+    """ creates and keeps metrics, each of whose names is prefixed with namespace and an underscore. """
+
+    def __init__(self, namespace: str = ''):
+        self._prefix = (namespace + '_' if namespace else '')
+        self._lock = threading.Lock()
+        self._metrics : list = []
+
+    def _add(self, metric):
+        with self._lock:
+            for existingMetric in self._metrics:
+                if existingMetric.name == metric.name and (existingMetric.TYPE != metric.TYPE or existingMetric.labels == metric.labels):
+                    raise ValueError(f"There is already a {existingMetric.TYPE} named {metric.name} having the labels {existingMetric.labels}.")
+            self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help: str, labels: 'Optional[dict[str, str]]' = None) -> Counter:
+        """ name should not end in _total, which we append. """
+        return self._add(Counter(self._prefix + name + '_total', help, labels))
+
+    def histogram(self, name: str, help: str, labels: 'Optional[dict[str, str]]' = None, buckets: 'tuple[float, ...]' = DEFAULT_BUCKETS) -> Histogram:
+        return self._add(Histogram(self._prefix + name, help, labels, buckets))
+
+    def gaugeFunction(self, name: str, help: str, function: Callable[[], float], labels: 'Optional[dict[str, str]]' = None) -> FunctionMetric:
+        return self._add(FunctionMetric('gauge', self._prefix + name, help, function, labels))
+
+    def counterFunction(self, name: str, help: str, function: Callable[[], float], labels: 'Optional[dict[str, str]]' = None) -> FunctionMetric:
+        """ function must return a count that never decreases.  name should not end in _total, which we append. """
+        return self._add(FunctionMetric('counter', self._prefix + name + '_total', help, function, labels))
+
+    def render(self) -> str:
+        """ returns all the metrics in Prometheus's text exposition format.  A FunctionMetric whose function raises
+        is left out. """
+        with self._lock:
+            metrics = list(self._metrics)
+        families : 'dict[str, list]' = {}
+        for metric in metrics:
+            families.setdefault(metric.name, []).append(metric)
+        lines = []
+        for name, family in families.items():
+            lines.append(f"# HELP {name} {_escapeHelp(family[0].help)}")
+            lines.append(f"# TYPE {name} {family[0].TYPE}")
+            for metric in family:
+                try:
+                    samples = list(metric.samples())
+                except Exception:
+                    continue
+                lines.extend(f"{sampleName}{_formatLabels(labels)} {_formatValue(value)}" for sampleName, labels, value in samples)
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,140 @@
+"""
+This module defines a class named ScriptProfiler, with which the add-in profiles (on request) the loading and running of
+a script, by means of one of two profilers:
+
+    'cprofile'  the standard library's deterministic profiler.  Its output is the data that cProfile.Profile.dump_stats()
+                writes (a marshalled dict), which pstats.Stats (and tools like snakeviz) can read.  Every function call
+                is recorded, which makes a script run noticeably slower.
+    'sample'    a sampling profiler: a background thread records the stack of the profiled thread every
+                samplingInterval seconds.  Its output is the stacks in the "collapsed" (folded) format
+                ("outermost;...;innermost count" per line), which flame graph tools (flamegraph.pl, speedscope)
+                can read.  The overhead is small and does not depend on what the script does, so this suits long runs.
+
+Unless a profile is requested, none of this runs (and cProfile is not imported), so profiling costs nothing when it is off.
+"""
+
+import base64
+import collections
+import marshal
+import sys
+import threading
+import time
+import types
+
+from typing import Optional
+
+PROFILERS = ('cprofile', 'sample')
+
+# the default length of time (in seconds) between samples of the 'sample' profiler.
+DEFAULT_SAMPLING_INTERVAL = 0.005
+
+
+class SamplingProfiler(object):
+    """ samples, every interval seconds, the stack of the thread whose ident is threadIdent, from a background thread. """
+
+    def __init__(self, threadIdent: int, interval: float = DEFAULT_SAMPLING_INTERVAL):
+        self._threadIdent = threadIdent
+        self._interval = interval
+        # maps each stack (a tuple of frame descriptions, outermost first) to the number of samples in which we saw it.
+        self._stackCounts : 'collections.Counter[tuple[str, ...]]' = collections.Counter()
+        # the descriptions of the code objects that we have seen (describing a code object is relatively expensive).
+        self._codeDescriptions : 'dict[types.CodeType, str]' = {}
+        self._stopRequested = threading.Event()
+        self._samplerThread : Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._samplerThread = threading.Thread(target=self._sample, daemon=True, name="script_profiler_sampler")
+        self._samplerThread.start()
+
+    def stop(self) -> None:
+        self._stopRequested.set()
+        if self._samplerThread is not None:
+            self._samplerThread.join()
+
+    def _describe(self, code: types.CodeType) -> str:
+        description = self._codeDescriptions.get(code)
+        if description is None:
+            # (the collapsed format separates frames with semicolons, and a stack from its count with the last space on the line.)
+            description = f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})".replace(';', ':')
+            self._codeDescriptions[code] = description
+        return description
+
+    def _sample(self) -> None:
+        while not self._stopRequested.wait(self._interval):
+            frame = sys._current_frames().get(self._threadIdent)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(self._describe(frame.f_code))
+                frame = frame.f_back
+            stack.reverse()
+            self._stackCounts[tuple(stack)] += 1
+
+    @property
+    def numberOfSamples(self) -> int:
+        return sum(self._stackCounts.values())
+
+    def collapsedStacks(self) -> str:
+        return ''.join(f"{';'.join(stack)} {count}\n" for stack, count in self._stackCounts.most_common())
+
+
+class ScriptProfiler(object):
+    """ profiles, with the profiler named profilerName (one of PROFILERS), the calling thread from start() until stop().
+    Raises ValueError if there is no such profiler. """
+
+    def __init__(self, profilerName: str, samplingInterval: float = DEFAULT_SAMPLING_INTERVAL):
+        if profilerName not in PROFILERS:
+            raise ValueError(f"There is no profiler named {profilerName!r}.  The profilers are {PROFILERS}.")
+        self._profilerName = profilerName
+        self._samplingInterval = samplingInterval
+        self._profiler = None
+        self._startTime : Optional[float] = None
+        self._duration : Optional[float] = None
+
+    def start(self) -> None:
+        if self._profilerName == 'cprofile':
+            import cProfile
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        else:
+            self._profiler = SamplingProfiler(threading.get_ident(), interval=self._samplingInterval)
+            self._profiler.start()
+        self._startTime = time.perf_counter()
+
+    def stop(self) -> None:
+        self._duration = time.perf_counter() - self._startTime
+        if self._profilerName == 'cprofile':
+            self._profiler.disable()
+            self._profiler.create_stats()
+        else:
+            self._profiler.stop()
+
+    @property
+    def isStopped(self) -> bool:
+        return self._duration is not None
+
+    def _data(self) -> bytes:
+        if self._profilerName == 'cprofile':
+            return marshal.dumps(self._profiler.stats)
+        return self._profiler.collapsedStacks().encode('utf-8')
+
+    def report(self, outputPath: Optional[str] = None) -> dict:
+        """ returns a json-serializable description of the profile, which, if outputPath is given, we save to the file
+        at outputPath, and otherwise include in the description (base64-encoded, under the key 'data'). """
+        report = {
+            'profiler'  : self._profilerName,
+            'format'    : ('pstats' if self._profilerName == 'cprofile' else 'collapsed'),
+            'duration'  : self._duration
+        }
+        if self._profilerName == 'sample':
+            report['samples'] = self._profiler.numberOfSamples
+            report['sampling_interval'] = self._samplingInterval
+        data = self._data()
+        if outputPath:
+            with open(outputPath, 'wb') as outputFile:
+                outputFile.write(data)
+            report['path'] = outputPath
+        else:
+            report['data'] = base64.b64encode(data).decode('ascii')
+        return report
@@ -0,0 +1,154 @@
+"""
+This module defines the classes ScriptRunJob, ScriptBatchRunJob, and ScriptRunJobStore, which the add-in uses to keep 
+track of run-script requests, so that a client can submit a request, receive a job id, and later ask what became of the job.
+"""
+
+import collections
+import concurrent.futures
+import threading
+import time
+import uuid
+
+from typing import Optional, Any
+
+
+class ScriptRunJob(object):
+    """ records the life cycle of one run-script request: 'queued' -> ('waiting_for_debugger' -> 'queued' ->) 'running' -> 
+    one of 'succeeded', 'failed', or 'skipped'.  A job that is queued or waiting for the debugger can instead be 'cancelled'. """
+
+    QUEUED      = 'queued'
+    WAITING_FOR_DEBUGGER = 'waiting_for_debugger'
+    RUNNING     = 'running'
+    SUCCEEDED   = 'succeeded'
+    FAILED      = 'failed'
+    SKIPPED     = 'skipped'
+    CANCELLED   = 'cancelled'
+    COMPLETED_STATUSES = (SUCCEEDED, FAILED, SKIPPED, CANCELLED)
+
+    def __init__(self, runScriptArguments: dict, debugAttachTimeout: Optional[float] = None):
+        self.id                 : str               = uuid.uuid4().hex
+        self.runScriptArguments : dict              = runScriptArguments
+        self.status             : str               = self.QUEUED
+        self.submitted_at       : float             = time.time()
+        self.started_at         : Optional[float]   = None
+        self.finished_at        : Optional[float]   = None
+        self.error              : Optional[str]     = None
+        self.return_value       : Any               = None
+        # the description of the run's profile (see ScriptProfiler.report()), if the run was profiled.
+        self.profile            : Optional[dict]    = None
+        # set when the job reaches one of the completed statuses, so that a thread can wait for the job.
+        self.finished           : threading.Event   = threading.Event()
+        # how long (in seconds) to wait for a debugger client to attach, in debug mode, before giving up (None means forever).
+        self.debugAttachTimeout : Optional[float]   = debugAttachTimeout
+        # set when someone asks for the job to be cancelled.
+        self.cancelRequested    : threading.Event   = threading.Event()
+        # the future of the main-thread task that will run the job (while the job is queued).
+        self.future             : Optional[concurrent.futures.Future] = None
+
+    @property
+    def isCompleted(self) -> bool:
+        return self.status in self.COMPLETED_STATUSES
+
+    @property
+    def runScriptArgumentsToBeDebugged(self) -> Optional[dict]:
+        """ the arguments of the run that is to be debugged (so that a debugger client must attach before the job is
+        run), or None if there is no such run. """
+        return (self.runScriptArguments if self.runScriptArguments['debug'] and self.runScriptArguments['script_path'] else None)
+
+    def markWaitingForDebugger(self) -> None:
+        self.status = self.WAITING_FOR_DEBUGGER
+
+    def markQueued(self) -> None:
+        self.status = self.QUEUED
+
+    def markStarted(self) -> None:
+        self.started_at = time.time()
+        self.status = self.RUNNING
+
+    def markFinished(self, result: dict) -> None:
+        """ result is the dict returned by AddIn.runScript(). """
+        self.finished_at = time.time()
+        self.error = result.get('error')
+        self.return_value = result.get('return_value')
+        self.profile = result.get('profile')
+        self.status = result.get('status', self.FAILED)
+        self.finished.set()
+
+    def toDict(self) -> dict:
+        """ returns a json-serializable description of the job. """
+        return {
+            'job_id'        : self.id,
+            'script'        : self.runScriptArguments.get('script_path'),
+            'status'        : self.status,
+            'submitted_at'  : self.submitted_at,
+            'started_at'    : self.started_at,
+            'finished_at'   : self.finished_at,
+            'queued_duration'    : (self.started_at - self.submitted_at) if self.started_at is not None else None,
+            'run_duration'       : (self.finished_at - self.started_at) if (self.finished_at is not None and self.started_at is not None) else None,
+            'error'         : self.error,
+            'return_value'  : self.return_value,
+            'profile'       : self.profile
+        }
+
+
+class ScriptBatchRunJob(ScriptRunJob):
+    """ records the life cycle of a batch run-script request, whose scripts are run one after another in a single 
+    main-thread task.  Each item of listOfRunScriptArguments is a dict of keyword arguments for AddIn.runScript().  The 
+    job's result has, besides 'status' and 'error', 'results': the list of the scripts' results (see AddIn.runScripts()). """
+
+    def __init__(self, listOfRunScriptArguments: 'list[dict]', debugAttachTimeout: Optional[float] = None):
+        super().__init__({}, debugAttachTimeout=debugAttachTimeout)
+        self.listOfRunScriptArguments : 'list[dict]'            = listOfRunScriptArguments
+        self.results                  : Optional['list[dict]']  = None
+
+    @property
+    def runScriptArgumentsToBeDebugged(self) -> Optional[dict]:
+        """ the arguments of the first of the runs that are to be debugged (we start debugging with its debugpy_path 
+        and debug_port), or None if there is no such run. """
+        return next((x for x in self.listOfRunScriptArguments if x['debug'] and x['script_path']), None)
+
+    def markFinished(self, result: dict) -> None:
+        self.results = result.get('results')
+        super().markFinished(result)
+
+    def toDict(self) -> dict:
+        return {
+            **super().toDict(),
+            'script'        : None,
+            'scripts'       : [x.get('script_path') for x in self.listOfRunScriptArguments],
+            'results'       : self.results
+        }
+
+
+class ScriptRunJobStore(object):
+    """ A thread-safe collection of ScriptRunJob objects, keyed by job id.  Jobs that have not yet completed
+    are always kept.  Of the completed jobs, only the most recently completed maximumNumberOfCompletedJobs
+    are kept; older completed jobs are evicted, so that a long session does not accumulate jobs forever. """
+
+    def __init__(self, maximumNumberOfCompletedJobs: int = 256):
+        self._maximumNumberOfCompletedJobs = maximumNumberOfCompletedJobs
+        self._lock = threading.Lock()
+        self._jobs : 'dict[str, ScriptRunJob]' = {}
+        # ids of the completed jobs, oldest-completed first.
+        self._completedJobIds : 'collections.OrderedDict[str, None]' = collections.OrderedDict()
+
+    def add(self, job: ScriptRunJob) -> ScriptRunJob:
+        with self._lock:
+            self._jobs[job.id] = job
+        return job
+
+    def get(self, jobId: str) -> Optional[ScriptRunJob]:
+        with self._lock:
+            return self._jobs.get(jobId)
+
+    def values(self) -> 'list[ScriptRunJob]':
+        with self._lock:
+            return list(self._jobs.values())
+
+    def markFinished(self, job: ScriptRunJob, result: dict) -> None:
+        job.markFinished(result)
+        with self._lock:
+            self._completedJobIds[job.id] = None
+            while len(self._completedJobIds) > self._maximumNumberOfCompletedJobs:
+                evictedJobId, _ = self._completedJobIds.popitem(last=False)
+                self._jobs.pop(evictedJobId, None)
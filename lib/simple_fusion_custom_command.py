@@ -1,14 +1,68 @@
-from PIL import Image
-from PIL import ImageFont
-from PIL import ImageDraw 
 import os
 from typing import Optional, Callable
 import adsk.core
 import adsk.fusion
 import datetime 
+import functools
+import hashlib
 import tempfile
 import logging
+import shutil
 import sys
+import uuid
+
+# where we keep the rendered icons (one directory per distinct icon), so that creating a command whose icon we have 
+# rendered before (in this process or an earlier one) costs nothing more than Fusion reading the files.
+ICON_CACHE_DIRECTORY = os.path.join(tempfile.gettempdir(), "simple_fusion_custom_command_icons")
+ICON_SIZES = (16, 32, 64)
+ICON_FONT = "arial.ttf"
+# bump this whenever the way we render icons changes, so that icons rendered the old way are not reused.
+ICON_RENDERING_VERSION = 1
+
+
+@functools.lru_cache(maxsize=None)
+def _loadFont(font: str, size: int):
+    """ returns the (PIL) font named font, at size, loading it only once per process. """
+    from PIL import ImageFont
+    return ImageFont.truetype(font, size)
+
+def iconResourceFolder(
+    text: str, 
+    sizes: 'tuple[int, ...]' = ICON_SIZES, 
+    font: str = ICON_FONT, 
+    cacheDirectory: str = ICON_CACHE_DIRECTORY,
+    logger: Optional[logging.Logger] = None
+) -> str:
+    """ returns the path of a directory containing, for each size in sizes, an icon file named f"{size}x{size}.png"
+    showing text (in black on white, in font), suitable to be passed as the resourceFolder argument of 
+    addButtonDefinition().  The directory is rendered (by means of PIL, which we import only then) only if it 
+    is not already in cacheDirectory. """
+    key = hashlib.sha1(repr((ICON_RENDERING_VERSION, text, tuple(sizes), font)).encode()).hexdigest()
+    resourceFolder = os.path.join(cacheDirectory, key)
+    if os.path.isdir(resourceFolder):
+        return resourceFolder
+
+    from PIL import Image
+    from PIL import ImageDraw 
+    logger and logger.debug(f"rendering icons for {text!r} into {resourceFolder}")
+    # we render into a temporary directory and then rename it, so that nobody ever sees a partially-rendered icon directory.
+    temporaryFolder = resourceFolder + '.' + uuid.uuid4().hex + '.tmp'
+    os.makedirs(temporaryFolder)
+    try:
+        for imageSize in sizes:
+            img = Image.new(mode='RGB',size=(imageSize, imageSize),color='white')
+            draw :ImageDraw.ImageDraw = ImageDraw.Draw(img)
+            draw.text((imageSize/2,imageSize/2),text ,font=_loadFont(font, imageSize), fill='black',anchor='mm')
+            img.save(os.path.join(temporaryFolder, f"{imageSize}x{imageSize}.png"))
+        try:
+            os.rename(temporaryFolder, resourceFolder)
+        except OSError:
+            # someone else has rendered the same icons in the meantime (or the rename is otherwise impossible).
+            if not os.path.isdir(resourceFolder):
+                raise
+    finally:
+        shutil.rmtree(temporaryFolder, ignore_errors=True)
+    return resourceFolder
 
 
 class SimpleFusionCustomCommand(object):
@@ -28,18 +82,11 @@ class SimpleFusionCustomCommand(object):
         self._commandId = self._name # TO-DO: ensure that the commandId is unique and doesn't contain any illegal characters.
         self._app = app
         self._logger = logger
-        self._resourcesDirectory = tempfile.TemporaryDirectory()
-        self._logger and self._logger.debug("self._resourcesDirectory.name: " + self._resourcesDirectory.name)
+        # the icon directory belongs to the (persistent) icon cache, and is shared by all the commands whose icons show the same text.
+        self._resourcesDirectory = iconResourceFolder(text=self._name[0].capitalize(), logger=self._logger)
+        self._logger and self._logger.debug("self._resourcesDirectory: " + self._resourcesDirectory)
         self._logger and self._logger.debug("sys.version: " + sys.version)
 
-        iconText = self._name[0].capitalize()
-        for imageSize in (16, 32, 64):
-            img = Image.new(mode='RGB',size=(imageSize, imageSize),color='white')
-            draw :ImageDraw.ImageDraw = ImageDraw.Draw(img)
-            font = ImageFont.truetype("arial.ttf",imageSize)
-            draw.text((imageSize/2,imageSize/2),iconText ,font=font, fill='black',anchor='mm')
-            img.save(os.path.join(self._resourcesDirectory.name, f"{imageSize}x{imageSize}.png"))
-
         self._commandDefinition = self._app.userInterface.commandDefinitions.addButtonDefinition(
             #id=
             self._commandId,
@@ -49,7 +96,7 @@ class SimpleFusionCustomCommand(object):
             self._name,
             #resourceFolder(optional)=
             # (i'm omitting the resourceFolder argument for now)
-            self._resourcesDirectory.name
+            self._resourcesDirectory
         )
         self._commandCreatedHandler = self.CommandCreatedEventHandler(owner=self)
         self._commandDefinition.commandCreated.add(self._commandCreatedHandler)
@@ -62,8 +109,6 @@ class SimpleFusionCustomCommand(object):
         del self._commandDefinition
         self._toolbarControl.deleteMe()
         del self._toolbarControl
-        self._resourcesDirectory.cleanup()
-        del self._resourcesDirectory
 
 
     def doNothingAction(self, eventArgs: adsk.core.CommandEventArgs) -> None:
@@ -0,0 +1,110 @@
+"""
+This module defines a class named StartupReport, which records how long each phase of the add-in's startup took (and
+in which thread), and how long each module imported by the add-in's own import statements took to import, so that we
+can see what the add-in adds to Fusion's launch time.  It also keeps track of whether startup has finished.
+"""
+
+import builtins
+import contextlib
+import importlib
+import sys
+import threading
+import time
+import types
+
+from typing import Optional
+
+
+class StartupReport(object):
+    def __init__(self):
+        self._startTime = time.perf_counter()
+        self._lock = threading.Lock()
+        # one entry per phase: name, thread, start (in seconds since this report was created), and duration (in seconds).
+        self._phases : 'list[dict]' = []
+        # one entry per timed import: module name, duration (in seconds), and the number of modules that the import loaded.
+        self._imports : 'list[dict]' = []
+        self._ready = threading.Event()
+        self._error : Optional[str] = None
+        self._importerName : Optional[str] = None
+        self._originalImport = None
+
+    def _elapsed(self) -> float:
+        return time.perf_counter() - self._startTime
+
+    @contextlib.contextmanager
+    def phase(self, name: str):
+        """ a context manager that records the time spent in its body as the phase named name. """
+        start = self._elapsed()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._phases.append({
+                    'phase': name,
+                    'thread': threading.current_thread().name,
+                    'start': start,
+                    'duration': self._elapsed() - start
+                })
+
+    def _recordImport(self, name: str, duration: float, numberOfModulesLoaded: int) -> None:
+        with self._lock:
+            self._imports.append({'module': name, 'duration': duration, 'modules_loaded': numberOfModulesLoaded})
+
+    def importModule(self, name: str) -> types.ModuleType:
+        """ imports (and returns) the module named name, recording how long that took. """
+        numberOfModulesBefore = len(sys.modules)
+        start = time.perf_counter()
+        module = importlib.import_module(name)
+        self._recordImport(name, time.perf_counter() - start, len(sys.modules) - numberOfModulesBefore)
+        return module
+
+    def startTimingImportsOf(self, importerName: str) -> None:
+        """ starts recording the time taken by each import statement executed by the module named importerName (typically,
+        the caller's __name__), until stopTimingImports() is called.  Only the importer's own import statements are
+        recorded; the imports that they cause in turn are included in their time. """
+        self._importerName = importerName
+        self._originalImport = builtins.__import__
+        builtins.__import__ = self._import
+
+    def stopTimingImports(self) -> None:
+        if self._originalImport is not None:
+            builtins.__import__ = self._originalImport
+            self._originalImport = None
+
+    def _import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        if (globals or {}).get('__name__') != self._importerName:
+            return self._originalImport(name, globals, locals, fromlist, level)
+        numberOfModulesBefore = len(sys.modules)
+        start = time.perf_counter()
+        try:
+            return self._originalImport(name, globals, locals, fromlist, level)
+        finally:
+            self._recordImport(name, time.perf_counter() - start, len(sys.modules) - numberOfModulesBefore)
+
+    def markReady(self) -> None:
+        self._ready.set()
+
+    def markFailed(self, error: str) -> None:
+        self._error = error
+        self._ready.set()
+
+    @property
+    def isReady(self) -> bool:
+        return self._ready.is_set() and self._error is None
+
+    def waitUntilReady(self, timeout: Optional[float] = None) -> bool:
+        return self._ready.wait(timeout) and self._error is None
+
+    def toDict(self) -> dict:
+        """ returns a json-serializable description of the startup, with the imports listed slowest first. """
+        with self._lock:
+            phases = list(self._phases)
+            imports = sorted(self._imports, key=lambda x: x['duration'], reverse=True)
+        return {
+            'ready'             : self.isReady,
+            'error'             : self._error,
+            'seconds_since_start' : self._elapsed(),
+            'phases'            : phases,
+            'imports'           : imports,
+            'total_import_time' : sum(x['duration'] for x in imports)
+        }
@@ -0,0 +1,94 @@
+"""
+This module defines a class named SubmoduleIndex, which keeps, for each registered top-level module (i.e. each of our
+scripts), a sorted list of the names of its loaded submodules.  The index is kept up to date by a meta path finder
+(SubmoduleIndexingFinder) that notices each import of a submodule of a registered module, so that finding a script's
+submodules (optionally excluding those under given prefixes) costs time proportional to the number of the script's
+own submodules, rather than to the number of all the modules in sys.modules.
+"""
+
+import bisect
+import importlib.abc
+import sys
+import threading
+
+from typing import Iterable, Optional
+
+
+class SubmoduleIndex(object):
+    def __init__(self):
+        self._lock = threading.Lock()
+        # maps each registered top-level module name to the sorted list of names of (possibly) loaded submodules.
+        # A name may linger in the list after the module has left sys.modules; such names are pruned when they are looked up.
+        self._names : 'dict[str, list[str]]' = {}
+
+    def register(self, module_name: str) -> None:
+        """ starts indexing the submodules of module_name.  The first time module_name is registered, we seed the index
+        by scanning sys.modules once. """
+        with self._lock:
+            if module_name in self._names:
+                return
+            search_prefix = module_name + '.'
+            self._names[module_name] = sorted(x for x in list(sys.modules) if x.startswith(search_prefix))
+
+    def isRegistered(self, module_name: str) -> bool:
+        return module_name in self._names
+
+    def add(self, name: str) -> None:
+        """ notes that the submodule name is (about to be) loaded.  Has no effect if its top-level module is not registered. """
+        names = self._names.get(name.split('.')[0])
+        if names is None or name == name.split('.')[0]:
+            return
+        with self._lock:
+            i = bisect.bisect_left(names, name)
+            if i == len(names) or names[i] != name:
+                names.insert(i, name)
+
+    def discard(self, name: str) -> None:
+        names = self._names.get(name.split('.')[0])
+        if names is None:
+            return
+        with self._lock:
+            i = bisect.bisect_left(names, name)
+            if i < len(names) and names[i] == name:
+                del names[i]
+
+    def submodulesOf(self, module_name: str, excludingPrefixes: Iterable[str] = ()) -> 'list[str]':
+        """ returns the names of the loaded submodules of module_name, except those whose name starts with
+        module_name + '.' + x for any x in excludingPrefixes.  module_name must be registered. """
+        search_prefix = module_name + '.'
+        with self._lock:
+            names = self._names[module_name]
+            # prune the names of modules that have since left sys.modules.
+            names[:] = [x for x in names if x in sys.modules]
+            # the names under each excluded prefix form a contiguous run of the sorted list.
+            excludedIndices = set()
+            for x in excludingPrefixes:
+                excludedIndices.update(range(*_rangeOfNamesHavingPrefix(names, search_prefix + x)))
+            return [x for i, x in enumerate(names) if i not in excludedIndices]
+
+    def immediateSubmodulesOf(self, module_name: str) -> 'list[str]':
+        """ returns the names of the loaded submodules of module_name that are immediate children of module_name. """
+        return [x for x in self.submodulesOf(module_name) if '.' not in x[len(module_name) + 1:]]
+
+
+def _rangeOfNamesHavingPrefix(sortedNames: 'list[str]', prefix: str) -> 'tuple[int, int]':
+    """ returns (lo, hi) such that sortedNames[lo:hi] are exactly the names that start with prefix. """
+    lo = bisect.bisect_left(sortedNames, prefix)
+    if not prefix:
+        return (lo, len(sortedNames))
+    # the smallest string greater than every string having the prefix.
+    upperBound = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    return (lo, bisect.bisect_left(sortedNames, upperBound, lo))
+
+
+class SubmoduleIndexingFinder(importlib.abc.MetaPathFinder):
+    """ A meta path finder that finds nothing, but adds to index the name of every submodule of a registered module that
+    the import system looks for.  It should be placed at the front of sys.meta_path. """
+
+    def __init__(self, index: SubmoduleIndex):
+        self._index = index
+
+    def find_spec(self, fullname: str, path=None, target=None) -> None:
+        if '.' in fullname:
+            self._index.add(fullname)
+        return None
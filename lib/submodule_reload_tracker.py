@@ -0,0 +1,254 @@
+"""
+This module defines a class named SubmoduleReloadTracker, which remembers a fingerprint of the source file of each
+loaded submodule of a script, so that, before the script is run again, only those submodules whose source file
+has changed (together with the submodules that depend on them) need to be unloaded.
+"""
+
+import ast
+import hashlib
+import importlib.util
+import logging
+import os
+import sys
+import types
+
+from typing import Optional
+
+from submodule_index import SubmoduleIndex
+
+_logger = logging.getLogger(__name__)
+_logger.propagate = False
+
+
+class SourceFingerprint(object):
+    """ identifies the content of a source file.  The (cheap) mtime and size are compared first; only if they
+    differ do we compare the (expensive) content hash, so that merely touching a file does not count as a change. 
+    If source is given, it is the content that was actually loaded, and stat must have been taken before the file
+    was read (so that an edit made in between shows up as a change); otherwise, we stat and read the file now. """
+
+    def __init__(self, path: str, stat: Optional[os.stat_result] = None, source: Optional[bytes] = None):
+        self.path = path
+        if source is None:
+            stat = os.stat(path)
+            with open(path, 'rb') as f:
+                source = f.read()
+        self.mtime_ns   : int = stat.st_mtime_ns
+        self.size       : int = stat.st_size
+        self.source     : bytes = source
+        self.sha1       : str = hashlib.sha1(self.source).hexdigest()
+
+    @staticmethod
+    def hashOfFile(path: str) -> str:
+        with open(path, 'rb') as f:
+            return hashlib.sha1(f.read()).hexdigest()
+
+    def isStale(self) -> bool:
+        """ returns true if the file has changed (or vanished) since the fingerprint was taken. """
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return True
+        if (stat.st_mtime_ns, stat.st_size) == (self.mtime_ns, self.size):
+            return False
+        try:
+            sha1 = SourceFingerprint.hashOfFile(self.path)
+        except OSError:
+            return True
+        if sha1 != self.sha1:
+            return True
+        # the content is unchanged; remember the new stat so that next time the cheap comparison suffices.
+        self.mtime_ns, self.size = stat.st_mtime_ns, stat.st_size
+        return False
+
+
+class SubmoduleReloadTracker(object):
+    def __init__(self, logger: Optional[logging.Logger] = _logger, submoduleIndex: Optional[SubmoduleIndex] = None):
+        """ if submoduleIndex is given, we use it to find the loaded submodules of a (registered) module, 
+        rather than scanning all of sys.modules. """
+        self._logger = logger
+        self._submoduleIndex = submoduleIndex
+        # maps the name of each loaded submodule to the fingerprint of its source file (or to None
+        # if the submodule has no source file, as is the case for a namespace package).
+        self._fingerprints : 'dict[str, Optional[SourceFingerprint]]' = {}
+        # maps the name of each loaded submodule to the names of the modules named in its import statements.
+        self._importedNames : 'dict[str, set[str]]' = {}
+        # maps the name of each submodule loaded since the last call of recordLoadedSubmodules() to the fingerprint of 
+        # the source from which it was loaded (see noteLoadedSource()).
+        self._fingerprintsAtLoadTime : 'dict[str, SourceFingerprint]' = {}
+
+    def _loadedSubmodules(self, module_name: str, prefixes_of_submodules_to_exclude: 'list[str]' = []) -> 'dict[str, types.ModuleType]':
+        search_prefix = module_name + '.'
+        if self._submoduleIndex is not None and self._submoduleIndex.isRegistered(module_name):
+            names = self._submoduleIndex.submodulesOf(module_name, prefixes_of_submodules_to_exclude)
+        else:
+            names = [
+                x for x in list(sys.modules) 
+                if x.startswith(search_prefix) and not any(x.startswith(search_prefix + y) for y in prefixes_of_submodules_to_exclude)
+            ]
+        return {x: sys.modules[x] for x in names if x in sys.modules}
+
+    def noteLoadedSource(self, name: str, path: str, stat: os.stat_result, source: bytes) -> None:
+        """ notes that the module named name is being loaded from source, the content of the file at path, whose stat
+        was taken before it was read.  This is intended to be called by the loader (see code_cache.CachingSourceFileLoader). """
+        if '.' in name:
+            self._fingerprintsAtLoadTime[name] = SourceFingerprint(path, stat=stat, source=source)
+
+    def recordLoadedSubmodules(self, module_name: str) -> None:
+        """ starts tracking each loaded submodule of module_name that we are not already tracking, by means of the 
+        fingerprint of the source from which it was loaded (see noteLoadedSource()).  This is intended to be called 
+        after the script has been run.  A submodule that was loaded without our being told of its source (which
+        happens only if its loader is not a CachingSourceFileLoader) is fingerprinted from its file as it is now, which 
+        misses an edit made between the load and now. """
+        fingerprintsAtLoadTime, self._fingerprintsAtLoadTime = self._fingerprintsAtLoadTime, {}
+        for loaded_module_name, loaded_module in self._loadedSubmodules(module_name).items():
+            if loaded_module_name in self._fingerprints:
+                continue
+            path = getattr(loaded_module, '__file__', None)
+            try:
+                fingerprint = fingerprintsAtLoadTime.get(loaded_module_name)
+                if fingerprint is None or fingerprint.path != path:
+                    fingerprint = (SourceFingerprint(path) if path else None)
+            except OSError:
+                # we cannot fingerprint the file, so we do not track the module, and it will be unloaded before the next run.
+                continue
+            self._fingerprints[loaded_module_name] = fingerprint
+            self._importedNames[loaded_module_name] = (
+                namesImportedBySource(fingerprint.source, loaded_module_name, isPackage=hasattr(loaded_module, '__path__')) 
+                if fingerprint is not None else set()
+            )
+            # we have no further need of the source text.
+            if fingerprint is not None: 
+                fingerprint.source = b''
+
+    def unloadChangedSubmodules(self, 
+        module_name: str, 
+        prefixes_of_submodules_not_to_be_reloaded: 'list[str]',
+        observedImports: 'Optional[dict[str, set[str]]]' = None
+    ) -> 'list[str]':
+        """ unloads each loaded submodule of module_name whose source file has changed since it was loaded (or which
+        we are not tracking), along with every submodule that depends on (i.e. refers to) an unloaded submodule,
+        and every descendant of an unloaded package.  observedImports (e.g. from an ImportGraph), if given, maps 
+        module names to the names of modules that they have been seen to import, and supplements the dependencies that we 
+        find by inspecting the modules.  Submodules whose name starts with module_name + '.' + x, for
+        any x in prefixes_of_submodules_not_to_be_reloaded, are never unloaded.  Returns the names of the unloaded submodules. """
+        loaded_submodules = self._loadedSubmodules(module_name, prefixes_of_submodules_not_to_be_reloaded)
+
+        # reasons maps the name of each submodule to be unloaded to a human-readable explanation.
+        reasons : 'dict[str, str]' = {}
+        for loaded_module_name in loaded_submodules:
+            if loaded_module_name not in self._fingerprints:
+                reasons[loaded_module_name] = "it has not been fingerprinted"
+            else:
+                fingerprint = self._fingerprints[loaded_module_name]
+                if fingerprint is not None and fingerprint.isStale():
+                    reasons[loaded_module_name] = f"its source file ({fingerprint.path}) has changed"
+
+        # the top-level module itself is always re-executed, so anything that refers to it must go, too.
+        dependencies = {
+            loaded_module_name: (
+                dependenciesOfModule(loaded_module, module_name) 
+                | self._importedNames.get(loaded_module_name, set()) 
+                | (observedImports or {}).get(loaded_module_name, set())
+            )
+            for loaded_module_name, loaded_module in loaded_submodules.items()
+        }
+        frontier = set(reasons) | {module_name}
+        while frontier:
+            nextFrontier = set()
+            for loaded_module_name in loaded_submodules:
+                if loaded_module_name in reasons:
+                    continue
+                changedDependency = next((x for x in dependencies[loaded_module_name] if x in frontier), None)
+                changedPackage = next((x for x in frontier if x != module_name and loaded_module_name.startswith(x + '.')), None)
+                if changedDependency is not None:
+                    reasons[loaded_module_name] = f"it depends on {changedDependency}, which is being reloaded"
+                elif changedPackage is not None:
+                    reasons[loaded_module_name] = f"its package {changedPackage} is being reloaded"
+                else:
+                    continue
+                nextFrontier.add(loaded_module_name)
+            frontier = nextFrontier
+
+        for loaded_module_name in loaded_submodules:
+            if loaded_module_name in reasons:
+                self._logger and self._logger.debug(f"unloading module {loaded_module_name} because {reasons[loaded_module_name]}")
+                unbindFromParent(loaded_module_name)
+                del sys.modules[loaded_module_name]
+                if self._submoduleIndex is not None:
+                    self._submoduleIndex.discard(loaded_module_name)
+                self._fingerprints.pop(loaded_module_name, None)
+                self._importedNames.pop(loaded_module_name, None)
+            else:
+                self._logger and self._logger.debug(f"keeping module {loaded_module_name} because neither it nor anything it depends on has changed")
+        return list(reasons)
+
+    def forget(self, module_name: str) -> None:
+        """ stops tracking module_name's submodules (e.g. because they have all been unloaded). """
+        search_prefix = module_name + '.'
+        for tracked_module_name in [x for x in self._fingerprints if x.startswith(search_prefix)]:
+            del self._fingerprints[tracked_module_name]
+            self._importedNames.pop(tracked_module_name, None)
+
+
+def namesImportedBySource(source: bytes, name: str, isPackage: bool) -> 'set[str]':
+    """ returns the fully-qualified names of the modules that might be imported by the import statements in source, 
+    which is the source of the module named name.  For 'from x import y', both x and x.y are included, because 
+    y might be a submodule (but, for 'from . import y', only the submodule).  Returns an empty set if the source cannot be parsed. """
+    package = (name if isPackage else name.rpartition('.')[0])
+    try:
+        tree = ast.parse(source)
+    except (SyntaxError, ValueError):
+        return set()
+    names = set()
+    for node in ast.walk(tree):
+        try:
+            if isinstance(node, ast.Import):
+                names.update(alias.name for alias in node.names)
+            elif isinstance(node, ast.ImportFrom):
+                base = importlib.util.resolve_name('.' * node.level + (node.module or ''), package) if node.level else node.module
+                if node.module:
+                    # (in 'from . import y', the package is the importing module's own (already-loaded) package, so only y counts.)
+                    names.add(base)
+                names.update(base + '.' + alias.name for alias in node.names if alias.name != '*')
+        except (ImportError, ValueError):
+            # a relative import that reaches beyond the top-level package.
+            continue
+    return names
+
+
+def unbindFromParent(name: str) -> None:
+    """ removes the binding (made by the import system) of the module named name as an attribute of its parent package,
+    if the parent is loaded.  Unless we do this when we unload a submodule whose parent we keep, 'from .pkg import x' 
+    and 'from . import x' would find the old module as an attribute of the parent, and would not import x afresh. """
+    parentName, _, childName = name.rpartition('.')
+    parent = sys.modules.get(parentName)
+    if parent is not None and getattr(parent, childName, None) is sys.modules.get(name):
+        try:
+            delattr(parent, childName)
+        except AttributeError:
+            pass
+
+
+def dependenciesOfModule(module: types.ModuleType, module_name: str) -> 'set[str]':
+    """ returns the names of the modules (module_name or its submodules) that module refers to by way of its globals:
+    either modules themselves (as bound by 'import x' or 'from . import x') or objects defined in those modules
+    (as bound by 'from .x import f').  This misses names bound to plain values (e.g. 'from .x import SOME_NUMBER').
+    A package's own submodules, bound as attributes of the package by the import system, are not counted: when we 
+    unload a submodule but keep its package, we remove that binding (see unbindFromParent()), so that the next import 
+    of the submodule loads it afresh and binds the new module to the package. """
+    search_prefix = module_name + '.'
+    dependencies = set()
+    for value in list(vars(module).values()):
+        try:
+            if isinstance(value, types.ModuleType):
+                name = value.__name__
+                if name.startswith(module.__name__ + '.'):
+                    continue
+            else:
+                name = getattr(value, '__module__', None)
+        except Exception:
+            # some objects (e.g. proxies) do strange things when their attributes are read.
+            continue
+        if isinstance(name, str) and (name == module_name or name.startswith(search_prefix)) and name != module.__name__:
+            dependencies.add(name)
+    return dependencies
@@ -11,6 +11,10 @@ import argparse
 import pathlib
 import os
 import re
+import struct
+import base64
+import collections
+import marshal
 
 ##==========================================
 ##   COLLECT THE PARAMETERS: 
@@ -23,6 +27,60 @@ import re
 DEFAULT_PORT_NUMBER_FOR_HTTP_SERVER = 19812
 DEFAULT_DEBUG_PORT_NUMBER = 9000
 
+def readBinaryExport(buffer) -> dict:
+    """ maps the arrays in buffer (the body of the add-in's answer to a POST of /export, in the format described 
+    in the add-in's lib/binary_export.py) onto numpy arrays (if numpy is available) or memoryviews, without copying 
+    or decoding the elements.  Returns a dict mapping each array's name to the array (or, for a list of strings, 
+    to the list). """
+    try:
+        import numpy
+    except ImportError:
+        numpy = None
+    buffer = memoryview(buffer)
+    magic, formatVersion, headerLength = struct.unpack_from('<4sII', buffer)
+    if magic != b'FSRX' or formatVersion != 1:
+        raise ValueError("The buffer is not a binary export that we know how to read.")
+    header = json.loads(bytes(buffer[12:12 + headerLength]))
+    dataStart = 12 + headerLength + (-(12 + headerLength) % 8)
+    arrays = {}
+    for entry in header['arrays']:
+        start = dataStart + entry['offset']
+        data = buffer[start:start + entry['nbytes']]
+        if entry['dtype'] == 'utf-8':
+            arrays[entry['name']] = (bytes(data).decode('utf-8').split('\0') if entry['shape'][0] else [])
+        elif numpy is not None:
+            arrays[entry['name']] = numpy.frombuffer(data, dtype=entry['dtype']).reshape(entry['shape'])
+        else:
+            # memoryview.cast() assumes the native byte order, which, on the machines we run on, is little-endian.
+            typeCode = {'i1': 'b', 'i2': 'h', 'i4': 'i', 'i8': 'q', 'u1': 'B', 'u2': 'H', 'u4': 'I', 'u8': 'Q', 'f4': 'f', 'f8': 'd', 'b1': '?'}[entry['dtype'][1:]]
+            arrays[entry['name']] = (data.cast(typeCode, entry['shape']) if 0 not in entry['shape'] else data.cast(typeCode))
+    return arrays
+
+def printProfileSummary(profile: dict, numberOfLines: int = 25) -> None:
+    """ prints a summary of profile (as described by the add-in; see the add-in's lib/script_profiler.py), whose data
+    the add-in sent back to us: for a 'pstats' profile, the functions having the greatest cumulative time, and, for a 
+    'collapsed' profile (from the sampling profiler), the functions in which the most samples found the script. """
+    data = base64.b64decode(profile['data'])
+    if profile['format'] == 'pstats':
+        import pstats
+        # pstats.Stats accepts anything that, like a cProfile.Profile, has create_stats() and a stats dict.
+        class LoadedProfile(object):
+            def __init__(self, stats: dict):
+                self.stats = stats
+            def create_stats(self) -> None:
+                pass
+        pstats.Stats(LoadedProfile(marshal.loads(data))).sort_stats('cumulative').print_stats(numberOfLines)
+    else:
+        samplesByFunction = collections.Counter()
+        for line in data.decode('utf-8').splitlines():
+            stack, _, count = line.rpartition(' ')
+            samplesByFunction[stack.split(';')[-1]] += int(count)
+        numberOfSamples = sum(samplesByFunction.values())
+        print(f"{numberOfSamples} samples, taken every {profile['sampling_interval']} seconds.  The functions in which the most samples found the script:")
+        for function, count in samplesByFunction.most_common(numberOfLines):
+            print(f"{count:8d} {100 * count / numberOfSamples:6.1f}%  {function}")
+
+
 parser = argparse.ArgumentParser(
     description="""
 Send a request to the fusion_script_runner_addin, 
@@ -33,11 +91,31 @@ as would happen if the user were to use the Fusion UI to run the script.
 )
 
 parser.add_argument('--script',
-    dest='script',
+    dest='scripts',
+    action='append',
+    default=[],
+    required=False,
+    help=(
+        "the path of the script file that is to be run.  "
+        + "You may give this argument more than once, in which case all the scripts are sent to the "
+        + "add-in in a single batch request, and are run one after another."
+    )
+)
+
+parser.add_argument('--manifest',
+    dest='manifest',
     action='store',
     nargs='?',
-    required=True,
-    help="the path of the script file that is to be run."
+    required=False,
+    default=None,
+    help=(
+        "the path of a json file listing scripts to be run in a single batch request.  "
+        + "The file contains either a list or an object having a 'scripts' property that is a list.  "
+        + "Each item of the list is either a script path or an object like "
+        + "{\"script\": \"foo.py\", \"debug\": false, \"prefixes_of_submodules_not_to_be_reloaded\": [\"bar\"]}.  "
+        + "Relative script paths are interpreted relative to the directory containing the manifest file.  "
+        + "Any --script arguments are appended to the manifest's list."
+    )
 )
 # to stay true to the way fusion_script_runner_addin works, we ought to allow
 # the user to omit the script argument and specify debug=True,
@@ -78,6 +156,141 @@ parser.add_argument('--debug',
     """
 )
 
+parser.add_argument('--incremental_reload',
+    dest='incremental_reload',
+    action='store',
+    nargs='?',
+    required=False,
+    default=True,
+    const=True,
+    type=argStringToBool ,
+    help="""
+        boolean specifying whether the add-in should, before running the script, unload only those submodules of the
+        script whose source file has changed since the previous run (along with the submodules that depend on them), 
+        rather than unloading all the submodules of the script.  Defaults to true.
+    """
+)
+
+parser.add_argument('--isolate',
+    dest='isolate',
+    action='store',
+    nargs='?',
+    required=False,
+    default=False,
+    const=True,
+    type=argStringToBool ,
+    help="""
+        boolean specifying that, after running the script, the add-in should remove from sys.modules the modules that the 
+        run imported (other than the script's own modules and a few heavy packages, like numpy, that are kept warm), and 
+        should restore sys.path to what it was before the run.
+    """
+)
+
+parser.add_argument('--warm_package',
+    dest='warm_packages',
+    action='append',
+    default=[],
+    required=False,
+    help="the name of a package that should stay loaded in spite of --isolate.  You may give this argument more than once."
+)
+
+parser.add_argument('--preimport',
+    dest='preimport',
+    action='append',
+    default=[],
+    required=False,
+    help=(
+        "the name of a (pure-Python, Fusion-independent) module that the script uses, which the add-in should import in a background "
+        + "thread before running the script, so that the import does not happen in Fusion's main thread.  "
+        + "You may give this argument more than once."
+    )
+)
+
+parser.add_argument('--wait',
+    dest='wait',
+    action='store',
+    nargs='?',
+    required=False,
+    default=False,
+    const=True,
+    type=argStringToBool ,
+    help="""
+        boolean specifying that the add-in should not answer our request until the script has finished running
+        (or until the timeout has expired), so that we can report the outcome of the run.  
+        Without this, we only report the id of the queued job.  Batch requests always wait.
+    """
+)
+
+parser.add_argument('--timeout',
+    dest='timeout',
+    action='store',
+    nargs='?',
+    required=False,
+    default=None,
+    type=float,
+    help="the maximum number of seconds to wait for the script to finish running.  Only relevant in case wait is true.  By default, we wait indefinitely."
+)
+
+parser.add_argument('--export',
+    dest='export',
+    action='store',
+    nargs='?',
+    required=False,
+    default=None,
+    help="""
+        instead of running a script, have the add-in run the named data extractor (e.g. user_parameters, face_areas, 
+        body_meshes, body_vertices) in Fusion and send back the extracted arrays in its compact binary format.  We print a 
+        summary of the arrays, and, if --export_output is given, save the binary data to that file (which 
+        readBinaryExport() in this script can read).
+    """
+)
+
+parser.add_argument('--export_arguments',
+    dest='export_arguments',
+    action='store',
+    nargs='?',
+    required=False,
+    default='{}',
+    help="a json object of extractor-specific arguments (e.g. '{\"quality\": \"HighQualityTriangleMesh\"}').  Only relevant in case of --export."
+)
+
+parser.add_argument('--export_output',
+    dest='export_output',
+    action='store',
+    nargs='?',
+    required=False,
+    default=None,
+    help="the path of the file in which to save the binary data.  Only relevant in case of --export."
+)
+
+parser.add_argument('--profile',
+    dest='profile',
+    action='store',
+    nargs='?',
+    required=False,
+    default=None,
+    const='cprofile',
+    choices=['cprofile', 'sample'],
+    help="""
+        have the add-in profile the loading and running of the script, with cProfile (the default), or, with 'sample', 
+        with a low-overhead sampling profiler (better suited to long runs).  Unless --profile_output is given, the add-in 
+        sends the profile back, and (in case of --wait, or of a batch) we print a summary of it.
+    """
+)
+
+parser.add_argument('--profile_output',
+    dest='profile_output',
+    action='store',
+    nargs='?',
+    required=False,
+    default=None,
+    help="""
+        the path of the file in which the add-in should save the profile: pstats data (readable by pstats.Stats or snakeviz) 
+        for cprofile, or collapsed stacks (readable by flame graph tools like flamegraph.pl or speedscope) for sample.  
+        Only relevant in case of --profile, and not allowed for a batch (in which each manifest item may give its own profile_output).
+    """
+)
+
 parser.add_argument('--use_vscode_debugpy',
     dest='use_vscode_debugpy',
     action='store',
@@ -115,6 +328,19 @@ parser.add_argument('--debug_port',
 # where we do not want to assume implicitly that the host is localhost.
 
 
+parser.add_argument('--debug_attach_timeout',
+    dest='debug_attach_timeout',
+    action='store',
+    nargs='?',
+    required=False,
+    default=None,
+    type=float,
+    help="""
+        the maximum number of seconds that the add-in should wait for the debugger client (e.g. VS Code) to attach before
+        giving up on running the script.  Only relevant in case debug is true.  By default, the add-in's own default applies.
+    """
+)
+
 parser.add_argument('--debugpy_path',
     dest='debugpy_path',
     action='store',
@@ -191,6 +417,25 @@ def locatePythonToolFolder():
 
 args, unknownArgs = parser.parse_known_args()
 
+manifest_items = []
+if args.manifest:
+    with open(args.manifest, 'r') as manifest_file:
+        manifest = json.load(manifest_file)
+    manifest_items = (manifest['scripts'] if isinstance(manifest, dict) else manifest)
+    manifest_dir = pathlib.Path(args.manifest).resolve().parent
+    manifest_items = [
+        {
+            **(item if isinstance(item, dict) else {'script': item}),
+            'script': str(manifest_dir / (item['script'] if isinstance(item, dict) else item))
+        }
+        for item in manifest_items
+    ]
+
+if not args.scripts and not manifest_items and not args.export:
+    print("You must specify at least one script, by means of either the --script or the --manifest argument.")
+    exit(-3)
+
+debugpy_path = ''
 if args.debug:
     # normalize args.debugpy_path
     if args.debugpy_path:
@@ -212,6 +457,25 @@ if args.debug:
 
 session = requests.Session()
 
+if args.export:
+    response = session.post(
+        f"http://localhost:{args.addin_port}/export",
+        data=json.dumps({'extractor': args.export, 'arguments': json.loads(args.export_arguments)}),
+        stream=True
+    )
+    if not response.ok:
+        print(response.text)
+        exit(-4)
+    exportedData = bytearray()
+    for chunk in response.iter_content(chunk_size=2**20):
+        exportedData += chunk
+    if args.export_output:
+        with open(args.export_output, 'wb') as exportOutputFile:
+            exportOutputFile.write(exportedData)
+    for name, exportedArray in readBinaryExport(exportedData).items():
+        print(f"{name}: " + (f"{len(exportedArray)} strings" if isinstance(exportedArray, list) else f"{getattr(exportedArray, 'dtype', None) or exportedArray.format} {list(exportedArray.shape)}"))
+    exit(0)
+
 
 
 #as originally written, Ben Gruver's add-in expects the 
@@ -258,47 +522,136 @@ session = requests.Session()
 # 
 
 
-response = session.post(
-    f"http://localhost:{args.addin_port}",
-    data=json.dumps(
-            {
-            # 'pubkey_modulus':,
-            # 'pubkey_exponent':,
-            # 'signature':,
-            
-            'message':{
+message = {
 
-                'debug':  
-                    # an int or a boolean, or anything which can be cast to an int and then interpreted as a boolean.
-                    args.debug, 
+    'debug':  
+        # an int or a boolean, or anything which can be cast to an int and then interpreted as a boolean.
+        args.debug, 
 
 
-                'debug_port':
-                    # here, we specify the number of the port on which we want to have the debug adaptor process (which will be created by the addin) listen for 
-                    # requests from the 'client' (i.e. the IDE, for instance vscode) (not to be confused with the 'debug server' which is a thread running within the 
-                    # 'debuggee' (the python environment within Fusion) running pydevd.  The 'debug adaptor' is not well described as either a 'server' or a 'client' --
-                    # although in general the debug adaptor mostly listens on tcp ports rather than initiating new tcp connections, so in that sense
-                    # it might be called a 'server'.
-                    args.debug_port,
+    'debug_port':
+        # here, we specify the number of the port on which we want to have the debug adaptor process (which will be created by the addin) listen for 
+        # requests from the 'client' (i.e. the IDE, for instance vscode) (not to be confused with the 'debug server' which is a thread running within the 
+        # 'debuggee' (the python environment within Fusion) running pydevd.  The 'debug adaptor' is not well described as either a 'server' or a 'client' --
+        # although in general the debug adaptor mostly listens on tcp ports rather than initiating new tcp connections, so in that sense
+        # it might be called a 'server'.
+        args.debug_port,
 
-                
+    
 
-                'script': 
-                    # a string - the path of the script file
-                    args.script, 
-                
+    'debugpy_path': 
+        # the path that we must add to sys.path in order to be able to succesfully call 'import debugpy'
+        debugpy_path,    
+
+    **({'debug_attach_timeout': args.debug_attach_timeout} if args.debug_attach_timeout is not None else {}),
+
+    'prefixes_of_submodules_not_to_be_reloaded': 
+        # the path that we must add to sys.path in order to be able to succesfully call 'import debugpy'
+        args.prefixes_of_submodules_not_to_be_reloaded,
+
+    'incremental_reload':
+        # whether the add-in should unload only the changed submodules (and their dependents) before running the script.
+        args.incremental_reload,
 
-                'debugpy_path': 
-                    # the path that we must add to sys.path in order to be able to succesfully call 'import debugpy'
-                    debugpy_path,    
+    'isolate':
+        # whether the add-in should undo the run's additions to sys.modules and its changes to sys.path.
+        args.isolate,
 
-                'prefixes_of_submodules_not_to_be_reloaded': 
-                    # the path that we must add to sys.path in order to be able to succesfully call 'import debugpy'
-                    args.prefixes_of_submodules_not_to_be_reloaded    
-            }
+    'warm_packages':
+        # packages (beyond the add-in's defaults) that should stay loaded in spite of isolate.
+        args.warm_packages,
+
+    'preimport':
+        # modules that the add-in should import, outside of Fusion's main thread, before running the script.
+        args.preimport,
+
+    'wait':
+        # whether the add-in should hold its response until the script has finished running.
+        args.wait,
+
+    'timeout':
+        # the maximum number of seconds that the add-in should hold its response (None means no limit).
+        args.timeout,
+
+    'profile':
+        # the profiler (if any) with which the add-in should profile the run.
+        args.profile
+}
+
+if len(args.scripts) == 1 and not manifest_items:
+    message['script'] = args.scripts[0]
+    if args.profile_output:
+        message['profile_output'] = str(pathlib.Path(args.profile_output).resolve())
+elif args.profile_output:
+    print("--profile_output is not allowed for a batch; instead, give each manifest item its own profile_output.")
+    exit(-3)
+else:
+    # a batch request.  The properties of message serve as defaults for each item of the batch.
+    message['scripts'] = manifest_items + [{'script': script} for script in args.scripts]
+
+response = session.post(
+    f"http://localhost:{args.addin_port}",
+    data=json.dumps(
+            {
+            # 'pubkey_modulus':,
+            # 'pubkey_exponent':,
+            # 'signature':,
+            'message': message
         }
     )
 )
+
+def reportProfiles(results: 'list[dict]') -> None:
+    """ prints each result, with the (bulky) data of its profile elided, and then a summary of each profile. """
+    for result in results:
+        profile = result.get('profile') or {}
+        print(json.dumps({**result, 'profile': {**profile, 'data': f"<{len(profile['data'])} base64 characters>"}} if 'data' in profile else result))
+    for result in results:
+        profile = result.get('profile') or {}
+        if 'data' in profile:
+            print(f"\nProfile of {result['script']}:")
+            printProfileSummary(profile)
+        elif 'path' in profile:
+            print(f"The profile of {result['script']} is in {profile['path']}")
+        elif 'error' in profile:
+            print(f"The add-in failed to save the profile of {result['script']}: {profile['error']}")
+
+if 'scripts' in message:
+    # the add-in answers a batch request with a description of the batch's job, whose 'results' (once the job has 
+    # run) are the results of the scripts.
+    if args.profile and response.ok and response.json()['results'] is not None:
+        reportProfiles(response.json()['results'])
+    else:
+        print(response.text)
+    if not response.ok:
+        exit(-4)
+    job = response.json()
+    if job['status'] == 'failed':
+        exit(-4)
+    if job['status'] == 'cancelled':
+        exit(-6)
+    if job['status'] in ('queued', 'waiting_for_debugger', 'running'):
+        print(f"The scripts did not finish running within {args.timeout} seconds.")
+        exit(-5)
+else:
+    # the add-in answers a single-script request with a description of the job.  Unless we asked to wait (and the
+    # job completed before the timeout), the job is still pending and its outcome can later be collected 
+    # with a GET of http://localhost:<addin_port>/jobs/<job_id>
+    if args.profile and response.ok:
+        reportProfiles([response.json()])
+    else:
+        print(response.text)
+    if not response.ok:
+        exit(-4)
+    if args.wait:
+        job = response.json()
+        if job['status'] == 'failed':
+            exit(-4)
+        if job['status'] == 'cancelled':
+            exit(-6)
+        if job['status'] in ('queued', 'waiting_for_debugger', 'running'):
+            print(f"The script did not finish running within {args.timeout} seconds.")
+            exit(-5)
  
 
 
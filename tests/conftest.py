@@ -0,0 +1,19 @@
+"""
+The tests run the add-in's machinery without Fusion, against the stand-in adsk package in benchmarks/fake_adsk, by way
+of the benchmarks' AddInHarness (importing run_benchmarks puts fake_adsk, lib, and the add-in on sys.path).
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+
+import run_benchmarks
+
+
+@pytest.fixture
+def harness(tmp_path):
+    with run_benchmarks.AddInHarness(str(tmp_path)) as harness:
+        yield harness
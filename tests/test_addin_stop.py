@@ -0,0 +1,29 @@
+import threading
+import time
+
+import fusion_script_runner_addin
+import metrics
+
+
+def test_stop_gives_up_on_a_hung_startup_thread(monkeypatch):
+    # (an AddIn adds metrics to the registry, which would refuse the metrics of a second AddIn.)
+    monkeypatch.setattr(fusion_script_runner_addin, 'metricsRegistry', metrics.MetricsRegistry(namespace=fusion_script_runner_addin.NAME_OF_THIS_ADDIN))
+    monkeypatch.setattr(fusion_script_runner_addin, 'STOP_THREAD_JOIN_TIMEOUT', 0.2)
+    addin = fusion_script_runner_addin.AddIn()
+    # (start() would have created the palette handler, which stop() closes.)
+    addin._logging_textcommands_palette_handler = None
+    hungImportMayReturn = threading.Event()
+    for attributeName in ('_startupThread', '_debuggerWarmStartThread'):
+        thread = threading.Thread(target=hungImportMayReturn.wait, name=attributeName, daemon=True)
+        thread.start()
+        setattr(addin, attributeName, thread)
+    warnings = []
+    monkeypatch.setattr(fusion_script_runner_addin.logger, 'warning', warnings.append)
+    try:
+        startTime = time.perf_counter()
+        addin.stop()
+        assert time.perf_counter() - startTime < 2
+    finally:
+        hungImportMayReturn.set()
+    assert len(warnings) == 2
+    assert addin._startupThread is None and addin._debuggerWarmStartThread is None
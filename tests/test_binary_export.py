@@ -0,0 +1,39 @@
+import array
+import ast
+import json
+import os
+import struct
+
+import binary_export
+
+REPOSITORY_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def loadReadBinaryExport():
+    """ returns run_script_in_fusion.readBinaryExport().  run_script_in_fusion.py sends its request when it is
+    imported, so we compile just the function from its source. """
+    path = os.path.join(REPOSITORY_DIRECTORY, 'run_script_in_fusion.py')
+    with open(path) as f:
+        tree = ast.parse(f.read(), path)
+    function = next(x for x in tree.body if isinstance(x, ast.FunctionDef) and x.name == 'readBinaryExport')
+    namespace = {'json': json, 'struct': struct}
+    exec(compile(ast.Module(body=[function], type_ignores=[]), path, 'exec'), namespace)
+    return namespace['readBinaryExport']
+
+
+def test_non_contiguous_arrays_round_trip():
+    doubles = array.array('d', [x / 4 for x in range(20)])
+    shorts = array.array('h', range(-10, 10))
+    arrays = {
+        'strided_doubles'   : memoryview(doubles)[::3],
+        'strided_shorts'    : memoryview(shorts)[1::2],
+        'contiguous_doubles': doubles
+    }
+    buffer = b''.join(binary_export.encode(arrays, chunkSize=16))
+    header = json.loads(buffer[12:12 + struct.unpack_from('<I', buffer, 8)[0]])
+    assert {x['name']: x['dtype'] for x in header['arrays']} == {'strided_doubles': '<f8', 'strided_shorts': '<i2', 'contiguous_doubles': '<f8'}
+
+    decoded = loadReadBinaryExport()(buffer)
+    assert list(decoded['strided_doubles']) == list(doubles[::3])
+    assert list(decoded['strided_shorts']) == list(shorts[1::2])
+    assert list(decoded['contiguous_doubles']) == list(doubles)
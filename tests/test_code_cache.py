@@ -0,0 +1,35 @@
+import os
+
+import code_cache
+
+
+def sizeOfFiles(directory) -> int:
+    return sum(entry.stat().st_size for entry in os.scandir(directory) if entry.name.endswith(code_cache.CodeCache.FILE_EXTENSION))
+
+
+def test_put_scans_the_cache_only_when_the_cache_outgrows_its_maximum_size(tmp_path, monkeypatch):
+    maximumSize = 20000
+    codeCache = code_cache.CodeCache(directory=str(tmp_path), maximumSize=maximumSize, logger=None)
+    numberOfScans = 0
+    originalScan = codeCache._scan
+    def countingScan():
+        nonlocal numberOfScans
+        numberOfScans += 1
+        return originalScan()
+    monkeypatch.setattr(codeCache, '_scan', countingScan)
+
+    numberOfPuts = 500
+    for i in range(numberOfPuts):
+        source = f"VALUE = {i}\n".encode()
+        sourcePath = str(tmp_path / f"module_{i}.py")
+        codeCache.put(source, sourcePath, codeCache.compile(source, sourcePath))
+        assert sizeOfFiles(tmp_path) <= maximumSize
+    assert 0 < numberOfScans < numberOfPuts / 10
+    assert codeCache._totalSize == sizeOfFiles(tmp_path)
+
+def test_a_new_cache_counts_the_existing_files(tmp_path):
+    codeCache = code_cache.CodeCache(directory=str(tmp_path), maximumSize=10**6, logger=None)
+    for i in range(10):
+        source = f"VALUE = {i}\n".encode()
+        codeCache.put(source, 'module.py', codeCache.compile(source, 'module.py'))
+    assert code_cache.CodeCache(directory=str(tmp_path), maximumSize=10**6, logger=None)._totalSize == sizeOfFiles(tmp_path)
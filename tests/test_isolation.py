@@ -0,0 +1,21 @@
+import sys
+
+from run_benchmarks import writeFile
+
+
+def test_isolated_reruns_see_one_copy_of_an_imported_package(harness, tmp_path, monkeypatch):
+    # an unchanged submodule kept by incremental reload must not go on referring to a package that isolation removed.
+    sitePackages = tmp_path / 'site'
+    writeFile(str(sitePackages / 'thirdpkg' / '__init__.py'), "class Err(Exception):\n    pass\n")
+    monkeypatch.syspath_prepend(str(sitePackages))
+    writeFile(str(tmp_path / 'script' / 'helper.py'), "import thirdpkg\n\ndef fail():\n    raise thirdpkg.Err()\n")
+    script_path = str(tmp_path / 'script' / 'script.py')
+    writeFile(script_path,
+        "import thirdpkg\nfrom . import helper\n\n"
+        "def run(context):\n    try:\n        helper.fail()\n    except thirdpkg.Err:\n        return 'caught'\n"
+    )
+
+    for _ in range(2):
+        result, _ = harness.runScriptInMainThread(script_path=script_path, isolate=True)
+        assert result['return_value'] == 'caught'
+        assert 'thirdpkg' not in sys.modules
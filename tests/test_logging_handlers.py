@@ -0,0 +1,47 @@
+import logging
+import logging.handlers
+
+import pytest
+
+from fusion_script_runner_addin import AsyncFileLoggingHandler
+
+
+@pytest.fixture
+def logFile(tmp_path):
+    path = tmp_path / 'log.log'
+    targetHandler = logging.handlers.RotatingFileHandler(filename=str(path), maxBytes=2**20, backupCount=1)
+    targetHandler.setFormatter(logging.Formatter("%(levelname)s - %(message)s"))
+    handler = AsyncFileLoggingHandler(targetHandler)
+    testLogger = logging.Logger('test_async_file_logging_handler')
+    testLogger.addHandler(handler)
+    yield (testLogger, handler, path)
+    handler.close()
+
+
+def test_a_record_whose_message_cannot_be_formatted_goes_to_handle_error(logFile, monkeypatch):
+    testLogger, handler, path = logFile
+    failedRecords = []
+    monkeypatch.setattr(handler, 'handleError', failedRecords.append)
+    testLogger.error("%d things", "not a number")
+    testLogger.error("after")
+    handler.close()
+    assert [x.msg for x in failedRecords] == ["%d things"]
+    assert path.read_text() == "ERROR - after\n"
+
+def test_the_traceback_is_formatted_when_the_record_is_logged(logFile):
+    testLogger, handler, path = logFile
+    records = []
+    class RecordingHandler(logging.Handler):
+        def emit(self, record):
+            records.append(record)
+    testLogger.addHandler(RecordingHandler())
+    try:
+        raise ValueError("the cause")
+    except ValueError:
+        testLogger.exception("it failed")
+    handler.close()
+    text = path.read_text()
+    assert text.startswith("ERROR - it failed\nTraceback")
+    assert "ValueError: the cause" in text
+    # (the handlers after ours still see the exception itself.)
+    assert records[0].exc_info is not None
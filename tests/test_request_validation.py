@@ -0,0 +1,72 @@
+import http.client
+import json
+import threading
+
+import pytest
+
+import fusion_script_runner_addin
+from fusion_script_runner_addin import validateMessage
+from run_benchmarks import writeFile
+
+
+@pytest.fixture
+def server(harness):
+    server = fusion_script_runner_addin.RunScriptHTTPServer(("localhost", 0), fusion_script_runner_addin.RunScriptHTTPRequestHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def post(server, body: str) -> 'tuple[int, bytes]':
+    connection = http.client.HTTPConnection('localhost', server.server_address[1])
+    try:
+        connection.request('POST', '/', body=body)
+        response = connection.getresponse()
+        return (response.status, response.read())
+    finally:
+        connection.close()
+
+
+def test_a_debug_only_request_is_accepted(server):
+    status, body = post(server, json.dumps({'message': {'debug': True, 'wait': True, 'timeout': 10}}))
+    assert status == 200
+    assert json.loads(body)['status'] == 'succeeded'
+
+def test_a_script_request_is_accepted(server, tmp_path):
+    script_path = str(tmp_path / 'script' / 'script.py')
+    writeFile(script_path, "def run(context):\n    return 1\n")
+    status, body = post(server, json.dumps({'message': {'script': script_path, 'wait': True, 'timeout': '10', 'prefixes_of_submodules_not_to_be_reloaded': ['x']}}))
+    assert status == 200
+    assert json.loads(body)['return_value'] == 1
+
+@pytest.mark.parametrize('body', [
+    '{not json',
+    '[]',
+    json.dumps({'message': 5}),
+    json.dumps({'message': {}}),
+    json.dumps({'message': {'script': 'a.py', 'timeout': 'soon'}}),
+])
+def test_a_malformed_request_is_answered_with_400(server, body):
+    assert post(server, body)[0] == 400
+
+@pytest.mark.parametrize('message', [
+    {'debug': False},
+    {'script': 5},
+    {'script': 'a.py', 'debug_port': 'x'},
+    {'script': 'a.py', 'profile': 'no_such_profiler'},
+    {'script': 'a.py', 'prefixes_of_submodules_not_to_be_reloaded': 'lib'},
+    {'script': 'a.py', 'warm_packages': [1]},
+    {'scripts': []},
+    {'scripts': ['a.py', 3]},
+])
+def test_validate_message_rejects(message):
+    with pytest.raises(ValueError):
+        validateMessage(message)
+
+@pytest.mark.parametrize('message', [
+    {'script': 'a.py'},
+    {'debug': True, 'debugpy_path': '/somewhere'},
+    {'scripts': ['a.py', {'script': 'b.py', 'profile': 'sample'}], 'prefixes_of_submodules_not_to_be_reloaded': ['lib']},
+])
+def test_validate_message_accepts(message):
+    validateMessage(message)
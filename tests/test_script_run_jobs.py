@@ -0,0 +1,48 @@
+import threading
+
+import script_run_jobs
+from fusion_script_runner_addin import addin
+from run_benchmarks import writeFile
+
+
+def writeScript(directory, name: str, returnValue) -> str:
+    script_path = str(directory / name / (name + '.py'))
+    writeFile(script_path, f"def run(context):\n    return {returnValue!r}\n")
+    return script_path
+
+
+def test_a_batch_is_run_as_a_job(harness, tmp_path):
+    job = addin.submitRunScriptRequestAndWait({'scripts': [writeScript(tmp_path, 'a', 'a'), {'script': writeScript(tmp_path, 'b', 'b')}]}, timeout=10)
+    assert job.status == script_run_jobs.ScriptRunJob.SUCCEEDED
+    assert [x['return_value'] for x in job.toDict()['results']] == ['a', 'b']
+    assert addin.getJob(job.id) is job
+
+def test_a_batch_that_cannot_start_debugging_fails_like_a_single_job(harness, tmp_path):
+    # (without a debugpy_path, debugging cannot be started.)
+    for message in ({'script': writeScript(tmp_path, 'a', 'a'), 'debug': True}, {'scripts': [writeScript(tmp_path, 'b', 'b')], 'debug': True}):
+        job = addin.submitRunScriptRequestAndWait(message, timeout=10)
+        assert job.status == script_run_jobs.ScriptRunJob.FAILED
+        assert 'Unable to start debugging' in job.error
+
+def test_a_job_cancelled_after_it_was_queued_does_not_run(harness, tmp_path):
+    # we keep the main thread busy, so that the job is still in the queue when we ask for it to be cancelled, and 
+    # request the cancellation without cancelling the job's future (as when the request arrives while the job is 
+    # waiting for the debugger client, and the client attaches at that moment).
+    mainThreadMayContinue = threading.Event()
+    runner = addin._fusionMainThreadRunner
+    runner.doTaskInMainFusionThread(mainThreadMayContinue.wait)
+    try:
+        job = addin.submitRunScriptRequest({'script': writeScript(tmp_path, 'a', 'a')})
+        job.cancelRequested.set()
+    finally:
+        mainThreadMayContinue.set()
+    assert job.finished.wait(10)
+    assert job.status == script_run_jobs.ScriptRunJob.CANCELLED
+
+def test_a_job_whose_cancellation_was_requested_is_not_queued_again(harness, tmp_path):
+    job = script_run_jobs.ScriptRunJob({'script_path': writeScript(tmp_path, 'a', 'a'), 'debug': False})
+    job.markWaitingForDebugger()
+    job.cancelRequested.set()
+    addin.queueJob(job)
+    assert job.status == script_run_jobs.ScriptRunJob.CANCELLED
+    assert job.future is None